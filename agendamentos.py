@@ -0,0 +1,453 @@
+"""
+Pix agendados e recorrentes.
+
+Cada agendamento mora em pix_agendados, no shard da conta de origem. Quem
+executa é o Agendador, uma thread por worker com um heap dos próximos
+vencimentos: ela dorme até o primeiro vencer (ou até um agendamento novo
+deste worker vencer antes) e então executa todos os vencidos em lote, pelo
+motor de Pix do shard, com o mesmo registrar_transferencia (ou
+registrar_saida, entre shards) do pix_send.
+
+Com vários workers, todos podem ver o mesmo agendamento vencido. Antes de
+executar, cada um reserva os seus com um lease (leaseDono/leaseAte): quem
+não conseguiu, pula. Se o dono cair, o lease expira e outro worker assume
+na próxima releitura. O Pix e o avanço do agendamento são gravados na mesma
+transação, então uma ocorrência nunca é paga duas vezes.
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, time as hora, timedelta
+
+from compras import add_months
+from transferencias import SaldoInsuficiente, registrar_saida, registrar_transferencia
+
+log = logging.getLogger("atlas.agendamentos")
+
+RECORRENCIAS = ("DIARIO", "SEMANAL", "MENSAL")
+
+STATUS_ATIVO = "ATIVO"
+STATUS_CONCLUIDO = "CONCLUIDO"
+STATUS_CANCELADO = "CANCELADO"
+STATUS_FALHOU = "FALHOU"
+
+# Pix agendado para um dia futuro sai neste horário
+HORA_EXECUCAO = hora(8, 0)
+
+
+def _data(valor) -> datetime:
+    # o sqlite3 devolve DATETIME como texto
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(valor)
+
+
+def ocorrencia(inicio: datetime, recorrencia, n: int) -> datetime:
+    """
+    Data da n-ésima ocorrência (0 = a primeira), sempre a partir do início:
+    um mensal do dia 31 cai no último dia dos meses curtos e volta ao 31.
+    """
+    if recorrencia == "DIARIO":
+        return inicio + timedelta(days=n)
+    if recorrencia == "SEMANAL":
+        return inicio + timedelta(weeks=n)
+    if recorrencia == "MENSAL":
+        return add_months(inicio, n)
+    return inicio
+
+
+def ler_pedido(data, recorrencia, repeticoes, agora: datetime):
+    """
+    Campos do formulário (ou do JSON) de agendamento: data AAAA-MM-DD,
+    recorrência e total de repetições, todos opcionais. Retorna None para
+    um Pix imediato ou (inicio, recorrencia, repeticoes). Levanta ValueError
+    com a mensagem para o usuário.
+    """
+    data = (data or "").strip()
+    recorrencia = (recorrencia or "").strip().upper() or None
+    repeticoes = str(repeticoes or "").strip()
+    if not data and not recorrencia:
+        return None
+
+    if recorrencia is not None and recorrencia not in RECORRENCIAS:
+        raise ValueError("Recorrência inválida.")
+
+    if data:
+        try:
+            dia = datetime.strptime(data, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("Data de agendamento inválida.") from None
+        if dia < agora.date():
+            raise ValueError("A data do agendamento já passou.")
+    else:
+        dia = agora.date()
+    # hoje: sai já, pelo agendador; depois, no horário fixo do dia
+    inicio = agora if dia == agora.date() else datetime.combine(dia, HORA_EXECUCAO)
+
+    if not repeticoes:
+        quantidade = None
+    elif not repeticoes.isdigit() or int(repeticoes) < 1:
+        raise ValueError("Número de repetições inválido.")
+    else:
+        quantidade = int(repeticoes)
+    if recorrencia is None:
+        quantidade = None
+
+    return inicio, recorrencia, quantidade
+
+
+def criar_agendamento(cursor, idContaOrigem: int, idContaDestino: int, valor: int,
+                      inicio: datetime, recorrencia=None, repeticoes=None) -> int:
+    """
+    Grava o agendamento (sem commit). Sem recorrência, é um Pix só; com
+    recorrência e sem repetições, repete até ser cancelado. Valor em centavos.
+    """
+    cursor.execute("""
+        INSERT INTO pix_agendados (
+            idContaOrigem,
+            idContaDestino,
+            valor,
+            dataInicio,
+            recorrencia,
+            repeticoes,
+            proximaExecucao,
+            criadoEm
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (idContaOrigem, idContaDestino, valor, inicio, recorrencia, repeticoes,
+          inicio, datetime.now()))
+    return cursor.lastrowid
+
+
+def cancelar_agendamento(cursor, idAgendamento: int, idContaOrigem: int) -> bool:
+    """Cancela um agendamento ativo da conta (sem commit). False se não havia."""
+    cursor.execute("""
+        UPDATE pix_agendados
+        SET status = 'CANCELADO',
+            proximaExecucao = NULL,
+            leaseDono = NULL,
+            leaseAte = NULL
+        WHERE idAgendamento = ?
+          AND idContaOrigem = ?
+          AND status = 'ATIVO'
+    """, (idAgendamento, idContaOrigem))
+    return cursor.rowcount > 0
+
+
+def reservar(cursor, ids, dono: str, agora: datetime, lease_ate: datetime) -> list:
+    """
+    Lease dos agendamentos `ids` que venceram e estão livres (ou com o lease
+    vencido), para `dono`. Retorna as linhas reservadas: (idAgendamento,
+    idContaOrigem, idContaDestino, valor, dataInicio, recorrencia,
+    repeticoes, execucoes).
+    """
+    cursor.execute("""
+        UPDATE pix_agendados
+        SET leaseDono = ?,
+            leaseAte = ?
+        WHERE idAgendamento IN (SELECT value FROM json_each(?))
+          AND status = 'ATIVO'
+          AND proximaExecucao <= ?
+          AND (leaseAte IS NULL OR leaseAte < ?)
+        RETURNING
+            idAgendamento,
+            idContaOrigem,
+            idContaDestino,
+            valor,
+            dataInicio,
+            recorrencia,
+            repeticoes,
+            execucoes
+    """, (dono, lease_ate, json.dumps(list(ids)), agora, agora))
+    return cursor.fetchall()
+
+
+def executar_reservados(cursor, shard: int, reservados, shards_destino: dict,
+                        dono: str, agora: datetime) -> list:
+    """
+    Executa, na transação do motor do `shard` (sem commit), os agendamentos
+    que `dono` reservou, cada um no seu SAVEPOINT: o Pix (ou a fase 1 entre
+    shards) e o avanço para a próxima ocorrência. Ocorrências perdidas
+    (app parado) não são pagas em atraso: o Pix sai uma vez e o agendamento
+    pula para a próxima data futura. Sem saldo, a ocorrência é registrada
+    como falha e a recorrência segue. Retorna, por agendamento,
+    (idAgendamento, idContaOrigem, idContaDestino, shardDestino, valor,
+    idTransferencia ou None, erro ou None, proximaExecucao ou None).
+    """
+    resultados = []
+    for idAgendamento, idContaOrigem, idContaDestino, valor, inicio, recorrencia, repeticoes, execucoes \
+            in reservados:
+        cursor.execute("SAVEPOINT agendamento")
+
+        # o lease ainda é nosso? (se venceu e outro worker reservou, é dele)
+        cursor.execute("""
+            SELECT 1
+            FROM pix_agendados
+            WHERE idAgendamento = ?
+              AND leaseDono = ?
+              AND status = 'ATIVO'
+        """, (idAgendamento, dono))
+        if not cursor.fetchone():
+            cursor.execute("RELEASE agendamento")
+            continue
+
+        destino = shards_destino.get(idContaDestino)
+        idTransferencia, erro = None, None
+        if destino is None:
+            erro = "conta de destino não encontrada"
+        else:
+            cursor.execute("SAVEPOINT pix_agendado")
+            try:
+                if destino == shard:
+                    idTransferencia = registrar_transferencia(
+                        cursor, idContaOrigem, idContaDestino, valor, agora
+                    )
+                else:
+                    idTransferencia = registrar_saida(
+                        cursor, idContaOrigem, idContaDestino, destino, valor, agora
+                    )
+            except SaldoInsuficiente:
+                cursor.execute("ROLLBACK TO pix_agendado")
+                erro = "saldo insuficiente"
+            cursor.execute("RELEASE pix_agendado")
+
+        # próxima ocorrência estritamente no futuro, dentro das repetições
+        inicio = _data(inicio)
+        n = execucoes + 1
+        proxima = None
+        if recorrencia:
+            while ocorrencia(inicio, recorrencia, n) <= agora:
+                n += 1
+            if repeticoes is None or n < repeticoes:
+                proxima = ocorrencia(inicio, recorrencia, n)
+        if proxima is not None:
+            status = STATUS_ATIVO
+        else:
+            status = STATUS_CONCLUIDO if erro is None else STATUS_FALHOU
+
+        cursor.execute("""
+            UPDATE pix_agendados
+            SET execucoes = ?,
+                proximaExecucao = ?,
+                status = ?,
+                leaseDono = NULL,
+                leaseAte = NULL,
+                idUltimaTransferencia = IFNULL(?, idUltimaTransferencia),
+                ultimoErro = ?
+            WHERE idAgendamento = ?
+        """, (n, proxima, status, idTransferencia, erro, idAgendamento))
+        cursor.execute("RELEASE agendamento")
+
+        resultados.append((idAgendamento, idContaOrigem, idContaDestino, destino, valor,
+                           idTransferencia, erro, proxima))
+    return resultados
+
+
+class Agendador:
+    """
+    Executor dos Pix agendados de todos os shards, uma thread por processo
+    (de novo em cada worker após o fork). O heap guarda só o que vence até
+    a próxima releitura do banco (a cada `ressincronizar_s`), que também
+    traz os agendamentos criados por outros workers. Nada abre conexão ou
+    thread na construção.
+    """
+
+    def __init__(self, shards, lote=100, lease_s=60.0, ressincronizar_s=60.0, notificar=None):
+        self.shards = shards
+        self.lote = lote
+        self.lease_s = lease_s
+        self.ressincronizar_s = ressincronizar_s
+        # chamado com cada resultado de executar_reservados que gerou um Pix
+        # (e o idTransferencia no destino), fora de qualquer transação
+        self.notificar = notificar
+
+        self._lock = threading.Lock()
+        # (proximaExecucao, shard, idAgendamento)
+        self._heap = []
+        self._acordar = threading.Event()
+        self._parar = None
+        self._thread = None
+        self._pid = None
+        self._dono = None
+
+        self.executados = 0
+        self.falhas = 0
+        self.perdidos_lease = 0
+        self.lotes = 0
+
+    def _garantir_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # identifica este processo nos leases
+            self._dono = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._heap = []
+            self._acordar = threading.Event()
+            self._parar = threading.Event()
+            self._thread = threading.Thread(
+                target=self._loop, name="atlas-agendador", daemon=True
+            )
+            self._thread.start()
+
+    def iniciar(self):
+        """No worker, após o fork: sobe a thread (que já lê o que está vencido)."""
+        self._garantir_thread()
+
+    def agendar(self, shard: int, idAgendamento: int, quando: datetime):
+        """Avisa a thread de um agendamento novo deste worker."""
+        self._garantir_thread()
+        with self._lock:
+            heapq.heappush(self._heap, (quando, shard, idAgendamento))
+            primeiro = self._heap[0][2] == idAgendamento
+        if primeiro:
+            self._acordar.set()
+
+    def parar(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._parar.set()
+            self._acordar.set()
+            self._thread.join()
+        self._thread = None
+
+    # ===== thread =====
+
+    def _loop(self):
+        proxima_leitura = 0.0
+        while not self._parar.is_set():
+            # limpo antes de olhar o heap: um agendar() daqui em diante acorda o wait
+            self._acordar.clear()
+
+            if time.monotonic() >= proxima_leitura:
+                try:
+                    self._recarregar()
+                except Exception:
+                    log.exception("falha ao ler os Pix agendados")
+                proxima_leitura = time.monotonic() + self.ressincronizar_s
+
+            devidos = self._retirar_vencidos(datetime.now())
+            if devidos:
+                try:
+                    self._executar(devidos)
+                except Exception:
+                    # o que ficou reservado volta quando o lease vencer
+                    log.exception("falha ao executar %s Pix agendado(s)", len(devidos))
+                continue
+
+            espera = proxima_leitura - time.monotonic()
+            with self._lock:
+                if self._heap:
+                    espera = min(espera, (self._heap[0][0] - datetime.now()).total_seconds())
+            self._acordar.wait(max(espera, 0.0))
+
+    def _recarregar(self):
+        """Refaz o heap com o que vence até a próxima releitura, em todos os shards."""
+        horizonte = datetime.now() + timedelta(seconds=self.ressincronizar_s)
+        heap = []
+        for shard in self.shards:
+            conn = shard.pool_leitura.acquire()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT proximaExecucao, idAgendamento
+                    FROM pix_agendados
+                    WHERE status = 'ATIVO'
+                      AND proximaExecucao <= ?
+                    ORDER BY proximaExecucao
+                """, (horizonte,))
+                heap.extend((_data(quando), shard.indice, idAgendamento)
+                            for quando, idAgendamento in cursor.fetchall())
+            finally:
+                shard.pool_leitura.release(conn)
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+
+    def _retirar_vencidos(self, agora):
+        """Tira do heap até `lote` agendamentos vencidos: shard -> ids."""
+        devidos = {}
+        with self._lock:
+            quantidade = 0
+            while self._heap and self._heap[0][0] <= agora and quantidade < self.lote:
+                _, shard, idAgendamento = heapq.heappop(self._heap)
+                ids = devidos.setdefault(shard, [])
+                if idAgendamento not in ids:
+                    ids.append(idAgendamento)
+                    quantidade += 1
+        return devidos
+
+    def _shards_destino(self, contas):
+        """idConta -> shard, numa consulta ao diretório do catálogo."""
+        if len(self.shards) == 1:
+            return dict.fromkeys(contas, 0)
+        banco = self.shards.catalogo
+        conn = banco.pool_leitura.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT idConta, shard
+                FROM diretorio
+                WHERE idConta IN (SELECT value FROM json_each(?))
+            """, (json.dumps(sorted(set(contas))),))
+            return dict(cursor.fetchall())
+        finally:
+            banco.pool_leitura.release(conn)
+
+    def _executar(self, devidos):
+        for indice, ids in devidos.items():
+            motor = self.shards[indice].motor
+            agora = datetime.now()
+            reservados = motor.executar(
+                reservar, ids, self._dono, agora, agora + timedelta(seconds=self.lease_s)
+            )
+            with self._lock:
+                self.perdidos_lease += len(ids) - len(reservados)
+            if not reservados:
+                continue
+
+            shards_destino = self._shards_destino([r[2] for r in reservados])
+            agora = datetime.now()
+            resultados = motor.executar(
+                executar_reservados, indice, reservados, shards_destino, self._dono, agora
+            )
+
+            # entre shards: o crédito, como no Shards.transferir
+            feitos = [r for r in resultados if r[5] is not None]
+            idsDestino = self.shards.completar_saidas(indice, [
+                (destino, idTransferencia, idContaOrigem, idContaDestino, valor, agora)
+                for _, idContaOrigem, idContaDestino, destino, valor, idTransferencia, _, _ in feitos
+            ])
+
+            with self._lock:
+                self.lotes += 1
+                self.executados += len(feitos)
+                self.falhas += len(resultados) - len(feitos)
+                for resultado in resultados:
+                    if resultado[7] is not None:
+                        heapq.heappush(self._heap, (resultado[7], indice, resultado[0]))
+
+            for resultado in resultados:
+                if resultado[6] is not None:
+                    log.warning("Pix agendado %s não executado: %s", resultado[0], resultado[6])
+            if self.notificar is not None:
+                for resultado, idDestino in zip(feitos, idsDestino):
+                    try:
+                        self.notificar(resultado, idDestino)
+                    except Exception:
+                        log.exception("falha ao notificar o Pix agendado %s", resultado[0])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "na_fila": len(self._heap),
+                "proximo": str(self._heap[0][0]) if self._heap else None,
+                "executados": self.executados,
+                "falhas": self.falhas,
+                "perdidos_para_outro_worker": self.perdidos_lease,
+                "lotes": self.lotes,
+                "ativo": self._thread is not None and self._pid == os.getpid(),
+            }
@@ -1,27 +1,275 @@
-from flask import Flask, render_template, request, redirect, session, flash
-import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, session, flash, g, Response, jsonify, stream_with_context, has_request_context
+import os
 from datetime import datetime, timedelta, date
+from functools import partial, wraps
+import agendamentos
+import base64
+import json
 import random
+import sqlite3
+import sys
+import time
+import zlib
+
+from markupsafe import Markup
+
+import arquivo
+import config
+import estaticos
+import eventos
+import exportacao
+import instrumentacao
+import metricas
+import pix_lote
+import senhas
+from cache import LRUCache
+from compras import lancar_compra_parcelada
+from database.migracoes import migrar_banco, sincronizar_diretorio
+from dinheiro import formatar_brl, para_centavos
+from shards import Shards
+from transferencias import SaldoInsuficiente
+
+bp = Blueprint("atlas", __name__)
+
+INICIALIZACAO = metricas.registro.medidor(
+    "atlas_inicializacao_segundos",
+    "Tempo de cada etapa da subida do app (create_app) e do worker (após o fork).",
+    ("etapa",),
+)
+
+
+class Recursos:
+    """
+    Estado de um app: shards (pools de conexões e motores de Pix) e caches.
+    Nada aqui abre conexão ou thread na construção, então o create_app pode
+    rodar no master de um servidor pre-fork; cada worker inicializa os seus
+    em inicializar_worker.
+    """
 
-app = Flask(__name__)
-app.secret_key = "atlasbank_secret"
+    def __init__(self, cfg):
+        # o log de comandos lentos mede pela mesma conexão instrumentada
+        self.metricas_sql = cfg["METRICAS_SQL"] or cfg["SQL_LENTO_MS"] > 0
+        self.aquecer = cfg["DB_POOL_AQUECER"]
+
+        # pools e motor de Pix de cada shard, e o catálogo (diretório de usuários)
+        self.shards = Shards(
+            cfg,
+            instrumentacao.ConexaoInstrumentada if self.metricas_sql else sqlite3.Connection,
+            (
+                partial(instrumentacao.ConexaoInstrumentada, rota="motor_transferencias")
+                if self.metricas_sql else sqlite3.Connection
+            ),
+        )
+
+        # idUsuario -> idConta e chave Pix (e-mail) -> destinatário; o vínculo entre
+        # usuário e conta não muda, o TTL só limita o que fica preso num worker
+        self.cache_contas = LRUCache("contas", maxsize=cfg["CACHE_MAX"], ttl=cfg["CACHE_TTL"])
+        self.cache_chaves_pix = LRUCache("chaves_pix", maxsize=cfg["CACHE_MAX"], ttl=cfg["CACHE_TTL"])
+        # idUsuario -> shard; usuários só mudam de shard com o app parado
+        self.cache_shards = LRUCache("shards", maxsize=cfg["CACHE_MAX"], ttl=cfg["CACHE_TTL"])
+        # HTML já renderizado da tela de cartões; a chave muda a cada compra ou
+        # cartão novo, então a versão antiga só espera sair pelo LRU
+        self.cache_fragmentos = LRUCache(
+            "fragmentos",
+            maxsize=cfg["CACHE_MAX"],
+            ttl=cfg["CACHE_FRAGMENTOS_TTL"],
+            max_bytes=cfg["CACHE_FRAGMENTOS_MB"] * 1024 * 1024,
+            tamanho=lambda fragmentos: sum(sys.getsizeof(f) for f in fragmentos.values()),
+        )
 
+        self.pix_em_lote_max = cfg["PIX_EM_LOTE_MAX_ITENS"]
+
+        # novos Pix e compras de cada conta, para /api/eventos
+        self.eventos = eventos.Eventos(cfg["SSE_MAX_CONEXOES"], cfg["EVENTOS_DIR"])
+        self.sse_heartbeat_s = cfg["SSE_HEARTBEAT_S"]
+        self.sse_duracao_max_s = cfg["SSE_DURACAO_MAX_S"]
+
+        # Pix agendados e recorrentes: uma thread por worker, que executa
+        # pelos motores dos shards e avisa as duas pontas por /api/eventos
+        self.agendador = agendamentos.Agendador(
+            self.shards,
+            lote=cfg["AGENDADOR_LOTE"],
+            lease_s=cfg["AGENDADOR_LEASE_S"],
+            ressincronizar_s=cfg["AGENDADOR_RESSINCRONIZAR_S"],
+            notificar=self._notificar_agendado,
+        )
 
-def get_db():
-    return sqlite3.connect("database/banco.sqlite", check_same_thread=False)
+        # etapa -> segundos, também exportado em /metrics
+        self.inicializacao = {}
 
+    def _notificar_agendado(self, resultado, idDestino):
+        _, idContaOrigem, idContaDestino, _, valor, idOrigem, _, _ = resultado
+        publicar_pix(self.eventos, idContaOrigem, idOrigem, idContaDestino, idDestino, valor)
+
+    def medir(self, etapa, inicio):
+        self.inicializacao[etapa] = time.perf_counter() - inicio
+        INICIALIZACAO.definir(self.inicializacao[etapa], etapa)
+
+
+def recursos() -> Recursos:
+    return current_app.extensions["atlas"]
+
+
+def create_app(cfg=None) -> Flask:
+    """
+    Monta o app a partir de uma classe de configuração (config.py) ou do
+    nome dela; sem argumento, usa ATLAS_CONFIG.
+    """
+    inicio = time.perf_counter()
+
+    if cfg is None or isinstance(cfg, str):
+        cfg = config.carregar(cfg)
+
+    app = Flask(__name__)
+    app.config.from_object(cfg)
+    if not app.config["SECRET_KEY"]:
+        raise RuntimeError("defina ATLAS_SECRET_KEY para subir o app fora do modo desenvolvimento")
+
+    etapa = time.perf_counter()
+    # sobe o schema de bancos antigos antes de abrir os pools, e registra no
+    # diretório os usuários que ainda não estão nele
+    for path in app.config["DB_SHARDS"]:
+        migrar_banco(path)
+    sincronizar_diretorio(app.config["DB_CATALOGO"], app.config["DB_SHARDS"])
+    rec = app.extensions["atlas"] = Recursos(app.config)
+    rec.medir("migracoes", etapa)
+
+    # opt-in: comandos acima do limite vão, com o EXPLAIN QUERY PLAN, para um
+    # arquivo rotativo (resumo em database/consultas_lentas.py)
+    instrumentacao.configurar_sql_lento(
+        app.config["SQL_LENTO_MS"],
+        app.config["SQL_LENTO_ARQUIVO"],
+        max_bytes=app.config["SQL_LENTO_MAX_MB"] * 1024 * 1024,
+        backups=app.config["SQL_LENTO_ARQUIVOS"],
+    )
 
-def formatar_brl(valor: float) -> str:
-    return (
-        f"{valor:,.2f}"
-        .replace(",", "X")
-        .replace(".", ",")
-        .replace("X", ".")
+    app.register_blueprint(bp)
+    estaticos.Estaticos(app)
+    # valores em centavos: {{ valor|brl }} -> "1.234,56"
+    app.jinja_env.filters["brl"] = formatar_brl
+    app.teardown_appcontext(liberar_db)
+
+    if app.config["PRECARREGAR_TEMPLATES"]:
+        etapa = time.perf_counter()
+        for nome in app.jinja_env.list_templates():
+            app.jinja_env.get_template(nome)
+        rec.medir("templates", etapa)
+
+    rec.medir("create_app", inicio)
+    app.logger.info(
+        "app pronto em %.1f ms (%s)", rec.inicializacao["create_app"] * 1000,
+        ", ".join(f"{etapa} {segundos * 1000:.1f} ms" for etapa, segundos in rec.inicializacao.items()),
     )
+    return app
+
+
+def inicializar_worker(app):
+    """
+    Chamar em cada worker logo após o fork (gunicorn.conf.py): abre as
+    conexões dos pools e sobe as threads escritoras de Pix antes da primeira
+    requisição, em vez de cobrar isso de quem chegar primeiro.
+    """
+    inicio = time.perf_counter()
+    rec = app.extensions["atlas"]
+    rec.shards.iniciar(rec.aquecer)
+    rec.eventos.iniciar()
+    rec.agendador.iniciar()
+    rec.medir("worker", inicio)
+
+
+def rota_atual() -> str:
+    """Regra da rota (ex.: /extrato/<int:idTransferencia>), para rotular métricas."""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return instrumentacao.SEM_ROTA
+
+
+def rota_interna(view):
+    """
+    Rota de operação: responde 404 a menos que ROTAS_INTERNAS esteja ligado
+    (ATLAS_ROTAS_INTERNAS=1; padrão só no desenvolvimento).
+    """
+    @wraps(view)
+    def protegida(*args, **kwargs):
+        if not current_app.config["ROTAS_INTERNAS"]:
+            return {"error": "not found"}, 404
+        return view(*args, **kwargs)
+    return protegida
+
+
+def _conexao(banco, escrita: bool):
+    """Conexão do banco presa à requisição atual (devolvida no teardown)."""
+    conexoes = g.setdefault("conexoes", {})
+    chave = (banco.nome, escrita)
+    if chave not in conexoes:
+        pool = banco.pool_escrita if escrita else banco.pool_leitura
+        conn = pool.acquire()
+        if recursos().metricas_sql:
+            conn.iniciar(rota_atual())
+        conexoes[chave] = (conn, pool)
+    return conexoes[chave][0]
+
+
+def _shard(shard):
+    if shard is None:
+        shard = shard_do_usuario(session["idUsuario"])
+    return recursos().shards[shard]
+
+
+def get_db(shard=None):
+    """Conexão de escrita do shard (padrão: o do usuário logado)."""
+    return _conexao(_shard(shard), escrita=True)
+
+
+def get_db_leitura(shard=None):
+    """
+    Conexão somente leitura (mode=ro) do shard (padrão: o do usuário logado).
+    Rotas que só leem usam esta: não disputam as poucas conexões de escrita.
+    """
+    return _conexao(_shard(shard), escrita=False)
+
+
+def get_catalogo(escrita=False):
+    """Conexão com o catálogo (diretório de usuários); com um shard só, é o próprio banco."""
+    return _conexao(recursos().shards.catalogo, escrita)
+
+
+def liberar_db(exc):
+    metricas_sql = recursos().metricas_sql
+    for conn, pool in g.pop("conexoes", {}).values():
+        if metricas_sql:
+            conn.finalizar()
+        pool.release(conn)
+
+
+@bp.before_app_request
+def iniciar_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+    instrumentacao.EM_ANDAMENTO_HTTP.inc()
+
+
+@bp.after_app_request
+def registrar_requisicao(resposta):
+    if "inicio_requisicao" in g:
+        rota = rota_atual()
+        instrumentacao.REQUISICOES_HTTP.inc(rota, request.method, str(resposta.status_code))
+        instrumentacao.DURACAO_HTTP.observar(
+            time.perf_counter() - g.inicio_requisicao, rota, request.method
+        )
+    return resposta
+
+
+@bp.teardown_app_request
+def finalizar_requisicao(exc):
+    if g.pop("inicio_requisicao", None) is not None:
+        instrumentacao.EM_ANDAMENTO_HTTP.dec()
 
 
 def obter_id_conta(cursor, idUsuario: int):
+    idConta = recursos().cache_contas.get(idUsuario)
+    if idConta is not None:
+        return idConta
+
     cursor.execute("""
         SELECT idConta
         FROM contas
@@ -29,30 +277,287 @@ def obter_id_conta(cursor, idUsuario: int):
         LIMIT 1
     """, (idUsuario,))
     row = cursor.fetchone()
-    return row[0] if row else None
+    if not row:
+        return None
+
+    recursos().cache_contas.set(idUsuario, row[0])
+    return row[0]
+
+
+def shard_do_usuario(idUsuario: int) -> int:
+    """Índice do shard do usuário, pelo diretório do catálogo."""
+    rec = recursos()
+    if len(rec.shards) == 1:
+        return 0
 
+    shard = rec.cache_shards.get(idUsuario)
+    if shard is not None:
+        return shard
 
-def calcular_saldo_conta(cursor, idConta: int) -> float:
+    cursor = get_catalogo().cursor()
     cursor.execute("""
-        SELECT
-            c.saldoInicial
-            + IFNULL((
-                SELECT SUM(t.valor)
-                FROM transferencias t
-                WHERE t.idContaDestino = c.idConta
-            ), 0)
-            - IFNULL((
-                SELECT SUM(t.valor)
-                FROM transferencias t
-                WHERE t.idContaOrigem = c.idConta
-            ), 0)
-        AS saldo
-        FROM contas c
-        WHERE c.idConta = ?
+        SELECT shard
+        FROM diretorio
+        WHERE idUsuario = ?
+    """, (idUsuario,))
+    row = cursor.fetchone()
+    if not row:
+        # sessão de um usuário fora do diretório: as consultas no primeiro
+        # shard simplesmente não acham nada
+        return 0
+
+    rec.cache_shards.set(idUsuario, row[0])
+    return row[0]
+
+
+def resolver_chave_pix(chave: str):
+    """
+    Destinatário de uma chave Pix (e-mail), lido do diretório do catálogo,
+    como dict com id, nome, email, idConta (None se o usuário ainda não tiver
+    conta) e shard, ou None se não existir.
+    """
+    destinatario = recursos().cache_chaves_pix.get(chave)
+    if destinatario is not None:
+        return destinatario
+
+    cursor = get_catalogo().cursor()
+    cursor.execute("""
+        SELECT idUsuario, nome, email, idConta, shard
+        FROM diretorio
+        WHERE email = ?
+    """, (chave,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    destinatario = {
+        "id": row[0], "nome": row[1], "email": row[2], "idConta": row[3], "shard": row[4],
+    }
+    if destinatario["idConta"] is not None:
+        recursos().cache_chaves_pix.set(chave, destinatario)
+    return destinatario
+
+
+def resolver_chaves_pix(chaves) -> dict:
+    """
+    Destinatários de várias chaves Pix numa consulta só ao diretório (Pix
+    em lote): chave -> dict como o de resolver_chave_pix. Chaves que não
+    existem ficam de fora.
+    """
+    cursor = get_catalogo().cursor()
+    cursor.execute("""
+        SELECT idUsuario, nome, email, idConta, shard
+        FROM diretorio
+        WHERE email IN (SELECT value FROM json_each(?))
+    """, (json.dumps(sorted(set(chaves))),))
+    return {
+        row[2]: {"id": row[0], "nome": row[1], "email": row[2], "idConta": row[3], "shard": row[4]}
+        for row in cursor.fetchall()
+    }
+
+
+def publicar_pix(eventos, idContaOrigem: int, idOrigem: int, idContaDestino: int, idDestino, valor: int):
+    """
+    Evento "transferencia" para as duas pontas de um Pix, cada uma com o id
+    do extrato dela; um crédito entre shards que ficou para o reenvio
+    (idDestino None) aparece no próximo carregamento.
+    """
+    data = str(datetime.now()).split(".")[0]
+    eventos.publicar(idContaOrigem, "transferencia", {
+        "id": idOrigem, "tipo": "DEBITO", "descricao": "Pix enviado",
+        "valor": formatar_brl(valor), "centavos": -valor, "data": data,
+    })
+    if idDestino is not None:
+        eventos.publicar(idContaDestino, "transferencia", {
+            "id": idDestino, "tipo": "CREDITO", "descricao": "Pix recebido",
+            "valor": formatar_brl(valor), "centavos": valor, "data": data,
+        })
+
+
+def agendar_pix(idContaOrigem: int, idContaDestino: int, valor: int, inicio, recorrencia, repeticoes) -> int:
+    """Grava o agendamento no shard do usuário logado e avisa o agendador deste worker."""
+    shard = shard_do_usuario(session["idUsuario"])
+    rec = recursos()
+    idAgendamento = rec.shards[shard].motor.executar(
+        agendamentos.criar_agendamento, idContaOrigem, idContaDestino, valor,
+        inicio, recorrencia, repeticoes,
+    )
+    rec.agendador.agendar(shard, idAgendamento, inicio)
+    return idAgendamento
+
+
+def invalidar_usuario(idUsuario: int, email: str = None):
+    """Chamar sempre que um usuário ou a conta dele for criado/alterado."""
+    recursos().cache_contas.invalidate(idUsuario)
+    if email:
+        # mesma normalização usada na tela de Pix
+        recursos().cache_chaves_pix.invalidate(email.strip().lower())
+
+
+def calcular_saldo_conta(cursor, idConta: int) -> int:
+    # saldoAtual é mantido na mesma transação de cada transferência
+    # (ver transferencias.registrar_transferencia); a conferência contra o
+    # histórico completo fica em database/reconciliar_saldos.py
+    cursor.execute("""
+        SELECT saldoAtual
+        FROM contas
+        WHERE idConta = ?
         LIMIT 1
     """, (idConta,))
     row = cursor.fetchone()
-    return float(row[0]) if row and row[0] is not None else 0.0
+    return row[0] if row and row[0] is not None else 0
+
+
+# keyset do extrato: a primeira página parte de um "cursor" maior que qualquer
+# transferência, assim a consulta é sempre a mesma (e sempre usa os índices)
+CURSOR_INICIO = ("9999-12-31", 2 ** 63 - 1)
+
+# idem para os lançamentos de cartão: (ano, mês, dataLancamento, idLancamento)
+CURSOR_INICIO_LANCAMENTOS = (9999, 99, "9999-12-31", 2 ** 63 - 1)
+
+# e para a lista de faturas: (ano, mês)
+CURSOR_INICIO_FATURAS = (9999, 99)
+
+LIMITE_LANCAMENTOS = 50
+
+
+def codificar_cursor(*partes) -> str:
+    bruto = "|".join(str(p) for p in partes).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decodificar_cursor(token, inicio=CURSOR_INICIO):
+    """Volta o token para a tupla, com os mesmos tipos de `inicio`."""
+    if not token:
+        return inicio
+    try:
+        bruto = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        partes = bruto.split("|")
+        if len(partes) != len(inicio):
+            return inicio
+        return tuple(type(padrao)(parte) for padrao, parte in zip(inicio, partes))
+    except Exception:
+        return inicio
+
+
+def limite_da_query(padrao: int, maximo: int = 100) -> int:
+    try:
+        return min(max(int(request.args.get("limite", padrao)), 1), maximo)
+    except ValueError:
+        return padrao
+
+
+def buscar_extrato(cursor, idConta: int, limite: int, token=None):
+    """
+    Uma página do extrato, da mais recente para a mais antiga, a partir do
+    cursor (dataTransferencia, idTransferencia). Cada direção é lida do seu
+    próprio índice (origem/destino + data) e só então as duas são intercaladas,
+    então a página N custa o mesmo que a primeira.
+    O histórico arquivado entra quando a página passa do que ficou no banco
+    quente: um arquivo por vez, do ano mais novo para o mais antigo, e só
+    enquanto ele ainda pode ter linhas da página.
+    Retorna (linhas, token_da_proxima_pagina ou None).
+    """
+    posicao = decodificar_cursor(token)
+    linhas = _pagina_extrato(cursor, "main", idConta, posicao, limite + 1)
+
+    for particao in arquivo.particoes(cursor):
+        teto = arquivo.teto(particao)
+        if len(linhas) > limite and linhas[limite][4] >= teto:
+            # as linhas deste arquivo e dos anos anteriores são todas mais antigas
+            break
+        if posicao[0] < f"{particao[0]}-01-01":
+            continue
+        esquema = arquivo.anexar(cursor, particao)
+        # (teto, 0): só as linhas antes do corte do arquivo
+        linhas = sorted(
+            linhas + _pagina_extrato(cursor, esquema, idConta, min(posicao, (teto, 0)), limite + 1),
+            key=lambda linha: (linha[4], linha[0]),
+            reverse=True,
+        )[:limite + 1]
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = codificar_cursor(linhas[-1][4], linhas[-1][0])
+
+    return linhas, proximo
+
+
+def _pagina_extrato(cursor, esquema: str, idConta: int, posicao, limite: int) -> list:
+    """Até `limite` linhas do extrato em um banco (quente ou arquivo), antes de `posicao`."""
+    data_cursor, id_cursor = posicao
+    cursor.execute(f"""
+        SELECT idTransferencia, descricao, tipo, valor, dataTransferencia
+        FROM (
+            SELECT
+                t.idTransferencia,
+                'Pix enviado' AS descricao,
+                'DEBITO' AS tipo,
+                t.valor,
+                t.dataTransferencia
+            FROM {esquema}.transferencias t
+            WHERE t.idContaOrigem = ?
+              AND (t.dataTransferencia, t.idTransferencia) < (?, ?)
+            ORDER BY t.dataTransferencia DESC, t.idTransferencia DESC
+            LIMIT ?
+        )
+        UNION ALL
+        SELECT idTransferencia, descricao, tipo, valor, dataTransferencia
+        FROM (
+            SELECT
+                t.idTransferencia,
+                'Pix recebido' AS descricao,
+                'CREDITO' AS tipo,
+                t.valor,
+                t.dataTransferencia
+            FROM {esquema}.transferencias t
+            WHERE t.idContaDestino = ?
+              AND (t.dataTransferencia, t.idTransferencia) < (?, ?)
+            ORDER BY t.dataTransferencia DESC, t.idTransferencia DESC
+            LIMIT ?
+        )
+        ORDER BY dataTransferencia DESC, idTransferencia DESC
+        LIMIT ?
+    """, (
+        idConta, data_cursor, id_cursor, limite,
+        idConta, data_cursor, id_cursor, limite,
+        limite,
+    ))
+    return cursor.fetchall()
+
+
+def buscar_transferencia(cursor, idTransferencia: int, idConta: int):
+    """
+    (valor, dataTransferencia, idContaOrigem, idContaDestino) da
+    transferência, se a conta for uma das pontas. Procura no banco quente e
+    depois nos arquivos, do ano mais novo para o mais antigo.
+    """
+    consulta = """
+        SELECT
+            valor,
+            dataTransferencia,
+            idContaOrigem,
+            idContaDestino
+        FROM {esquema}.transferencias
+        WHERE idTransferencia = ?
+          AND (idContaOrigem = ? OR idContaDestino = ?)
+          AND dataTransferencia < ?
+        LIMIT 1
+    """
+    cursor.execute(consulta.format(esquema="main"), (idTransferencia, idConta, idConta, arquivo.SEM_CORTE))
+    tx = cursor.fetchone()
+    if tx:
+        return tx
+
+    for particao in arquivo.particoes(cursor):
+        esquema = arquivo.anexar(cursor, particao)
+        cursor.execute(consulta.format(esquema=esquema),
+                       (idTransferencia, idConta, idConta, arquivo.teto(particao)))
+        tx = cursor.fetchone()
+        if tx:
+            return tx
+    return None
 
 
 def buscar_cartoes_8cols(cursor, idUsuario: int):
@@ -77,110 +582,204 @@ def buscar_cartoes_8cols(cursor, idUsuario: int):
     return cursor.fetchall()
 
 
-def carregar_faturas_e_lancamentos(cursor, idCartao: int):
-    faturas = []
-    lancamentos = []
-    if idCartao:
-        cursor.execute("""
-            SELECT
-                idFatura,
-                mesReferencia,
-                anoReferencia,
-                valorTotal
-            FROM faturas
-            WHERE idCartao = ?
-            ORDER BY anoReferencia DESC, mesReferencia DESC
-        """, (idCartao,))
-        faturas = cursor.fetchall()
+def buscar_lancamentos(cursor, idCartao: int, limite: int, token=None, idFatura=None):
+    """
+    Página de lançamentos do cartão (opcionalmente de uma só fatura), da
+    fatura mais recente para a mais antiga, por cursor
+    (ano, mês, dataLancamento, idLancamento).
+    Retorna (linhas, token_da_proxima_pagina ou None), com linhas no formato
+    (idLancamento, descricao, valor, dataLancamento, mesReferencia, anoReferencia).
+    Os lançamentos arquivados entram como no extrato: o arquivo de cada ano
+    de referência, do mais novo para o mais antigo, só enquanto puder ter
+    linhas da página.
+    """
+    posicao = decodificar_cursor(token, CURSOR_INICIO_LANCAMENTOS)
+    linhas = _pagina_lancamentos(cursor, "main", arquivo.SEM_CORTE, idCartao, idFatura, posicao, limite + 1)
+
+    for particao in arquivo.particoes(cursor):
+        ano, _, arquivado_ate = particao
+        if len(linhas) > limite and linhas[limite][5] > ano:
+            break
+        if posicao[0] < ano:
+            continue
+        esquema = arquivo.anexar(cursor, particao)
+        linhas = sorted(
+            linhas + _pagina_lancamentos(cursor, esquema, arquivado_ate, idCartao, idFatura, posicao, limite + 1),
+            key=lambda linha: (linha[5], linha[4], linha[3], linha[0]),
+            reverse=True,
+        )[:limite + 1]
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultimo = linhas[-1]
+        proximo = codificar_cursor(ultimo[5], ultimo[4], ultimo[3], ultimo[0])
+
+    return linhas, proximo
+
+
+def _pagina_lancamentos(cursor, esquema: str, arquivado_ate: str, idCartao: int, idFatura, posicao,
+                        limite: int) -> list:
+    """Até `limite` lançamentos do cartão em um banco (quente ou arquivo), antes de `posicao`."""
+    ano_c, mes_c, data_c, id_c = posicao
+    cursor.execute(f"""
+        SELECT
+            l.idLancamento,
+            l.descricao,
+            l.valor,
+            l.dataLancamento,
+            f.mesReferencia,
+            f.anoReferencia
+        FROM faturas f
+        JOIN {esquema}.lancamentos l ON l.idFatura = f.idFatura
+        WHERE f.idCartao = ?
+          AND (? IS NULL OR f.idFatura = ?)
+          AND (f.anoReferencia, f.mesReferencia, l.dataLancamento, l.idLancamento) < (?, ?, ?, ?)
+          AND l.dataLancamento < ?
+        ORDER BY f.anoReferencia DESC, f.mesReferencia DESC, l.dataLancamento DESC, l.idLancamento DESC
+        LIMIT ?
+    """, (idCartao, idFatura, idFatura, ano_c, mes_c, data_c, id_c, arquivado_ate, limite))
+    return cursor.fetchall()
 
-        cursor.execute("""
-            SELECT
-                l.descricao,
-                l.valor,
-                l.dataLancamento,
-                f.mesReferencia,
-                f.anoReferencia
-            FROM lancamentos l
-            JOIN faturas f ON f.idFatura = l.idFatura
-            WHERE f.idCartao = ?
-            ORDER BY f.anoReferencia DESC, f.mesReferencia DESC, l.dataLancamento DESC
-        """, (idCartao,))
-        lancamentos = cursor.fetchall()
-
-    return faturas, lancamentos
-
-
-def add_months(dt: datetime, months: int) -> datetime:
-    """Soma meses mantendo dia válido (ex.: 31 -> ajusta pro último dia do mês)."""
-    y = dt.year + (dt.month - 1 + months) // 12
-    m = (dt.month - 1 + months) % 12 + 1
-    d = min(dt.day, [31,
-                     29 if (y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)) else 28,
-                     31, 30, 31, 30, 31, 31, 30, 31, 30, 31][m - 1])
-    return dt.replace(year=y, month=m, day=d)
-
-
-def get_or_create_fatura(cursor, idCartao: int, mes_ref: int, ano_ref: int) -> int:
+
+def carregar_fatura_aberta(cursor, idCartao: int):
+    """
+    Fatura do mês corrente do cartão e a primeira página dos seus lançamentos;
+    as demais faturas e páginas são buscadas sob demanda pela API.
+    Retorna (fatura ou None, lancamentos, token_da_proxima_pagina).
+    """
+    hoje = date.today()
     cursor.execute("""
-        SELECT idFatura
+        SELECT
+            idFatura,
+            mesReferencia,
+            anoReferencia,
+            valorTotal
         FROM faturas
         WHERE idCartao = ?
-          AND mesReferencia = ?
           AND anoReferencia = ?
+          AND mesReferencia = ?
         LIMIT 1
-    """, (idCartao, mes_ref, ano_ref))
-    row = cursor.fetchone()
-    if row:
-        return row[0]
+    """, (idCartao, hoje.year, hoje.month))
+    fatura = cursor.fetchone()
 
-    data_fechamento = datetime(ano_ref, mes_ref, 25)
-    if mes_ref == 12:
-        data_vencimento = datetime(ano_ref + 1, 1, 10)
-    else:
-        data_vencimento = datetime(ano_ref, mes_ref + 1, 10)
+    if not fatura:
+        return None, [], None
+
+    lancamentos, proximo = buscar_lancamentos(cursor, idCartao, LIMITE_LANCAMENTOS, idFatura=fatura[0])
+    return fatura, lancamentos, proximo
 
+
+def versoes_cartoes(cursor, idUsuario: int):
+    """(idCartao, versao) de cada cartão do usuário, na ordem da tela."""
     cursor.execute("""
-        INSERT INTO faturas (
-            idCartao,
-            mesReferencia,
-            anoReferencia,
-            dataFechamento,
-            dataVencimento,
-            valorTotal,
-            statusPagamento
-        ) VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
-        idCartao,
-        mes_ref,
-        ano_ref,
-        data_fechamento,
-        data_vencimento,
-        0.0,
-        "ABERTA"
-    ))
-    return cursor.lastrowid
+        SELECT idCartao, versao
+        FROM cartoesCredito
+        WHERE idUsuario = ?
+        ORDER BY idCartao DESC
+    """, (idUsuario,))
+    return tuple(cursor.fetchall())
 
 
-@app.route("/", methods=["GET"])
+def fragmentos_cartoes(cursor, idUsuario: int, versoes):
+    """
+    Lista de cartões e fatura do mês já renderizadas, cacheadas por usuário,
+    versão de cada cartão (compra ou fechamento sobe a versão; cartão novo
+    muda a lista) e mês corrente (a fatura exibida é a do mês).
+    """
+    hoje = date.today()
+    chave = (idUsuario, versoes, hoje.year, hoje.month)
+    cache = recursos().cache_fragmentos
+
+    fragmentos = cache.get(chave)
+    if fragmentos is not None:
+        return fragmentos
+
+    cartoes = buscar_cartoes_8cols(cursor, idUsuario)
+    idCartao = cartoes[0][0] if cartoes else None
+    fatura, lancamentos, proximo = (None, [], None)
+    if idCartao:
+        fatura, lancamentos, proximo = carregar_fatura_aberta(cursor, idCartao)
+
+    fragmentos = {
+        "lista": Markup(render_template("fragmentos/cartoes_lista.html", cartoes=cartoes)),
+        "fatura": Markup(render_template(
+            "fragmentos/cartoes_fatura.html",
+            idCartao=idCartao,
+            fatura=fatura,
+            lancamentos=lancamentos,
+            proximo=proximo,
+        )),
+    }
+    cache.set(chave, fragmentos)
+    return fragmentos
+
+
+def render_cartoes(cursor, idUsuario: int, versoes=None, **mensagens):
+    if versoes is None:
+        versoes = versoes_cartoes(cursor, idUsuario)
+    return render_template(
+        "cartoes.html",
+        fragmentos=fragmentos_cartoes(cursor, idUsuario, versoes),
+        **mensagens
+    )
+
+
+@bp.route("/", methods=["GET"])
 def login():
     return render_template("login.html")
 
 
-@app.route("/login", methods=["POST"])
+@bp.route("/login", methods=["POST"])
 def login_post():
     email = request.form["email"]
     senha = request.form["senha"]
 
-    db = get_db()
-    cursor = db.cursor()
-
-    cursor.execute(
-        "SELECT idUsuario, nome, senha FROM usuarios WHERE email = ?",
-        (email,)
-    )
-    user = cursor.fetchone()
+    # o diretório diz em que shard o usuário está; a senha fica no shard
+    catalogo = get_catalogo().cursor()
+    catalogo.execute("""
+        SELECT idUsuario, shard
+        FROM diretorio
+        WHERE email = ?
+    """, (email,))
+    entrada = catalogo.fetchone()
+
+    user = None
+    if entrada:
+        cursor = get_db_leitura(entrada[1]).cursor()
+        cursor.execute(
+            "SELECT idUsuario, nome, senha FROM usuarios WHERE idUsuario = ?",
+            (entrada[0],)
+        )
+        user = cursor.fetchone()
 
-    if user and check_password_hash(user[2], senha):
+    try:
+        senha_ok = bool(user) and senhas.verificar_senha(user[2], senha)
+    except senhas.SobrecargaHash:
+        return render_template(
+            "login.html",
+            erro="Muitos acessos no momento. Tente novamente em instantes."
+        ), 503
+
+    # parâmetros de hash mudaram desde o cadastro: aproveita a senha em
+    # claro deste login para regravar com os parâmetros atuais. O hash sai
+    # antes de pegar a conexão de escrita, e com a fila cheia o rehash fica
+    # para o próximo login, sem barrar este
+    if senha_ok and senhas.precisa_rehash(user[2]):
+        try:
+            novo_hash = senhas.gerar_hash(senha)
+        except senhas.SobrecargaHash:
+            novo_hash = None
+        if novo_hash:
+            db = get_db(entrada[1])
+            db.cursor().execute("""
+                UPDATE usuarios
+                SET senha = ?
+                WHERE idUsuario = ? AND senha = ?
+            """, (novo_hash, user[0], user[2]))
+            db.commit()
+
+    if senha_ok:
         session["idUsuario"] = user[0]
         session["nome"] = user[1]
         return redirect("/dashboard")
@@ -191,94 +790,119 @@ def login_post():
     )
 
 
-@app.route("/cadastro", methods=["GET"])
+@bp.route("/cadastro", methods=["GET"])
 def cadastro():
     return render_template("cadastro.html")
 
 
-@app.route("/cadastro", methods=["POST"])
+@bp.route("/cadastro", methods=["POST"])
 def cadastro_post():
     nome = request.form["nome"]
     email = request.form["email"]
     senha = request.form["senha"]
 
-    db = get_db()
-    cursor = db.cursor()
-
-    cursor.execute("SELECT idUsuario FROM usuarios WHERE email = ?", (email,))
-    if cursor.fetchone():
+    # e-mail repetido e hash pela conexão de leitura: uma conexão de escrita
+    # só é pega para o INSERT, e nunca fica presa durante o hash
+    leitura = get_catalogo().cursor()
+    leitura.execute("SELECT idUsuario FROM diretorio WHERE email = ?", (email,))
+    if leitura.fetchone():
         return render_template("cadastro.html", erro="Este e-mail já está cadastrado.")
 
-    senha_hash = generate_password_hash(senha)
+    try:
+        senha_hash = senhas.gerar_hash(senha)
+    except senhas.SobrecargaHash:
+        return render_template(
+            "cadastro.html",
+            erro="Muitos acessos no momento. Tente novamente em instantes."
+        ), 503
 
-    cursor.execute("""
-        INSERT INTO usuarios (nome, email, senha, data_cadastro)
-        VALUES (?, ?, ?, ?)
-    """, (nome, email, senha_hash, datetime.now()))
-    id_usuario = cursor.lastrowid
+    catalogo = get_catalogo(escrita=True)
+    cursor = catalogo.cursor()
 
-    cursor.execute("""
-        INSERT INTO contas (idUsuario, tipo, saldoInicial, dataCriacao)
-        VALUES (?, ?, ?, ?)
-    """, (id_usuario, "corrente", 0.0, datetime.now()))
+    # o catálogo aloca idUsuario e idConta (únicos entre os shards) e reserva
+    # o e-mail; o shard sai do próprio idUsuario, como em dividir_shards.py
+    try:
+        cursor.execute("""
+            INSERT INTO diretorio (idUsuario, email, nome, idConta, shard)
+            SELECT
+                IFNULL(MAX(idUsuario), 0) + 1,
+                ?,
+                ?,
+                (SELECT IFNULL(MAX(idConta), 0) + 1 FROM diretorio),
+                (IFNULL(MAX(idUsuario), 0) + 1) % ?
+            FROM diretorio
+            RETURNING idUsuario, idConta, shard
+        """, (email, nome, len(recursos().shards)))
+        id_usuario, id_conta, shard = cursor.fetchall()[0]
+        catalogo.commit()
+    except sqlite3.IntegrityError:
+        # outro cadastro com o mesmo e-mail chegou antes
+        catalogo.rollback()
+        return render_template("cadastro.html", erro="Este e-mail já está cadastrado.")
 
-    db.commit()
+    db = get_db(shard)
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO usuarios (idUsuario, nome, email, senha, data_cadastro)
+            VALUES (?, ?, ?, ?, ?)
+        """, (id_usuario, nome, email, senha_hash, datetime.now()))
+
+        cursor.execute("""
+            INSERT INTO contas (idConta, idUsuario, tipo, saldoInicial, saldoAtual, dataCriacao)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (id_conta, id_usuario, "corrente", 0, 0, datetime.now()))
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        # sem o usuário no shard, o e-mail volta a ficar livre
+        catalogo.cursor().execute("DELETE FROM diretorio WHERE idUsuario = ?", (id_usuario,))
+        catalogo.commit()
+        raise
+    invalidar_usuario(id_usuario, email)
 
     flash("Cadastro aprovado! Faça login para continuar.", "success")
     return redirect("/")
 
 
-@app.route("/dashboard")
+@bp.route("/dashboard")
 def dashboard():
     if "idUsuario" not in session:
         return redirect("/")
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
     idConta = obter_id_conta(cursor, session["idUsuario"])
     if not idConta:
         return redirect("/")
 
+    # antes de ler o banco: o que for publicado depois disso chega pelo
+    # /api/eventos (a página ignora o que já veio renderizado)
+    desde = recursos().eventos.marco()
+
     saldo = calcular_saldo_conta(cursor, idConta)
     saldo_formatado = formatar_brl(saldo)
 
-    cursor.execute("""
-        SELECT
-            t.idTransferencia,
-            CASE
-                WHEN t.idContaOrigem = ? THEN 'Pix enviado'
-                ELSE 'Pix recebido'
-            END AS descricao,
-            CASE
-                WHEN t.idContaOrigem = ? THEN 'DEBITO'
-                ELSE 'CREDITO'
-            END AS tipo,
-            t.valor,
-            t.dataTransferencia
-        FROM transferencias t
-        WHERE t.idContaOrigem = ?
-           OR t.idContaDestino = ?
-        ORDER BY t.dataTransferencia DESC
-        LIMIT 5
-    """, (idConta, idConta, idConta, idConta))
-
-    extrato = cursor.fetchall()
+    extrato, _ = buscar_extrato(cursor, idConta, 5)
 
     return render_template(
         "dashboard.html",
         nome=session["nome"].split()[0],
         saldo=saldo_formatado,
-        extrato=extrato
+        saldo_centavos=saldo,
+        extrato=extrato,
+        desde=desde,
     )
 
 
-@app.route("/dados-bancarios")
+@bp.route("/dados-bancarios")
 def dados_bancarios():
     if "idUsuario" not in session:
         return redirect("/")
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
     cursor.execute("""
@@ -305,7 +929,7 @@ def dados_bancarios():
     )
 
 
-@app.route("/pix", methods=["GET", "POST"])
+@bp.route("/pix", methods=["GET", "POST"])
 def pix():
     if "idUsuario" not in session:
         return redirect("/")
@@ -313,20 +937,12 @@ def pix():
     if request.method == "POST":
         chave = request.form["chave"].strip().lower()
 
-        db = get_db()
-        cursor = db.cursor()
-
-        cursor.execute("""
-            SELECT idUsuario, email
-            FROM usuarios
-            WHERE email = ?
-        """, (chave,))
-        destinatario = cursor.fetchone()
+        destinatario = resolver_chave_pix(chave)
 
         if not destinatario:
             return render_template("pix.html", erro="Chave Pix não encontrada.")
 
-        if destinatario[0] == session["idUsuario"]:
+        if destinatario["id"] == session["idUsuario"]:
             return render_template("pix.html", erro="Não é possível enviar Pix para a própria conta.")
 
         session["pix_chave"] = chave
@@ -335,26 +951,18 @@ def pix():
     return render_template("pix.html")
 
 
-@app.route("/pix-confirm", methods=["GET"])
+@bp.route("/pix-confirm", methods=["GET"])
 def pix_confirm():
     if "idUsuario" not in session or "pix_chave" not in session:
         return redirect("/pix")
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
-    cursor.execute("""
-        SELECT u.idUsuario, u.nome, u.email
-        FROM usuarios u
-        WHERE u.email = ?
-        LIMIT 1
-    """, (session["pix_chave"],))
-    row = cursor.fetchone()
-    if not row:
+    destinatario = resolver_chave_pix(session["pix_chave"])
+    if not destinatario:
         return redirect("/pix")
 
-    destinatario = {"id": row[0], "nome": row[1], "email": row[2]}
-
     idContaOrigem = obter_id_conta(cursor, session["idUsuario"])
     if not idContaOrigem:
         return redirect("/dashboard")
@@ -369,36 +977,29 @@ def pix_confirm():
     )
 
 
-@app.route("/pix-send", methods=["POST"])
+@bp.route("/pix-send", methods=["POST"])
 def pix_send():
     if "idUsuario" not in session or "pix_chave" not in session:
         return redirect("/pix")
 
     try:
-        valor = float(request.form["valor"])
-    except:
-        valor = 0.0
+        valor = para_centavos(request.form["valor"])
+    except (KeyError, ValueError):
+        valor = 0
 
-    db = get_db()
+    # aqui só se lê: quem grava o Pix é o motor do shard, na conexão de escrita dele
+    db = get_db_leitura()
     cursor = db.cursor()
 
     idContaOrigem = obter_id_conta(cursor, session["idUsuario"])
     if not idContaOrigem:
         return redirect("/dashboard")
 
-    cursor.execute("""
-        SELECT u.idUsuario, u.nome, u.email, c.idConta
-        FROM usuarios u
-        JOIN contas c ON c.idUsuario = u.idUsuario
-        WHERE u.email = ?
-        LIMIT 1
-    """, (session["pix_chave"],))
-    row = cursor.fetchone()
-    if not row:
+    destinatario = resolver_chave_pix(session["pix_chave"])
+    if not destinatario or destinatario["idConta"] is None:
         return redirect("/pix")
 
-    destinatario = {"id": row[0], "nome": row[1], "email": row[2]}
-    idContaDestino = row[3]
+    idContaDestino = destinatario["idConta"]
 
     saldo_atual = calcular_saldo_conta(cursor, idContaOrigem)
     saldo_formatado = formatar_brl(saldo_atual)
@@ -411,143 +1012,352 @@ def pix_send():
         return render_template("pix_confirm.html", destinatario=destinatario, saldo=saldo_formatado,
                                erro="Você não pode enviar Pix para si mesmo.")
 
+    try:
+        agendamento = agendamentos.ler_pedido(
+            request.form.get("data"), request.form.get("recorrencia"),
+            request.form.get("repeticoes"), datetime.now(),
+        )
+    except ValueError as erro:
+        return render_template("pix_confirm.html", destinatario=destinatario, saldo=saldo_formatado,
+                               erro=str(erro))
+
+    if agendamento is not None:
+        # o saldo é conferido em cada execução, pelo mesmo débito condicional
+        agendar_pix(idContaOrigem, idContaDestino, valor, *agendamento)
+        session.pop("pix_chave", None)
+        return redirect("/pix-sent?agendado=1")
+
     if saldo_atual < valor:
         return render_template("pix_confirm.html", destinatario=destinatario, saldo=saldo_formatado,
                                erro="Saldo insuficiente para realizar o Pix.")
 
-    agora = datetime.now()
+    # a checagem acima é só para a mensagem; quem garante o saldo é o débito
+    # condicional feito pelo motor, na mesma transação do INSERT (entre
+    # shards, na primeira das duas fases: ver shards.Shards.transferir)
+    try:
+        idOrigem, idDestino = recursos().shards.transferir(
+            shard_do_usuario(session["idUsuario"]), idContaOrigem,
+            destinatario["shard"], idContaDestino, valor,
+        )
+    except SaldoInsuficiente:
+        saldo_formatado = formatar_brl(calcular_saldo_conta(cursor, idContaOrigem))
+        return render_template("pix_confirm.html", destinatario=destinatario, saldo=saldo_formatado,
+                               erro="Saldo insuficiente para realizar o Pix.")
+    except TimeoutError:
+        # o pedido continua na fila do motor e ainda pode ser gravado: nada
+        # de formulário para reenviar, que viraria um segundo Pix
+        current_app.logger.warning("Pix da conta %s sem confirmação do motor a tempo", idContaOrigem)
+        session.pop("pix_chave", None)
+        return redirect("/pix-sent?processando=1")
+
+    publicar_pix(recursos().eventos, idContaOrigem, idOrigem, idContaDestino, idDestino, valor)
+
+    session.pop("pix_chave", None)
+    return redirect("/pix-sent")
+
+
+@bp.route("/api/pix/lote", methods=["POST"])
+def api_pix_lote():
+    """
+    Pix em lote (folha de pagamento): JSON [{"chave", "valor"}, ...] ou um
+    arquivo "chave;valor" (campo `arquivo`, ou o corpo em text/csv). Todas
+    as chaves são resolvidas numa consulta, o total é conferido contra uma
+    leitura do saldo e os Pix válidos são gravados numa transação só; as
+    linhas inválidas voltam recusadas no relatório, sem impedir as outras.
+    """
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
+
+    try:
+        if "arquivo" in request.files:
+            itens = pix_lote.ler_csv(request.files["arquivo"].read().decode("utf-8-sig"))
+        elif request.mimetype == "text/csv":
+            itens = pix_lote.ler_csv(request.get_data(as_text=True))
+        else:
+            itens = pix_lote.ler_json(request.get_json(silent=True))
+    except (ValueError, UnicodeDecodeError) as erro:
+        return {"error": str(erro)}, 400
+
+    rec = recursos()
+    if not itens:
+        return {"error": "nenhum Pix no lote"}, 400
+    if len(itens) > rec.pix_em_lote_max:
+        return {"error": f"no máximo {rec.pix_em_lote_max} Pix por lote"}, 413
+
+    cursor = get_db_leitura().cursor()
+    idContaOrigem = obter_id_conta(cursor, session["idUsuario"])
+    if not idContaOrigem:
+        return {"error": "conta não encontrada"}, 404
+
+    destinatarios = resolver_chaves_pix(pix_lote.normalizar_chave(chave) for chave, _ in itens)
+    validos, relatorio = pix_lote.validar(itens, destinatarios, session["idUsuario"])
+    total = sum(valor for _, _, valor in validos)
+    saldo = calcular_saldo_conta(cursor, idContaOrigem)
+
+    def recusar_validos(erro):
+        for posicao, _, _ in validos:
+            relatorio[posicao].update(status=pix_lote.STATUS_RECUSADO, erro=erro)
+        return {
+            "error": erro, "enviados": 0, "total": formatar_brl(0),
+            "saldo": formatar_brl(saldo), "itens": relatorio,
+        }, 422
+
+    if not validos:
+        return recusar_validos("nenhum Pix válido no lote")
+
+    # como no pix_send, a leitura é só para a resposta: o motor confere de
+    # novo com o débito condicional do total, na transação que grava o lote
+    if total > saldo:
+        return recusar_validos("saldo insuficiente para o lote")
+    try:
+        gravados = rec.shards.transferir_lote(
+            shard_do_usuario(session["idUsuario"]), idContaOrigem,
+            [(destinatario["shard"], destinatario["idConta"], valor) for _, destinatario, valor in validos],
+        )
+    except SaldoInsuficiente:
+        saldo = calcular_saldo_conta(cursor, idContaOrigem)
+        return recusar_validos("saldo insuficiente para o lote")
+
+    for (posicao, destinatario, valor), (idOrigem, idDestino) in zip(validos, gravados):
+        relatorio[posicao].update(status=pix_lote.STATUS_ENVIADO, idTransferencia=idOrigem)
+        publicar_pix(rec.eventos, idContaOrigem, idOrigem, destinatario["idConta"], idDestino, valor)
+
+    return {
+        "enviados": len(validos),
+        "recusados": len(relatorio) - len(validos),
+        "total": formatar_brl(total),
+        "saldo": formatar_brl(saldo - total),
+        "itens": relatorio,
+    }
+
+
+@bp.route("/api/pix/agendados", methods=["GET"])
+def api_pix_agendados():
+    """Agendamentos da conta: os ativos, na ordem da próxima execução, e os encerrados mais recentes."""
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
+
+    cursor = get_db_leitura().cursor()
+    idConta = obter_id_conta(cursor, session["idUsuario"])
+    if not idConta:
+        return {"error": "not found"}, 404
 
     cursor.execute("""
-        INSERT INTO transferencias (
-            idContaOrigem,
+        SELECT
+            idAgendamento,
             idContaDestino,
             valor,
-            dataTransferencia,
-            idLancamentoOrigem,
-            idLancamentoDestino
-        )
-        VALUES (?, ?, ?, ?, NULL, NULL)
-    """, (idContaOrigem, idContaDestino, valor, agora))
+            recorrencia,
+            repeticoes,
+            execucoes,
+            proximaExecucao,
+            status,
+            idUltimaTransferencia,
+            ultimoErro
+        FROM pix_agendados
+        WHERE idContaOrigem = ?
+        ORDER BY status <> 'ATIVO', proximaExecucao, idAgendamento DESC
+        LIMIT 100
+    """, (idConta,))
+    linhas = cursor.fetchall()
+
+    # e-mail do destinatário, que pode morar em outro shard
+    catalogo = get_catalogo().cursor()
+    catalogo.execute("""
+        SELECT idConta, email
+        FROM diretorio
+        WHERE idConta IN (SELECT value FROM json_each(?))
+    """, (json.dumps(sorted({linha[1] for linha in linhas})),))
+    chaves = dict(catalogo.fetchall())
+
+    return {"agendamentos": [
+        {
+            "id": a[0],
+            "chave": chaves.get(a[1]),
+            "valor": formatar_brl(a[2]),
+            "recorrencia": a[3],
+            "repeticoes": a[4],
+            "execucoes": a[5],
+            "proximaExecucao": str(a[6]).split(".")[0] if a[6] else None,
+            "status": a[7],
+            "idUltimaTransferencia": a[8],
+            "ultimoErro": a[9],
+        }
+        for a in linhas
+    ]}
 
-    db.commit()
-    session.pop("pix_chave", None)
-    return redirect("/pix-sent")
+
+@bp.route("/api/pix/agendados", methods=["POST"])
+def api_pix_agendar():
+    """
+    Agenda um Pix: {"chave", "valor", "data": "AAAA-MM-DD", "recorrencia":
+    "DIARIO" | "SEMANAL" | "MENSAL", "repeticoes"}; data, recorrência e
+    repetições são opcionais (sem data, a primeira execução é agora).
+    """
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
+
+    dados = request.get_json(silent=True) or {}
+    try:
+        valor = para_centavos(dados.get("valor"))
+    except ValueError:
+        valor = 0
+    if valor <= 0:
+        return {"error": "valor inválido"}, 400
+
+    try:
+        agendamento = agendamentos.ler_pedido(
+            dados.get("data"), dados.get("recorrencia"), dados.get("repeticoes"), datetime.now()
+        ) or (datetime.now(), None, None)
+    except ValueError as erro:
+        return {"error": str(erro)}, 400
+
+    destinatario = resolver_chave_pix(pix_lote.normalizar_chave(dados.get("chave")))
+    if not destinatario or destinatario["idConta"] is None:
+        return {"error": "chave Pix não encontrada"}, 404
+    if destinatario["id"] == session["idUsuario"]:
+        return {"error": "não é possível enviar Pix para a própria conta"}, 400
+
+    idConta = obter_id_conta(get_db_leitura().cursor(), session["idUsuario"])
+    if not idConta:
+        return {"error": "not found"}, 404
+
+    idAgendamento = agendar_pix(idConta, destinatario["idConta"], valor, *agendamento)
+    return {"id": idAgendamento, "proximaExecucao": str(agendamento[0]).split(".")[0]}, 201
+
+
+@bp.route("/api/pix/agendados/<int:idAgendamento>/cancelar", methods=["POST"])
+def api_pix_cancelar_agendado(idAgendamento):
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
+
+    idConta = obter_id_conta(get_db_leitura().cursor(), session["idUsuario"])
+    if not idConta:
+        return {"error": "not found"}, 404
+
+    # pelo motor do shard: não cruza com uma execução do mesmo agendamento
+    cancelado = recursos().shards[shard_do_usuario(session["idUsuario"])].motor.executar(
+        agendamentos.cancelar_agendamento, idAgendamento, idConta
+    )
+    if not cancelado:
+        return {"error": "agendamento não encontrado ou já encerrado"}, 404
+    return {"id": idAgendamento, "status": agendamentos.STATUS_CANCELADO}
 
 
-@app.route("/pix-sent")
+@bp.route("/api/pix/agendador")
+@rota_interna
+def api_pix_agendador():
+    return recursos().agendador.stats()
+
+
+@bp.route("/pix-sent")
 def pix_sent():
     if "idUsuario" not in session:
         return redirect("/")
-    return render_template("pix_sent.html")
+    return render_template(
+        "pix_sent.html",
+        agendado=request.args.get("agendado") == "1",
+        processando=request.args.get("processando") == "1",
+    )
 
 
-@app.route("/extrato/<int:idTransferencia>")
+@bp.route("/extrato/<int:idTransferencia>")
 def extrato(idTransferencia):
     if "idUsuario" not in session:
         return redirect("/")
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
     idContaUser = obter_id_conta(cursor, session["idUsuario"])
     if not idContaUser:
         return redirect("/dashboard")
 
-    cursor.execute("""
-        SELECT
-            t.valor,
-            t.dataTransferencia,
-            uo.nome  AS nome_origem,
-            uo.email AS email_origem,
-            ud.nome  AS nome_destino,
-            ud.email AS email_destino
-        FROM transferencias t
-        JOIN contas co ON co.idConta = t.idContaOrigem
-        JOIN usuarios uo ON uo.idUsuario = co.idUsuario
-        JOIN contas cd ON cd.idConta = t.idContaDestino
-        JOIN usuarios ud ON ud.idUsuario = cd.idUsuario
-        WHERE t.idTransferencia = ?
-          AND (t.idContaOrigem = ? OR t.idContaDestino = ?)
-        LIMIT 1
-    """, (idTransferencia, idContaUser, idContaUser))
-
-    tx = cursor.fetchone()
+    tx = buscar_transferencia(cursor, idTransferencia, idContaUser)
     if not tx:
         return redirect("/dashboard")
 
+    # a outra ponta pode morar em outro shard: nome e e-mail vêm do diretório
+    catalogo = get_catalogo().cursor()
+    catalogo.execute("""
+        SELECT idConta, nome, email
+        FROM diretorio
+        WHERE idConta IN (?, ?)
+    """, (tx[2], tx[3]))
+    pontas = {row[0]: row[1:] for row in catalogo.fetchall()}
+    origem_nome, origem_email = pontas.get(tx[2], ("", ""))
+    destino_nome, destino_email = pontas.get(tx[3], ("", ""))
+
     return render_template(
         "extrato.html",
         metodo="Pix",
-        valor=formatar_brl(float(tx[0])),
+        valor=formatar_brl(tx[0]),
         data=str(tx[1]).split(".")[0],
-        origem_nome=tx[2],
-        origem_email=tx[3],
-        destino_nome=tx[4],
-        destino_email=tx[5],
+        origem_nome=origem_nome,
+        origem_email=origem_email,
+        destino_nome=destino_nome,
+        destino_email=destino_email,
     )
 
 
-@app.route("/extrato-lista")
+@bp.route("/extrato-lista")
 def extrato_lista():
     if "idUsuario" not in session:
         return redirect("/")
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
     idContaUser = obter_id_conta(cursor, session["idUsuario"])
     if not idContaUser:
         return redirect("/dashboard")
 
-    cursor.execute("""
-        SELECT
-            t.idTransferencia,
-            CASE
-                WHEN t.idContaOrigem = ? THEN 'Pix enviado'
-                ELSE 'Pix recebido'
-            END AS descricao,
-            CASE
-                WHEN t.idContaOrigem = ? THEN 'DEBITO'
-                ELSE 'CREDITO'
-            END AS tipo,
-            t.valor,
-            t.dataTransferencia
-        FROM transferencias t
-        WHERE t.idContaOrigem = ?
-           OR t.idContaDestino = ?
-        ORDER BY t.dataTransferencia DESC
-        LIMIT 20
-    """, (idContaUser, idContaUser, idContaUser, idContaUser))
+    extrato, proximo = buscar_extrato(cursor, idContaUser, 20, request.args.get("cursor"))
+    return render_template("extrato_lista.html", extrato=extrato, proximo=proximo)
+
+
+@bp.route("/api/extrato")
+def api_extrato():
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
+
+    limite = limite_da_query(20)
+
+    db = get_db_leitura()
+    cursor = db.cursor()
+
+    idContaUser = obter_id_conta(cursor, session["idUsuario"])
+    if not idContaUser:
+        return {"error": "not found"}, 404
+
+    linhas, proximo = buscar_extrato(cursor, idContaUser, limite, request.args.get("cursor"))
+
+    transferencias = [
+        {
+            "id": t[0],
+            "descricao": t[1],
+            "tipo": t[2],
+            "valor": formatar_brl(t[3]),
+            "data": str(t[4]).split(".")[0],
+        }
+        for t in linhas
+    ]
 
-    extrato = cursor.fetchall()
-    return render_template("extrato_lista.html", extrato=extrato)
+    return {"transferencias": transferencias, "proximo": proximo}
 
 
-@app.route("/cartoes")
+@bp.route("/cartoes")
 def cartoes():
     if "idUsuario" not in session:
         return redirect("/")
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
-    cartoes = buscar_cartoes_8cols(cursor, session["idUsuario"])
+    return render_cartoes(cursor, session["idUsuario"])
 
-    faturas = []
-    lancamentos = []
-    if cartoes:
-        idCartao_sel = cartoes[0][0]
-        faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, idCartao_sel)
 
-    return render_template(
-        "cartoes.html",
-        cartoes=cartoes,
-        faturas=faturas,
-        lancamentos=lancamentos
-    )
-
-
-@app.route("/cartoes/solicitar", methods=["POST"])
+@bp.route("/cartoes/solicitar", methods=["POST"])
 def solicitar_cartao():
     if "idUsuario" not in session:
         return redirect("/")
@@ -555,20 +1365,10 @@ def solicitar_cartao():
     db = get_db()
     cursor = db.cursor()
 
-    cartoes_existentes = buscar_cartoes_8cols(cursor, session["idUsuario"])
+    versoes = versoes_cartoes(cursor, session["idUsuario"])
 
-    if len(cartoes_existentes) >= 3:
-        faturas, lancamentos = ([], [])
-        if cartoes_existentes:
-            faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, cartoes_existentes[0][0])
-
-        return render_template(
-            "cartoes.html",
-            cartoes=cartoes_existentes,
-            faturas=faturas,
-            lancamentos=lancamentos,
-            erro="Limite máximo de cartões atingido."
-        )
+    if len(versoes) >= 3:
+        return render_cartoes(cursor, session["idUsuario"], versoes, erro="Limite máximo de cartões atingido.")
 
     numero_cartao = "".join(str(random.randint(0, 9)) for _ in range(16))
     cvv = random.randint(100, 999)
@@ -577,7 +1377,7 @@ def solicitar_cartao():
     validade_ano = hoje.year + random.randint(2, 10)
     validade_mes = random.randint(1, 12)
 
-    limite = random.randrange(2000, 10001, 100)
+    limite = random.randrange(2000, 10001, 100) * 100
     bandeira = random.choice(["VISA", "MASTERCARD"])
     nome_cartao = f"Atlas Bank {bandeira}"
 
@@ -606,32 +1406,21 @@ def solicitar_cartao():
 
     db.commit()
 
-    cartoes_novos = buscar_cartoes_8cols(cursor, session["idUsuario"])
-    faturas, lancamentos = ([], [])
-    if cartoes_novos:
-        faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, cartoes_novos[0][0])
-
-    return render_template(
-        "cartoes.html",
-        cartoes=cartoes_novos,
-        faturas=faturas,
-        lancamentos=lancamentos,
-        sucesso="Cartão aprovado com sucesso!"
-    )
+    return render_cartoes(cursor, session["idUsuario"], sucesso="Cartão aprovado com sucesso!")
 
 
-@app.route("/shopping")
+@bp.route("/shopping")
 def shopping():
     if "idUsuario" not in session:
         return redirect("/")
 
     produtos = [
-        {"id": 1, "nome": "Fone Bluetooth", "valor": 299.00, "imagem": "/static/img/fone.png"},
-        {"id": 2, "nome": "Smartwatch", "valor": 649.99, "imagem": "/static/img/smartwatch.png"},
-        {"id": 3, "nome": "Notebook", "valor": 7998.00, "imagem": "/static/img/notebook.png"},
+        {"id": 1, "nome": "Fone Bluetooth", "valor": 29900, "imagem": "img/fone.png"},
+        {"id": 2, "nome": "Smartwatch", "valor": 64999, "imagem": "img/smartwatch.png"},
+        {"id": 3, "nome": "Notebook", "valor": 799800, "imagem": "img/notebook.png"},
     ]
 
-    db = get_db()
+    db = get_db_leitura()
     cursor = db.cursor()
 
     cursor.execute("""
@@ -648,7 +1437,7 @@ def shopping():
     return render_template("shopping.html", produtos=produtos, cartoes=cartoes)
 
 
-@app.route("/shopping/comprar", methods=["POST"])
+@bp.route("/shopping/comprar", methods=["POST"])
 def shopping_comprar():
     if "idUsuario" not in session:
         return redirect("/")
@@ -656,7 +1445,7 @@ def shopping_comprar():
     try:
         idCartao = int(request.form["idCartao"])
         parcelas = int(request.form["parcelas"])
-        valor_total = float(request.form["valor"])
+        valor_total = para_centavos(request.form["valor"])
         descricao_item = request.form.get("descricao", "Item")
     except:
         return redirect("/shopping")
@@ -676,120 +1465,305 @@ def shopping_comprar():
     """, (idCartao, session["idUsuario"]))
     row_cartao = cursor.fetchone()
 
-    cartoes = buscar_cartoes_8cols(cursor, session["idUsuario"])
-
     if not row_cartao:
-        faturas, lancamentos = ([], [])
-        if cartoes:
-            faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, cartoes[0][0])
-        return render_template("cartoes.html", cartoes=cartoes, faturas=faturas, lancamentos=lancamentos, erro="Cartão inválido.")
+        return render_cartoes(cursor, session["idUsuario"], erro="Cartão inválido.")
 
-    limite_disponivel = float(row_cartao[0])
+    limite_disponivel = row_cartao[0]
 
     if valor_total <= 0:
-        faturas, lancamentos = ([], [])
-        if cartoes:
-            faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, cartoes[0][0])
-        return render_template("cartoes.html", cartoes=cartoes, faturas=faturas, lancamentos=lancamentos, erro="Valor inválido para a compra.")
+        return render_cartoes(cursor, session["idUsuario"], erro="Valor inválido para a compra.")
 
     if valor_total > limite_disponivel:
-        faturas, lancamentos = ([], [])
-        if cartoes:
-            faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, cartoes[0][0])
-        return render_template("cartoes.html", cartoes=cartoes, faturas=faturas, lancamentos=lancamentos, erro="Limite insuficiente para realizar a compra.")
+        return render_cartoes(cursor, session["idUsuario"], erro="Limite insuficiente para realizar a compra.")
 
     # pega conta do usuário (pra gravar em lancamentos)
+    idConta = obter_id_conta(cursor, session["idUsuario"])
+    if not idConta:
+        return redirect("/dashboard")
+
+    if not lancar_compra_parcelada(cursor, idCartao, idConta, session["idUsuario"],
+                                   valor_total, parcelas, descricao_item, datetime.now()):
+        db.rollback()
+        return render_cartoes(cursor, session["idUsuario"], erro="Limite insuficiente para realizar a compra.")
+
+    db.commit()
+
+    recursos().eventos.publicar(idConta, "lancamento", {
+        "idCartao": idCartao,
+        "descricao": f"Compra {descricao_item}",
+        "parcelas": parcelas,
+        "valor": formatar_brl(valor_total),
+        "data": str(datetime.now()).split(".")[0],
+    })
+
+    # a compra subiu a versão do cartão: limite e fatura saem renderizados de novo
+    return render_cartoes(cursor, session["idUsuario"], sucesso="Compra aprovada com sucesso!")
+
+
+def versao_cartao(cursor, idCartao: int, idUsuario: int):
+    """Versão do cartão (muda a cada compra/fechamento) ou None se não for do usuário."""
     cursor.execute("""
-        SELECT idConta
-        FROM contas
-        WHERE idUsuario = ?
+        SELECT versao
+        FROM cartoesCredito
+        WHERE idCartao = ? AND idUsuario = ?
         LIMIT 1
-    """, (session["idUsuario"],))
-    row_conta = cursor.fetchone()
-    if not row_conta:
-        return redirect("/dashboard")
-    idConta = row_conta[0]
+    """, (idCartao, idUsuario))
+    row = cursor.fetchone()
+    return row[0] if row else None
 
-    hoje = datetime.now()
 
-    valor_parcela = round(valor_total / parcelas, 2)
-    total_parcelas_calc = round(valor_parcela * parcelas, 2)
-    ajuste = round(valor_total - total_parcelas_calc, 2)
+def etag_cartao(idCartao: int, versao: int) -> str:
+    # a mesma versão do cartão com outra página/fatura é outra resposta
+    return f"c{idCartao}-v{versao}-{zlib.crc32(request.query_string):08x}"
 
-    for i in range(parcelas):
-        data_parcela = add_months(hoje, i)
-        mes_ref = data_parcela.month
-        ano_ref = data_parcela.year
 
-        idFatura = get_or_create_fatura(cursor, idCartao, mes_ref, ano_ref)
+def resposta_com_etag(dados, etag):
+    resposta = jsonify(dados)
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "private, no-cache"
+    return resposta
 
-        valor_i = valor_parcela + (ajuste if i == parcelas - 1 else 0.0)
 
-        descricao = (
-            f"Compra {descricao_item} ({i + 1}/{parcelas})"
-            if parcelas > 1 else
-            f"Compra {descricao_item}"
-        )
+@bp.route("/api/cartoes/<int:idCartao>/faturas")
+def api_faturas_cartao(idCartao):
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
 
-        cursor.execute("""
-            INSERT INTO lancamentos (
-                idConta,
-                idUsuario,
-                idGrupo,
-                idFatura,
-                valor,
-                tipo,
-                descricao,
-                dataLancamento
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            idConta,
-            session["idUsuario"],
-            1,
-            idFatura,
-            valor_i,
-            "DEBITO",
-            descricao,
-            hoje
-        ))
+    db = get_db_leitura()
+    cursor = db.cursor()
 
-        cursor.execute("""
-            UPDATE faturas
-            SET valorTotal = valorTotal + ?
-            WHERE idFatura = ?
-        """, (valor_i, idFatura))
+    # segurança: garante que o cartão é do usuário
+    versao = versao_cartao(cursor, idCartao, session["idUsuario"])
+    if versao is None:
+        return {"error": "forbidden"}, 403
+
+    etag = etag_cartao(idCartao, versao)
+    if request.if_none_match.contains(etag):
+        return resposta_com_etag({}, etag).make_conditional(request)
+
+    limite = limite_da_query(12, 60)
+    ano_c, mes_c = decodificar_cursor(request.args.get("cursor"), CURSOR_INICIO_FATURAS)
 
     cursor.execute("""
-        UPDATE cartoesCredito
-        SET limite = limite - ?
+        SELECT
+            idFatura,
+            mesReferencia,
+            anoReferencia,
+            valorTotal,
+            statusPagamento
+        FROM faturas
         WHERE idCartao = ?
-    """, (valor_total, idCartao))
-
-    db.commit()
+          AND (anoReferencia, mesReferencia) < (?, ?)
+        ORDER BY anoReferencia DESC, mesReferencia DESC
+        LIMIT ?
+    """, (idCartao, ano_c, mes_c, limite + 1))
+    linhas = cursor.fetchall()
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = codificar_cursor(linhas[-1][2], linhas[-1][1])
+
+    faturas = [
+        {
+            "id": f[0],
+            "mes": f[1],
+            "ano": f[2],
+            "valorTotal": formatar_brl(f[3]),
+            "status": f[4],
+        }
+        for f in linhas
+    ]
 
-    # recarrega para render (com lançamentos)
-    cartoes = buscar_cartoes_8cols(cursor, session["idUsuario"])
-    faturas, lancamentos = ([], [])
-    if cartoes:
-        # mostra extrato do cartão usado na compra, se existir na lista
-        idCartao_sel = idCartao
-        faturas, lancamentos = carregar_faturas_e_lancamentos(cursor, idCartao_sel)
+    return resposta_com_etag({"faturas": faturas, "proximo": proximo}, etag)
 
-    return render_template(
-        "cartoes.html",
-        cartoes=cartoes,
-        faturas=faturas,
-        lancamentos=lancamentos,
-        sucesso="Compra aprovada com sucesso!"
-    )
 
-@app.route("/api/cartoes/<int:idCartao>/lancamentos")
+@bp.route("/api/cartoes/<int:idCartao>/lancamentos")
 def api_lancamentos_cartao(idCartao):
     if "idUsuario" not in session:
         return {"error": "unauthorized"}, 401
 
-    db = get_db()
+    db = get_db_leitura()
+    cursor = db.cursor()
+
+    # segurança: garante que o cartão é do usuário
+    versao = versao_cartao(cursor, idCartao, session["idUsuario"])
+    if versao is None:
+        return {"error": "forbidden"}, 403
+
+    etag = etag_cartao(idCartao, versao)
+    if request.if_none_match.contains(etag):
+        return resposta_com_etag({}, etag).make_conditional(request)
+
+    idFatura = request.args.get("fatura", type=int)
+    linhas, proximo = buscar_lancamentos(
+        cursor,
+        idCartao,
+        limite_da_query(LIMITE_LANCAMENTOS),
+        request.args.get("cursor"),
+        idFatura,
+    )
+
+    lancamentos = [
+        {
+            "id": l[0],
+            "descricao": l[1],
+            "valor": formatar_brl(l[2]),
+            "data": str(l[3]).split(".")[0],
+            "mes": l[4],
+            "ano": l[5],
+        }
+        for l in linhas
+    ]
+
+    return resposta_com_etag({"lancamentos": lancamentos, "proximo": proximo}, etag)
+
+
+def lotes_por_grupo(cursor, particoes, consultar):
+    """
+    Linhas, em lotes, de uma exportação que lê o banco quente e os arquivos
+    das partições. Mais anos do que cabem anexados rodam por grupos
+    (arquivo.grupos()), em ordem: cada grupo anexa os próprios arquivos e
+    chama consultar(grupo, primeiro_ano, ano_seguinte), que executa no cursor
+    a consulta restrita àqueles anos. O primeiro grupo roda já, para um erro
+    sair antes de a resposta começar.
+    """
+    grupos = arquivo.grupos(particoes)
+
+    def executar(grupo, primeiro_ano, ano_seguinte):
+        arquivo.anexar_grupo(cursor, grupo)
+        consultar(grupo, primeiro_ano, ano_seguinte)
+
+    def lotes():
+        yield from exportacao.iterar_lotes(cursor)
+        for grupo in grupos[1:]:
+            executar(*grupo)
+            yield from exportacao.iterar_lotes(cursor)
+
+    executar(*grupos[0])
+    return lotes()
+
+
+def com_email_da_contraparte(lotes, catalogo):
+    """
+    Troca a conta da outra ponta (última coluna de cada linha) pelo e-mail,
+    lido do diretório do catálogo num SELECT por lote: num Pix entre shards
+    a outra conta não está no shard de quem exporta.
+    """
+    for lote in lotes:
+        catalogo.execute("""
+            SELECT idConta, email
+            FROM diretorio
+            WHERE idConta IN (SELECT value FROM json_each(?))
+        """, (json.dumps(sorted({linha[-1] for linha in lote})),))
+        emails = dict(catalogo.fetchall())
+        yield [(*linha[:-1], emails.get(linha[-1], "")) for linha in lote]
+
+
+def resposta_exportacao(formato, nome_arquivo, conteudo):
+    return Response(
+        stream_with_context(conteudo),
+        mimetype=exportacao.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'},
+    )
+
+
+@bp.route("/exportar/extrato.<formato>")
+def exportar_extrato(formato):
+    if "idUsuario" not in session:
+        return redirect("/")
+
+    if formato not in exportacao.FORMATOS:
+        return {"error": "formato inválido"}, 404
+
+    try:
+        inicio, fim = exportacao.intervalo_datas(request.args.get("de"), request.args.get("ate"))
+    except ValueError:
+        return {"error": "datas devem estar no formato AAAA-MM-DD"}, 400
+
+    db = get_db_leitura()
+    cursor = db.cursor()
+
+    idContaUser = obter_id_conta(cursor, session["idUsuario"])
+    if not idContaUser:
+        return redirect("/dashboard")
+
+    saldo = calcular_saldo_conta(cursor, idContaUser)
+
+    # as duas direções de cada banco (quente e arquivos do período) vêm
+    # ordenadas dos próprios índices e o SQLite só intercala (MERGE), sem
+    # ordenar o extrato inteiro
+    particoes = [
+        particao for particao in arquivo.particoes(cursor)
+        if f"{particao[0]}-01-01" < fim and inicio < arquivo.teto(particao)
+    ]
+    consulta = """
+        SELECT
+            t.idTransferencia AS id,
+            t.dataTransferencia AS data,
+            'DEBITO',
+            'Pix enviado',
+            t.valor / 100.0,
+            t.idContaDestino
+        FROM {esquema}.transferencias t
+        WHERE t.idContaOrigem = ?
+          AND t.dataTransferencia >= ?
+          AND t.dataTransferencia < ?
+        UNION ALL
+        SELECT
+            t.idTransferencia,
+            t.dataTransferencia,
+            'CREDITO',
+            'Pix recebido',
+            t.valor / 100.0,
+            t.idContaOrigem
+        FROM {esquema}.transferencias t
+        WHERE t.idContaDestino = ?
+          AND t.dataTransferencia >= ?
+          AND t.dataTransferencia < ?
+    """
+    # com mais anos arquivados do que cabem anexados, uma consulta por grupo
+    # de anos, e o banco quente só naqueles anos
+    def consultar(grupo, primeiro_ano, ano_seguinte):
+        de = inicio if primeiro_ano is None else max(inicio, f"{primeiro_ano}-01-01")
+        ate = fim if ano_seguinte is None else min(fim, f"{ano_seguinte}-01-01")
+        fontes = [("main", de, ate)] + [
+            (arquivo.esquema(particao[0]), inicio, min(fim, arquivo.teto(particao)))
+            for particao in grupo
+        ]
+        cursor.execute(
+            " UNION ALL ".join(consulta.format(esquema=esquema) for esquema, _, _ in fontes) + " ORDER BY data, id",
+            [p for _, desde, ate_fonte in fontes for p in (idContaUser, desde, ate_fonte, idContaUser, desde, ate_fonte)],
+        )
+
+    lotes = lotes_por_grupo(cursor, particoes, consultar)
+    if formato == "csv":
+        lotes = com_email_da_contraparte(lotes, get_catalogo().cursor())
+        conteudo = exportacao.gerar_csv(exportacao.COLUNAS_TRANSFERENCIAS, lotes)
+    elif formato == "ndjson":
+        lotes = com_email_da_contraparte(lotes, get_catalogo().cursor())
+        conteudo = exportacao.gerar_ndjson(exportacao.COLUNAS_TRANSFERENCIAS, lotes)
+    else:
+        # o OFX não leva a contraparte
+        conteudo = exportacao.gerar_ofx(lotes, "conta", idContaUser, saldo / 100)
+
+    return resposta_exportacao(formato, f"extrato-{idContaUser}", conteudo)
+
+
+@bp.route("/exportar/cartoes/<int:idCartao>/lancamentos.<formato>")
+def exportar_lancamentos_cartao(idCartao, formato):
+    if "idUsuario" not in session:
+        return redirect("/")
+
+    if formato not in exportacao.FORMATOS:
+        return {"error": "formato inválido"}, 404
+
+    try:
+        inicio, fim = exportacao.intervalo_datas(request.args.get("de"), request.args.get("ate"))
+    except ValueError:
+        return {"error": "datas devem estar no formato AAAA-MM-DD"}, 400
+
+    db = get_db_leitura()
     cursor = db.cursor()
 
     # segurança: garante que o cartão é do usuário
@@ -803,37 +1777,139 @@ def api_lancamentos_cartao(idCartao):
     if not cursor.fetchone():
         return {"error": "forbidden"}, 403
 
-    cursor.execute("""
+    # lançamentos arquivados: todo arquivo com corte depois do início do
+    # período (o ano do arquivo é o da fatura, não o da compra)
+    particoes = [particao for particao in arquivo.particoes(cursor) if inicio < particao[2]]
+    consulta = """
         SELECT
-            l.descricao,
-            l.valor,
+            l.idLancamento,
             l.dataLancamento,
+            l.tipo,
+            l.descricao,
+            l.valor / 100.0,
             f.mesReferencia,
             f.anoReferencia
-        FROM lancamentos l
-        JOIN faturas f ON f.idFatura = l.idFatura
+        FROM faturas f
+        JOIN {esquema}.lancamentos l ON l.idFatura = f.idFatura
         WHERE f.idCartao = ?
-        ORDER BY f.anoReferencia DESC, f.mesReferencia DESC, l.dataLancamento DESC
-    """, (idCartao,))
+          AND f.anoReferencia >= ?
+          AND f.anoReferencia < ?
+          AND l.dataLancamento >= ?
+          AND l.dataLancamento < ?
+    """
+    # por grupos de anos da fatura, como no extrato: a ordem começa pelo ano
+    def consultar(grupo, primeiro_ano, ano_seguinte):
+        anos = (primeiro_ano or 0, ano_seguinte or 10000)
+        fontes = [("main", fim)] + [(arquivo.esquema(particao[0]), min(fim, particao[2])) for particao in grupo]
+        cursor.execute(
+            " UNION ALL ".join(consulta.format(esquema=esquema) for esquema, _ in fontes)
+            + " ORDER BY anoReferencia, mesReferencia, dataLancamento, idLancamento",
+            [p for _, ate in fontes for p in (idCartao, *anos, inicio, ate)],
+        )
+
+    lotes = lotes_por_grupo(cursor, particoes, consultar)
+    if formato == "csv":
+        conteudo = exportacao.gerar_csv(exportacao.COLUNAS_LANCAMENTOS, lotes)
+    elif formato == "ndjson":
+        conteudo = exportacao.gerar_ndjson(exportacao.COLUNAS_LANCAMENTOS, lotes)
+    else:
+        conteudo = exportacao.gerar_ofx(lotes, "cartao", idCartao)
+
+    return resposta_exportacao(formato, f"cartao-{idCartao}-lancamentos", conteudo)
+
+
+@bp.route("/api/db-pool")
+@rota_interna
+def api_db_pool():
+    return recursos().shards.stats_pools()
+
+
+@bp.route("/api/cache")
+@rota_interna
+def api_cache():
+    rec = recursos()
+    return {
+        rec.cache_contas.nome: rec.cache_contas.stats(),
+        rec.cache_chaves_pix.nome: rec.cache_chaves_pix.stats(),
+        rec.cache_shards.nome: rec.cache_shards.stats(),
+        rec.cache_fragmentos.nome: rec.cache_fragmentos.stats(),
+    }
+
+
+@bp.route("/api/senhas")
+@rota_interna
+def api_senhas():
+    return senhas.stats()
+
+
+@bp.route("/api/eventos")
+def api_eventos():
+    """
+    Server-Sent Events da conta logada: "transferencia" (Pix enviado ou
+    recebido) e "lancamento" (compra no cartão), publicados por quem gravou,
+    sem consulta ao banco enquanto a conexão fica aberta. ?desde= (ou o
+    Last-Event-ID da reconexão) reenvia os eventos recentes perdidos.
+    """
+    if "idUsuario" not in session:
+        return {"error": "unauthorized"}, 401
+
+    idConta = obter_id_conta(get_db_leitura().cursor(), session["idUsuario"])
+    if not idConta:
+        return {"error": "conta não encontrada"}, 404
+
+    try:
+        desde = int(request.headers.get("Last-Event-ID") or request.args.get("desde", 0))
+    except ValueError:
+        desde = 0
+
+    rec = recursos()
+    assinatura = rec.eventos.assinar(idConta, desde)
+    if assinatura is None:
+        # o EventSource não reconecta depois de um 503: a página segue sem tempo real
+        resposta = jsonify({"error": "limite de conexões de eventos atingido"})
+        resposta.status_code = 503
+        resposta.headers["Retry-After"] = "30"
+        return resposta
+
+    # sem stream_with_context: a conexão do pool volta no fim desta função,
+    # não quando o stream terminar
+    resposta = Response(
+        rec.eventos.stream(assinatura, rec.sse_heartbeat_s, rec.sse_duracao_max_s),
+        mimetype="text/event-stream",
+    )
+    resposta.call_on_close(partial(rec.eventos.cancelar, assinatura))
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
+
+
+@bp.route("/api/eventos/stats")
+@rota_interna
+def api_eventos_stats():
+    return recursos().eventos.stats()
+
+
+@bp.route("/api/transferencias/metricas")
+@rota_interna
+def api_transferencias_metricas():
+    return recursos().shards.stats_motores()
 
-    lancamentos = [
-        {
-            "descricao": l[0],
-            "valor": f"{l[1]:.2f}".replace(".", ","),
-            "data": str(l[2]).split(".")[0],
-            "mes": l[3],
-            "ano": l[4],
-        }
-        for l in cursor.fetchall()
-    ]
 
-    return {"lancamentos": lancamentos}
+@bp.route("/metrics")
+@rota_interna
+def metrics():
+    return Response(metricas.registro.exportar(), content_type=metricas.CONTENT_TYPE)
 
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     session.clear()
     return redirect("/")
 
 
-app.run(debug=True)
+if __name__ == "__main__":
+    app = create_app()
+    # com o reloader do debug, só o processo filho atende (e executa agendamentos)
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN"):
+        inicializar_worker(app)
+    app.run()
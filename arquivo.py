@@ -0,0 +1,105 @@
+"""
+Histórico arquivado: database/arquivar.py tira do banco quente as
+transferências e os lançamentos mais antigos que a janela de retenção e os
+grava num arquivo SQLite por ano, registrado em `arquivamentos`. Extrato,
+detalhe da transferência, lançamentos do cartão e exportações continuam
+lendo tudo: o arquivo de um ano só é anexado (ATTACH, somente leitura) à
+conexão de leitura quando uma consulta chega nele, e fica anexado enquanto
+a conexão estiver no pool.
+
+Num arquivo só contam as linhas com data antes de arquivadoAte (o corte da
+última execução que gravou naquele ano): se o arquivamento parar entre o
+COMMIT do arquivo e o do banco quente, as linhas copiadas a mais ficam
+invisíveis até a próxima execução apagá-las do quente.
+"""
+import os
+from urllib.request import pathname2url
+
+# o SQLite anexa no máximo 10 bancos por conexão: acima disso, os arquivos
+# anexados há mais tempo saem para dar lugar ao que a consulta precisa, e uma
+# consulta que lê mais anos que isso roda por grupos (ver grupos())
+MAX_ANEXADOS = 10
+
+# arquivadoAte do banco quente: nenhuma linha dele fica de fora
+SEM_CORTE = "9999-12-31"
+
+
+def esquema(ano: int) -> str:
+    return f"arquivo_{int(ano)}"
+
+
+def particoes(cursor):
+    """
+    Arquivos registrados, do ano mais novo para o mais antigo, como
+    (ano, arquivo, arquivadoAte). Transferências ficam no ano da data;
+    lançamentos, no ano de referência da fatura.
+    """
+    cursor.execute("""
+        SELECT ano, arquivo, arquivadoAte
+        FROM arquivamentos
+        ORDER BY ano DESC
+    """)
+    return cursor.fetchall()
+
+
+def teto(particao) -> str:
+    """Limite (exclusivo) das datas das transferências guardadas no arquivo."""
+    ano, _, arquivado_ate = particao
+    return min(arquivado_ate, f"{ano + 1}-01-01")
+
+
+def grupos(particoes):
+    """
+    Divide as partições, do ano mais antigo para o mais novo, em grupos de
+    até MAX_ANEXADOS, como (partições, primeiro ano, ano seguinte): a consulta
+    de cada grupo lê, do banco quente, só os anos de primeiro ano até antes
+    do ano seguinte (None nas pontas: sem limite). Sempre há ao menos um
+    grupo, nem que seja só o banco quente.
+    """
+    ordenadas = sorted(particoes)
+    partes = [ordenadas[i:i + MAX_ANEXADOS] for i in range(0, len(ordenadas), MAX_ANEXADOS)] or [[]]
+    return [
+        (parte,
+         parte[0][0] if i > 0 else None,
+         partes[i + 1][0][0] if i + 1 < len(partes) else None)
+        for i, parte in enumerate(partes)
+    ]
+
+
+def anexar(cursor, particao, em_uso=()) -> str:
+    """
+    Anexa o arquivo da partição à conexão do cursor, se ainda não estiver,
+    e devolve o nome do esquema para as consultas ({esquema}.transferencias).
+    Os esquemas em em_uso (os que a mesma consulta já anexou) nunca saem.
+    """
+    ano, arquivo, _ = particao
+    nome = esquema(ano)
+
+    cursor.execute("PRAGMA database_list")
+    bancos = {banco: caminho for _, banco, caminho in cursor.fetchall()}
+    if nome in bancos:
+        return nome
+
+    anexados = [banco for banco in bancos if banco.startswith("arquivo_")]
+    livres = [banco for banco in anexados if banco not in em_uso]
+    excesso = len(anexados) + 1 - MAX_ANEXADOS
+    if excesso > len(livres):
+        raise RuntimeError(f"uma consulta anexa no máximo {MAX_ANEXADOS} arquivos: use grupos()")
+    for antigo in livres[:max(0, excesso)]:
+        cursor.execute(f"DETACH DATABASE {antigo}")
+
+    # o arquivo fica na pasta do banco quente
+    caminho = os.path.join(os.path.dirname(bancos["main"]), arquivo)
+    cursor.execute(
+        f"ATTACH DATABASE ? AS {nome}",
+        (f"file:{pathname2url(os.path.abspath(caminho))}?mode=ro",),
+    )
+    return nome
+
+
+def anexar_grupo(cursor, particoes) -> list:
+    """Anexa juntas as partições de um grupo (grupos()) e devolve os esquemas."""
+    esquemas = []
+    for particao in particoes:
+        esquemas.append(anexar(cursor, particao, em_uso=esquemas))
+    return esquemas
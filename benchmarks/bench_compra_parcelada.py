@@ -0,0 +1,132 @@
+"""
+Comandos SQL e tempo por compra parcelada: caminho antigo (get_or_create_fatura
++ INSERT + UPDATE por parcela) contra lancar_compra_parcelada (número fixo de
+comandos, com executemany).
+
+    python benchmarks/bench_compra_parcelada.py [--compras 200]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from compras import add_months, datas_fatura, dividir_parcelas, lancar_compra_parcelada  # noqa: E402
+from database.migracoes import aplicar_migracoes  # noqa: E402
+
+
+class CursorContador:
+    """Conta as idas ao SQLite (execute/executemany) feitas pelo código Python."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.chamadas = 0
+
+    def execute(self, *args):
+        self.chamadas += 1
+        return self._cursor.execute(*args)
+
+    def executemany(self, *args):
+        self.chamadas += 1
+        return self._cursor.executemany(*args)
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+
+def compra_antiga(cursor, idCartao, idConta, idUsuario, valor_total, parcelas, descricao_item, hoje):
+    """O laço de shopping_comprar antes do lançamento em lote."""
+    for i, valor_i in enumerate(dividir_parcelas(valor_total, parcelas)):
+        data_parcela = add_months(hoje, i)
+        mes_ref, ano_ref = data_parcela.month, data_parcela.year
+
+        cursor.execute("""
+            SELECT idFatura FROM faturas
+            WHERE idCartao = ? AND mesReferencia = ? AND anoReferencia = ?
+            LIMIT 1
+        """, (idCartao, mes_ref, ano_ref))
+        row = cursor.fetchone()
+        if row:
+            idFatura = row[0]
+        else:
+            data_fechamento, data_vencimento = datas_fatura(mes_ref, ano_ref)
+            cursor.execute("""
+                INSERT INTO faturas (idCartao, mesReferencia, anoReferencia, dataFechamento,
+                                     dataVencimento, valorTotal, statusPagamento)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (idCartao, mes_ref, ano_ref, data_fechamento, data_vencimento, 0, "ABERTA"))
+            idFatura = cursor.lastrowid
+
+        cursor.execute("""
+            INSERT INTO lancamentos (idConta, idUsuario, idGrupo, idFatura, valor, tipo, descricao, dataLancamento)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (idConta, idUsuario, 1, idFatura, valor_i, "DEBITO", f"Compra {descricao_item}", hoje))
+        cursor.execute("UPDATE faturas SET valorTotal = valorTotal + ? WHERE idFatura = ?", (valor_i, idFatura))
+
+    cursor.execute("UPDATE cartoesCredito SET limite = limite - ? WHERE idCartao = ?", (valor_total, idCartao))
+    return True
+
+
+def criar_banco(path):
+    origem = sqlite3.connect(os.path.join(RAIZ, "database", "banco.sqlite"))
+    conn = sqlite3.connect(path)
+    for (sql,) in origem.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY type = 'index'
+    """):
+        conn.execute(sql)
+    origem.close()
+    aplicar_migracoes(conn)
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    conn.execute("INSERT INTO usuarios (nome, email, senha, data_cadastro) VALUES ('Bench', 'b@b', '-', ?)",
+                 (datetime.now(),))
+    conn.execute("INSERT INTO contas (idUsuario, tipo, saldoInicial, dataCriacao) VALUES (1, 'corrente', 0, ?)",
+                 (datetime.now(),))
+    conn.execute("""
+        INSERT INTO cartoesCredito (idUsuario, nome, limite, bandeira, numero_cartao, cvv, validadeMes, validadeAno)
+        VALUES (1, 'Bench', 100000000000000, 'VISA', '0000000000000000', '000', 1, 2099)
+    """)
+    conn.commit()
+    return conn
+
+
+def medir(funcao, parcelas, compras):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = criar_banco(os.path.join(tmp, "bench.sqlite"))
+
+        comandos = [0]
+        conn.set_trace_callback(lambda _: comandos.__setitem__(0, comandos[0] + 1))
+        cursor = CursorContador(conn.cursor())
+
+        inicio = time.perf_counter()
+        for i in range(compras):
+            funcao(cursor, 1, 1, 1, 123456, parcelas, f"Item {i}", datetime(2025, 1, 15))
+            conn.commit()
+        duracao = time.perf_counter() - inicio
+
+        conn.close()
+        return cursor.chamadas / compras, comandos[0] / compras, duracao / compras * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--compras", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'parcelas':>8} | {'caminho':<8} | {'chamadas/compra':>15} | {'stmts SQLite/compra':>19} | {'ms/compra':>9}")
+    print("-" * 72)
+    for parcelas in (1, 3, 6, 12):
+        for nome, funcao in (("antigo", compra_antiga), ("lote", lancar_compra_parcelada)):
+            chamadas, comandos, ms = medir(funcao, parcelas, args.compras)
+            print(f"{parcelas:>8} | {nome:<8} | {chamadas:>15.1f} | {comandos:>19.1f} | {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Valores em centavos contra o caminho antigo em REAL, num extrato grande:
+formatação (formatar_brl com replace encadeados e o filtro "%.2f"|format|replace
+dos templates, contra dinheiro.formatar_brl), renderização da lista do extrato
+e soma dos valores por conta (REAL sem índice de cobertura, contra INTEGER
+lido só do índice), com o erro acumulado da soma em REAL.
+
+    python benchmarks/bench_dinheiro.py [--linhas 200000] [--contas 2000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from jinja2 import Environment
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from dinheiro import formatar_brl  # noqa: E402
+
+
+def formatar_brl_antigo(valor: float) -> str:
+    """O formatar_brl do app antes dos centavos."""
+    return (
+        f"{valor:,.2f}"
+        .replace(",", "X")
+        .replace(".", ",")
+        .replace("X", ".")
+    )
+
+
+# o laço de extrato_lista.html, com o filtro de antes e o de agora
+LINHA_ANTIGA = """{% for id, descricao, tipo, valor, data in extrato %}
+<div class="tx-item"><span>{{ descricao }}</span><span>{{ data }}</span>
+<strong>R$ {{ "%.2f"|format(valor)|replace('.', ',') }}</strong></div>
+{% endfor %}"""
+LINHA_NOVA = """{% for id, descricao, tipo, valor, data in extrato %}
+<div class="tx-item"><span>{{ descricao }}</span><span>{{ data }}</span>
+<strong>R$ {{ valor|brl }}</strong></div>
+{% endfor %}"""
+
+
+def cronometrar(funcao, repeticoes=3):
+    """Melhor de `repeticoes` execuções, em ms, e o resultado da última."""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000, resultado
+
+
+def criar_banco(centavos, linhas):
+    """
+    transferencias em memória com os mesmos valores, em INTEGER (centavos, com
+    o índice de cobertura da migração 7) ou em REAL (reais, índice antigo).
+    """
+    conn = sqlite3.connect(":memory:")
+    tipo, coluna_indice = ("INTEGER", ", valor") if centavos else ("REAL", "")
+    conn.execute(f"""
+        CREATE TABLE transferencias (
+            idTransferencia INTEGER PRIMARY KEY,
+            idContaOrigem INTEGER NOT NULL,
+            idContaDestino INTEGER NOT NULL,
+            valor {tipo} NOT NULL,
+            dataTransferencia DATETIME NOT NULL
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO transferencias VALUES (?, ?, ?, ?, ?)",
+        ((i, o, d, v if centavos else v / 100, data) for i, o, d, v, data in linhas),
+    )
+    conn.execute(f"""
+        CREATE INDEX idx_origem
+        ON transferencias (idContaOrigem, dataTransferencia{coluna_indice})
+    """)
+    conn.execute("ANALYZE")
+    return conn
+
+
+def somar_por_conta(conn, contas):
+    return [
+        conn.execute(
+            "SELECT IFNULL(SUM(valor), 0) FROM transferencias WHERE idContaOrigem = ?", (c,)
+        ).fetchone()[0]
+        for c in range(1, contas + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=200000, help="lançamentos no extrato")
+    parser.add_argument("--contas", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # valores log-normais como os da massa sintética (mediana de R$ 80)
+    valores = [max(1, round(rng.lognormvariate(8.99, 1.1))) for _ in range(args.linhas)]
+    reais = [v / 100 for v in valores]
+
+    print(f"{'etapa':<26} | {'REAL (antigo)':>14} | {'centavos':>10} | {'ganho':>6}")
+    print("-" * 66)
+
+    def linha(etapa, antigo, novo):
+        print(f"{etapa:<26} | {antigo:>11.1f} ms | {novo:>7.1f} ms | {antigo / novo:>5.1f}x")
+
+    # 1. formatação pura, valor a valor
+    ms_antigo, saida_antiga = cronometrar(lambda: [formatar_brl_antigo(v) for v in reais])
+    ms_novo, saida_nova = cronometrar(lambda: [formatar_brl(v) for v in valores])
+    assert saida_antiga == saida_nova, "formatações diferentes"
+    linha("formatar_brl", ms_antigo, ms_novo)
+
+    # 2. o extrato inteiro renderizado pelo Jinja
+    env = Environment(autoescape=True)
+    env.filters["brl"] = formatar_brl
+    antigo = env.from_string(LINHA_ANTIGA)
+    novo = env.from_string(LINHA_NOVA)
+    data = "2025-01-15 10:30:00"
+    extrato_reais = [(i, "Pix enviado", "DEBITO", v, data) for i, v in enumerate(reais)]
+    extrato_centavos = [(i, "Pix enviado", "DEBITO", v, data) for i, v in enumerate(valores)]
+    ms_antigo, _ = cronometrar(lambda: antigo.render(extrato=extrato_reais))
+    ms_novo, _ = cronometrar(lambda: novo.render(extrato=extrato_centavos))
+    linha("template do extrato", ms_antigo, ms_novo)
+
+    # 3. soma por conta no SQLite (o que reconciliar_saldos.py faz)
+    linhas = [
+        (i, rng.randint(1, args.contas), rng.randint(1, args.contas), v, f"2025-01-{1 + i % 28:02d}")
+        for i, v in enumerate(valores, start=1)
+    ]
+    real = criar_banco(False, linhas)
+    inteiro = criar_banco(True, linhas)
+    ms_antigo, somas_reais = cronometrar(lambda: somar_por_conta(real, args.contas))
+    ms_novo, somas_centavos = cronometrar(lambda: somar_por_conta(inteiro, args.contas))
+    linha("soma por conta", ms_antigo, ms_novo)
+
+    sql = "EXPLAIN QUERY PLAN SELECT SUM(valor) FROM transferencias WHERE idContaOrigem = ?"
+    print()
+    print(f"plano REAL:     {real.execute(sql, (1,)).fetchone()[3]}")
+    print(f"plano centavos: {inteiro.execute(sql, (1,)).fetchone()[3]}")
+
+    erradas = sum(
+        1 for r, c in zip(somas_reais, somas_centavos)
+        if r != c / 100
+    )
+    desvio = max((abs(r * 100 - c) for r, c in zip(somas_reais, somas_centavos)), default=0)
+    print(f"somas em REAL diferentes da exata: {erradas}/{args.contas} "
+          f"(maior desvio: {desvio:.2e} centavo)")
+
+
+if __name__ == "__main__":
+    main()
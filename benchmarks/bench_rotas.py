@@ -0,0 +1,465 @@
+"""
+Latência (p50/p95/p99), vazão e comandos SQL por requisição das rotas
+principais do app.py, contra massas geradas por database/criar_usuario.py em
+vários tamanhos. Compara com um baseline salvo e sai com código 1 se alguma
+rota piorar além da tolerância.
+
+    python benchmarks/bench_rotas.py                          # pequeno e medio, test client
+    python benchmarks/bench_rotas.py --tamanhos grande --requisicoes 500
+    python benchmarks/bench_rotas.py --salvar-baseline        # grava o baseline desta máquina
+    python benchmarks/bench_rotas.py --servidor "gunicorn -c gunicorn.conf.py -w 4 -b 127.0.0.1:{porta} wsgi:app"
+
+Com --servidor o app roda no comando dado (multi-worker) e as rotas são
+chamadas por HTTP com --concorrencia clientes em paralelo; nesse modo não há
+contagem de comandos SQL, que acontecem em outros processos.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+from database.migracoes import aplicar_migracoes  # noqa: E402
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+DADOS = os.path.join(AQUI, "dados")
+BASELINE = os.path.join(AQUI, "baseline_rotas.json")
+
+# argumentos de criar_usuario.py para cada tamanho de massa
+TAMANHOS = {
+    "pequeno": ["--usuarios", "1000", "--transferencias", "50000"],
+    "medio": ["--usuarios", "10000", "--transferencias", "500000"],
+    "grande": ["--usuarios", "100000", "--transferencias", "5000000"],
+}
+
+ROTAS = ["/login", "/dashboard", "/extrato-lista", "/pix-send", "/cartoes", "/shopping/comprar"]
+
+# usuários sorteados por massa: os mais movimentados entram sempre, porque
+# são os extratos mais longos (cauda da lei de potência)
+USUARIOS_AMOSTRA = 20
+USUARIOS_MAIS_ATIVOS = 5
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+# ===== massas =====
+
+def criar_schema(path):
+    origem = sqlite3.connect(os.path.join(RAIZ, "database", "banco.sqlite"))
+    conn = sqlite3.connect(path)
+    for (sql,) in origem.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY type = 'index'
+    """):
+        conn.execute(sql)
+    origem.close()
+    aplicar_migracoes(conn)
+    conn.close()
+
+
+def preparar_massa(tamanho, seed):
+    """Gera (uma vez) e devolve o caminho do banco do tamanho pedido."""
+    os.makedirs(DADOS, exist_ok=True)
+    path = os.path.join(DADOS, f"{tamanho}-{seed}.sqlite")
+    if os.path.exists(path):
+        return path
+
+    print(f"🌱 Gerando massa '{tamanho}' em {path}")
+    parcial = path + ".parcial"
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(parcial + sufixo):
+            os.remove(parcial + sufixo)
+
+    criar_schema(parcial)
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "database", "criar_usuario.py"), parcial,
+         "--seed", str(seed), *TAMANHOS[tamanho]],
+        check=True,
+    )
+    conn = sqlite3.connect(parcial)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    os.replace(parcial, path)
+    return path
+
+
+def copia_de_trabalho(path):
+    """
+    Cópia da massa para uma execução: /pix-send e /shopping/comprar gravam no
+    banco, e toda execução tem de partir dos mesmos dados que o baseline.
+    """
+    copia = path.replace(".sqlite", ".execucao.sqlite")
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(copia + sufixo):
+            os.remove(copia + sufixo)
+    origem = sqlite3.connect(path)
+    destino = sqlite3.connect(copia)
+    origem.backup(destino)
+    destino.close()
+    origem.close()
+    return copia
+
+
+def amostrar_usuarios(path, seed):
+    """[(email, idCartao)] de usuários com cartão, mais ativos primeiro."""
+    conn = sqlite3.connect(path)
+    com_cartao = conn.execute("""
+        SELECT u.email, MIN(cc.idCartao), COUNT(t.idTransferencia)
+        FROM usuarios u
+        JOIN contas c ON c.idUsuario = u.idUsuario
+        JOIN cartoesCredito cc ON cc.idUsuario = u.idUsuario
+        LEFT JOIN transferencias t ON t.idContaOrigem = c.idConta
+        WHERE u.email LIKE 'usuario%@atlas.dev'
+        GROUP BY u.idUsuario
+        ORDER BY 3 DESC
+    """).fetchall()
+    conn.close()
+
+    ativos = com_cartao[:USUARIOS_MAIS_ATIVOS]
+    resto = com_cartao[USUARIOS_MAIS_ATIVOS:]
+    rng = random.Random(seed)
+    outros = rng.sample(resto, min(len(resto), USUARIOS_AMOSTRA - len(ativos)))
+    return [(email, idCartao) for email, idCartao, _ in ativos + outros]
+
+
+# ===== clientes =====
+
+class ClienteFlask:
+    """Um usuário navegando pelo test client do Flask, no mesmo processo."""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def enviar(self, metodo, rota, dados=None):
+        return self._cliente.open(rota, method=metodo, data=dados).status_code
+
+
+class ClienteHTTP:
+    """Um usuário navegando por HTTP (conexão keep-alive e cookie de sessão próprios)."""
+
+    def __init__(self, porta):
+        self._conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=60)
+        self._cookie = None
+
+    def enviar(self, metodo, rota, dados=None):
+        cabecalhos = {}
+        corpo = None
+        if dados is not None:
+            corpo = urlencode(dados)
+            cabecalhos["Content-Type"] = "application/x-www-form-urlencoded"
+        if self._cookie:
+            cabecalhos["Cookie"] = self._cookie
+
+        self._conexao.request(metodo, rota, body=corpo, headers=cabecalhos)
+        resposta = self._conexao.getresponse()
+        resposta.read()
+
+        cookie = resposta.getheader("Set-Cookie")
+        if cookie:
+            self._cookie = cookie.split(";", 1)[0]
+        return resposta.status
+
+
+# ===== cenário =====
+
+class Cenario:
+    """
+    Como cada rota é chamada. preparar() roda fora da medição (ex.: escolher
+    a chave Pix antes do /pix-send); executar() é a requisição medida.
+    """
+
+    def __init__(self, usuarios, senha, seed):
+        self.usuarios = usuarios
+        self.senha = senha
+        self.rng = random.Random(seed)
+
+    def login(self, cliente, indice):
+        email, _ = self.usuarios[indice]
+        return cliente.enviar("POST", "/login", {"email": email, "senha": self.senha})
+
+    def preparar(self, rota, cliente, indice):
+        if rota == "/pix-send":
+            destino, _ = self.usuarios[(indice + 1) % len(self.usuarios)]
+            cliente.enviar("POST", "/pix", {"chave": destino})
+
+    def executar(self, rota, cliente, indice):
+        if rota == "/login":
+            return self.login(cliente, indice)
+        if rota == "/pix-send":
+            return cliente.enviar("POST", "/pix-send", {"valor": "0.01"})
+        if rota == "/shopping/comprar":
+            _, idCartao = self.usuarios[indice]
+            return cliente.enviar("POST", "/shopping/comprar", {
+                "idCartao": idCartao,
+                "parcelas": self.rng.choice([1, 3, 6, 12]),
+                "valor": "1.00",
+                "descricao": "Bench",
+            })
+        return cliente.enviar("GET", rota)
+
+
+def _resumo(latencias, consultas, erros, duracao):
+    return {
+        "requisicoes": len(latencias),
+        "p50_ms": round(_percentil(latencias, 0.50) * 1000, 3),
+        "p95_ms": round(_percentil(latencias, 0.95) * 1000, 3),
+        "p99_ms": round(_percentil(latencias, 0.99) * 1000, 3),
+        "req_s": round(len(latencias) / duracao, 1) if duracao else 0.0,
+        "consultas": round(consultas / len(latencias), 2) if consultas is not None and latencias else None,
+        "erros": erros,
+    }
+
+
+def medir_test_client(path, usuarios, args):
+    """Roda num processo próprio: config.py lê ATLAS_DB_PATH ao ser importado."""
+    os.environ["ATLAS_DB_PATH"] = path
+    os.environ.setdefault("ATLAS_SECRET_KEY", "benchmark")
+    os.chdir(RAIZ)
+    import app as atlas
+
+    # mesma configuração do wsgi.py (sem debug, templates pré-compilados)
+    flask_app = atlas.create_app("producao")
+    recursos = flask_app.extensions["atlas"]
+
+    # conta todo comando que chega ao SQLite, inclusive os da escritora de Pix
+    comandos = [0]
+
+    def contar(_):
+        comandos[0] += 1
+
+    def instrumentar(conectar):
+        def conectar_contando():
+            conn = conectar()
+            conn.set_trace_callback(contar)
+            return conn
+        return conectar_contando
+
+    for banco in recursos.shards.bancos():
+        banco.pool_leitura._conectar = instrumentar(banco.pool_leitura._conectar)
+        banco.pool_escrita._conectar = instrumentar(banco.pool_escrita._conectar)
+    for shard in recursos.shards:
+        shard.motor._conectar = instrumentar(shard.motor._conectar)
+
+    cenario = Cenario(usuarios, args.senha, args.seed)
+    clientes = [ClienteFlask(flask_app) for _ in usuarios]
+    for indice, cliente in enumerate(clientes):
+        cenario.login(cliente, indice)
+
+    resultados = {}
+    for rota in ROTAS:
+        latencias = []
+        consultas = erros = 0
+        inicio_rota = time.perf_counter()
+        medido = 0.0
+
+        for i in range(args.aquecimento + args.requisicoes):
+            indice = i % len(clientes)
+            cliente = clientes[indice]
+            cenario.preparar(rota, cliente, indice)
+
+            antes = comandos[0]
+            inicio = time.perf_counter()
+            status = cenario.executar(rota, cliente, indice)
+            duracao = time.perf_counter() - inicio
+
+            if i < args.aquecimento:
+                continue
+            latencias.append(duracao)
+            medido += duracao
+            consultas += comandos[0] - antes
+            erros += status >= 500
+
+        resultados[rota] = _resumo(latencias, consultas, erros, medido)
+        print(f"   ✔ {rota} ({time.perf_counter() - inicio_rota:.1f}s)", flush=True)
+
+    recursos.shards.parar()
+    atlas.senhas.parar()
+    return resultados
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar_porta(porta, processo, timeout=60):
+    prazo = time.monotonic() + timeout
+    while time.monotonic() < prazo:
+        if processo.poll() is not None:
+            raise RuntimeError(f"servidor saiu com código {processo.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", porta), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"servidor não abriu a porta {porta} em {timeout}s")
+
+
+def medir_servidor(path, usuarios, args):
+    porta = _porta_livre()
+    processo = subprocess.Popen(
+        args.servidor.format(porta=porta),
+        shell=True,
+        cwd=RAIZ,
+        env={"ATLAS_SECRET_KEY": "benchmark", **os.environ, "ATLAS_DB_PATH": path},
+    )
+    try:
+        _esperar_porta(porta, processo)
+        cenario = Cenario(usuarios, args.senha, args.seed)
+        resultados = {}
+
+        # cada thread é um usuário, com conexão e sessão próprias
+        clientes = [ClienteHTTP(porta) for _ in range(args.concorrencia)]
+        with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+            list(executor.map(
+                lambda t: cenario.login(clientes[t], t % len(usuarios)),
+                range(args.concorrencia),
+            ))
+
+        for rota in ROTAS:
+            latencias = []
+            erros = [0]
+            lock = threading.Lock()
+
+            def usuario_virtual(t):
+                indice = t % len(usuarios)
+                cliente = clientes[t]
+                total = args.requisicoes // args.concorrencia + (t < args.requisicoes % args.concorrencia)
+                for i in range(args.aquecimento // args.concorrencia + total):
+                    cenario.preparar(rota, cliente, indice)
+                    inicio = time.perf_counter()
+                    status = cenario.executar(rota, cliente, indice)
+                    duracao = time.perf_counter() - inicio
+                    if i < args.aquecimento // args.concorrencia:
+                        continue
+                    with lock:
+                        latencias.append(duracao)
+                        erros[0] += status >= 500
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+                list(executor.map(usuario_virtual, range(args.concorrencia)))
+            # vazão pelo relógio de parede, com todos os clientes juntos
+            resultados[rota] = _resumo(latencias, None, erros[0], time.perf_counter() - inicio)
+            print(f"   ✔ {rota}", flush=True)
+
+        return resultados
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+# ===== relatório e baseline =====
+
+def comparar(resultado, base, args):
+    """Lista de motivos de regressão da rota (vazia se está dentro do baseline)."""
+    if not base:
+        return []
+    motivos = []
+    limite_p95 = base["p95_ms"] * (1 + args.tolerancia) + args.folga_ms
+    if resultado["p95_ms"] > limite_p95:
+        motivos.append(f"p95 {resultado['p95_ms']:.1f}ms > {limite_p95:.1f}ms")
+    if (resultado["consultas"] is not None and base.get("consultas") is not None
+            and resultado["consultas"] > base["consultas"] + 0.5):
+        motivos.append(f"consultas {resultado['consultas']:.1f} > {base['consultas']:.1f}")
+    if resultado["erros"]:
+        motivos.append(f"{resultado['erros']} respostas 5xx")
+    return motivos
+
+
+def imprimir(chave, resultados, baseline, args):
+    print(f"\n📊 {chave}")
+    print(f"{'rota':<18} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'req/s':>8} | {'SQL/req':>7} | situação")
+    print("-" * 90)
+
+    regressoes = 0
+    for rota, r in resultados.items():
+        motivos = comparar(r, baseline.get(chave, {}).get(rota), args)
+        regressoes += bool(motivos)
+        consultas = f"{r['consultas']:>7.1f}" if r["consultas"] is not None else f"{'-':>7}"
+        situacao = "❌ " + "; ".join(motivos) if motivos else ("✅" if chave in baseline else "sem baseline")
+        print(f"{rota:<18} | {r['p50_ms']:>8.2f} | {r['p95_ms']:>8.2f} | {r['p99_ms']:>8.2f} | "
+              f"{r['req_s']:>8.1f} | {consultas} | {situacao}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tamanhos", default="pequeno,medio",
+                        help=f"massas, separadas por vírgula ({', '.join(TAMANHOS)})")
+    parser.add_argument("--requisicoes", type=int, default=200, help="requisições medidas por rota")
+    parser.add_argument("--aquecimento", type=int, default=20, help="requisições descartadas por rota")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--senha", default="123", help="senha dos usuários sintéticos")
+    parser.add_argument("--servidor", help="comando que sobe o app ouvindo em {porta}")
+    parser.add_argument("--concorrencia", type=int, default=8, help="clientes simultâneos com --servidor")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--salvar-baseline", action="store_true",
+                        help="grava os resultados desta execução como baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="piora relativa aceita no p95 (0.25 = 25%%)")
+    parser.add_argument("--folga-ms", type=float, default=1.0,
+                        help="piora absoluta aceita no p95, para rotas muito rápidas")
+    args = parser.parse_args()
+
+    tamanhos = [t.strip() for t in args.tamanhos.split(",") if t.strip()]
+    for tamanho in tamanhos:
+        if tamanho not in TAMANHOS:
+            parser.error(f"tamanho desconhecido: {tamanho}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    modo = "servidor" if args.servidor else "test_client"
+    todos = {}
+    regressoes = 0
+
+    for tamanho in tamanhos:
+        path = copia_de_trabalho(preparar_massa(tamanho, args.seed))
+        usuarios = amostrar_usuarios(path, args.seed)
+        chave = f"{tamanho}/{modo}"
+        print(f"🏁 {chave}: {len(usuarios)} usuários, {args.requisicoes} requisições por rota")
+
+        if args.servidor:
+            resultados = medir_servidor(path, usuarios, args)
+        else:
+            # processo novo por massa: o app fixa o banco (e os caches) ao ser importado
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                resultados = executor.submit(medir_test_client, path, usuarios, args).result()
+
+        todos[chave] = resultados
+        regressoes += imprimir(chave, resultados, baseline, args)
+
+    if args.salvar_baseline:
+        baseline.update(todos)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Baseline salvo em {args.baseline}")
+    elif regressoes:
+        print(f"\n❌ {regressoes} rota(s) piorou(aram) além do baseline")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
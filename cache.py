@@ -0,0 +1,90 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class LRUCache:
+    """
+    Cache em memória do processo, com limite de itens (LRU) e validade (TTL).
+    Guarda só acertos do banco: um "não encontrado" nunca é cacheado, então
+    um cadastro novo aparece na hora mesmo sem invalidação.
+
+    Com max_bytes, também limita a memória: `tamanho(valor)` estima os bytes
+    de cada item e os menos usados saem até o total caber no limite.
+    """
+
+    def __init__(self, nome, maxsize=10000, ttl=300.0, max_bytes=None, tamanho=sys.getsizeof):
+        self.nome = nome
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.tamanho = tamanho
+
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave, padrao=None):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE or item[0] < agora:
+                if item is not _AUSENTE:
+                    self._remover(chave)
+                self.misses += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item[1]
+
+    def _remover(self, chave):
+        self._bytes -= self._itens.pop(chave)[2]
+
+    def set(self, chave, valor):
+        tamanho = self.tamanho(valor) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and tamanho > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            self._itens[chave] = (time.monotonic() + self.ttl, valor, tamanho)
+            self._bytes += tamanho
+            while len(self._itens) > self.maxsize or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remover(next(iter(self._itens)))
+                self.evictions += 1
+
+    def invalidate(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "itens": len(self._itens),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self._bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
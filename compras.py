@@ -0,0 +1,132 @@
+from datetime import datetime
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    """Soma meses mantendo dia válido (ex.: 31 -> ajusta pro último dia do mês)."""
+    y = dt.year + (dt.month - 1 + months) // 12
+    m = (dt.month - 1 + months) % 12 + 1
+    d = min(dt.day, [31,
+                     29 if (y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)) else 28,
+                     31, 30, 31, 30, 31, 31, 30, 31, 30, 31][m - 1])
+    return dt.replace(year=y, month=m, day=d)
+
+
+def datas_fatura(mes_ref: int, ano_ref: int):
+    """(dataFechamento, dataVencimento) da fatura do mês: fecha dia 25, vence dia 10 do mês seguinte."""
+    data_fechamento = datetime(ano_ref, mes_ref, 25)
+    if mes_ref == 12:
+        data_vencimento = datetime(ano_ref + 1, 1, 10)
+    else:
+        data_vencimento = datetime(ano_ref, mes_ref + 1, 10)
+    return data_fechamento, data_vencimento
+
+
+def dividir_parcelas(total: int, parcelas: int) -> list:
+    """Centavos de cada parcela: iguais, com o resto da divisão na última (soma exata)."""
+    parcela, resto = divmod(total, parcelas)
+    return [parcela] * (parcelas - 1) + [parcela + resto]
+
+
+def lancar_compra_parcelada(cursor, idCartao: int, idConta: int, idUsuario: int,
+                            valor_total: int, parcelas: int, descricao_item: str,
+                            hoje: datetime) -> bool:
+    """
+    Lança a compra inteira com um número fixo de comandos, qualquer que seja
+    o número de parcelas (sem commit):
+      1. debita o limite do cartão, só se houver limite (e sobe a versão dele);
+      2. upsert de todas as faturas envolvidas, já somando a parcela de cada mês;
+      3. insert de todos os lançamentos.
+    Valores em centavos. Retorna False (sem gravar nada) se o limite não
+    for suficiente.
+    """
+    cursor.execute("""
+        UPDATE cartoesCredito
+        SET limite = limite - ?,
+            versao = versao + 1
+        WHERE idCartao = ?
+          AND limite >= ?
+    """, (valor_total, idCartao, valor_total))
+    if cursor.rowcount == 0:
+        return False
+
+    # a fatura do mês já fechada (database/fechar_faturas.py fecha no dia do
+    # fechamento): a primeira parcela cai na do mês seguinte
+    primeira = 1 if hoje >= datas_fatura(hoje.month, hoje.year)[0] else 0
+
+    faturas = []
+    lancamentos = []
+    for i, valor_i in enumerate(dividir_parcelas(valor_total, parcelas)):
+        data_parcela = add_months(hoje, primeira + i)
+        mes_ref = data_parcela.month
+        ano_ref = data_parcela.year
+        data_fechamento, data_vencimento = datas_fatura(mes_ref, ano_ref)
+
+        descricao = (
+            f"Compra {descricao_item} ({i + 1}/{parcelas})"
+            if parcelas > 1 else
+            f"Compra {descricao_item}"
+        )
+
+        faturas.append((
+            idCartao,
+            mes_ref,
+            ano_ref,
+            data_fechamento,
+            data_vencimento,
+            valor_i,
+            "ABERTA"
+        ))
+        lancamentos.append((
+            idConta,
+            idUsuario,
+            1,
+            idCartao,
+            ano_ref,
+            mes_ref,
+            valor_i,
+            "DEBITO",
+            descricao,
+            hoje
+        ))
+
+    # cada parcela cai num mês diferente, então o upsert já é a única
+    # atualização de valorTotal de cada fatura nesta compra
+    cursor.executemany("""
+        INSERT INTO faturas (
+            idCartao,
+            mesReferencia,
+            anoReferencia,
+            dataFechamento,
+            dataVencimento,
+            valorTotal,
+            statusPagamento
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (idCartao, anoReferencia, mesReferencia)
+        DO UPDATE SET valorTotal = valorTotal + excluded.valorTotal
+    """, faturas)
+
+    cursor.executemany("""
+        INSERT INTO lancamentos (
+            idConta,
+            idUsuario,
+            idGrupo,
+            idFatura,
+            valor,
+            tipo,
+            descricao,
+            dataLancamento
+        )
+        VALUES (
+            ?, ?, ?,
+            (
+                SELECT idFatura
+                FROM faturas
+                WHERE idCartao = ?
+                  AND anoReferencia = ?
+                  AND mesReferencia = ?
+            ),
+            ?, ?, ?, ?
+        )
+    """, lancamentos)
+
+    return True
@@ -0,0 +1,110 @@
+import os
+
+
+def _env(nome, padrao, tipo=str):
+    valor = os.environ.get(nome)
+    return padrao if valor is None else tipo(valor)
+
+
+class Config:
+    """
+    Configuração comum, lida das variáveis de ambiente ATLAS_* (tabela no
+    README). As subclasses só mudam o que difere entre os modos.
+    """
+
+    DEBUG = False
+    SECRET_KEY = os.environ.get("ATLAS_SECRET_KEY")
+
+    DB_PATH = _env("ATLAS_DB_PATH", "database/banco.sqlite")
+    # arquivos dos shards, separados por vírgula (database/dividir_shards.py
+    # divide um banco existente); o catálogo guarda o diretório de usuários
+    DB_SHARDS = _env("ATLAS_DB_SHARDS", DB_PATH).split(",")
+    DB_CATALOGO = _env("ATLAS_DB_CATALOGO", DB_SHARDS[0])
+    # leitores (mode=ro) e escritores ficam em pools separados: sob WAL os
+    # leitores não esperam o escritor, que no SQLite é sempre um só por vez
+    DB_POOL_SIZE = _env("ATLAS_DB_POOL_SIZE", 8, int)
+    DB_POOL_ESCRITA_SIZE = _env("ATLAS_DB_POOL_ESCRITA_SIZE", 2, int)
+    DB_POOL_TIMEOUT = _env("ATLAS_DB_POOL_TIMEOUT", 10, float)
+    DB_BUSY_TIMEOUT_MS = _env("ATLAS_DB_BUSY_TIMEOUT_MS", 5000, int)
+    DB_MMAP_MB = _env("ATLAS_DB_MMAP_MB", 256, int)
+    DB_CACHE_MB = _env("ATLAS_DB_CACHE_MB", 16, int)
+    # conexões abertas em cada worker logo após o fork (0 = sob demanda)
+    DB_POOL_AQUECER = _env("ATLAS_DB_POOL_AQUECER", 0, int)
+
+    CACHE_MAX = _env("ATLAS_CACHE_MAX", 10000, int)
+    CACHE_TTL = _env("ATLAS_CACHE_TTL", 300, float)
+    CACHE_FRAGMENTOS_MB = _env("ATLAS_CACHE_FRAGMENTOS_MB", 32, int)
+    CACHE_FRAGMENTOS_TTL = _env("ATLAS_CACHE_FRAGMENTOS_TTL", 3600, float)
+
+    PIX_LOTE_MAX = _env("ATLAS_PIX_LOTE_MAX", 128, int)
+    PIX_LOTE_ESPERA_MS = _env("ATLAS_PIX_LOTE_ESPERA_MS", 0, float)
+    # intervalo do reenvio de Pix entre shards que ficaram no meio (0 desliga)
+    PIX_REENVIO_S = _env("ATLAS_PIX_REENVIO_S", 30, float)
+    # linhas aceitas por pedido de Pix em lote (/api/pix/lote)
+    PIX_EM_LOTE_MAX_ITENS = _env("ATLAS_PIX_EM_LOTE_MAX_ITENS", 5000, int)
+    # Pix agendados: quantos por lote, por quanto tempo um worker reserva
+    # cada um e de quanto em quanto tempo relê o banco (agendamentos de
+    # outros workers, leases de workers que caíram)
+    AGENDADOR_LOTE = _env("ATLAS_AGENDADOR_LOTE", 100, int)
+    AGENDADOR_LEASE_S = _env("ATLAS_AGENDADOR_LEASE_S", 60, float)
+    AGENDADOR_RESSINCRONIZAR_S = _env("ATLAS_AGENDADOR_RESSINCRONIZAR_S", 60, float)
+
+    # Server-Sent Events (/api/eventos): cada conexão aberta ocupa uma thread
+    # do worker, então o limite é por worker (o gunicorn.conf.py usa metade
+    # das threads); a pasta liga os workers entre si (vazia = só no processo)
+    SSE_MAX_CONEXOES = _env("ATLAS_SSE_MAX_CONEXOES", 16, int)
+    SSE_HEARTBEAT_S = _env("ATLAS_SSE_HEARTBEAT_S", 15, float)
+    SSE_DURACAO_MAX_S = _env("ATLAS_SSE_DURACAO_MAX_S", 300, float)
+    EVENTOS_DIR = _env("ATLAS_EVENTOS_DIR", "")
+
+    # rotas de operação (pools, caches, métricas, agendador): expõem o estado
+    # interno sem sessão, então só existem com ATLAS_ROTAS_INTERNAS=1, num
+    # endereço que não seja público
+    ROTAS_INTERNAS = _env("ATLAS_ROTAS_INTERNAS", "0") != "0"
+
+    METRICAS_SQL = _env("ATLAS_METRICAS_SQL", "1") != "0"
+    SQL_LENTO_MS = _env("ATLAS_SQL_LENTO_MS", 0, float)
+    SQL_LENTO_ARQUIVO = _env("ATLAS_SQL_LENTO_ARQUIVO", "logs/sql_lento.log")
+    SQL_LENTO_MAX_MB = _env("ATLAS_SQL_LENTO_MAX_MB", 10, int)
+    SQL_LENTO_ARQUIVOS = _env("ATLAS_SQL_LENTO_ARQUIVOS", 5, int)
+
+    # compila todos os templates no create_app: com preload no servidor, o
+    # master compila uma vez e os workers herdam o cache pelo fork
+    PRECARREGAR_TEMPLATES = False
+
+    # URLs de static/dist/ (python estaticos.py), quando o build existir
+    ESTATICOS_DIST = True
+
+
+class Desenvolvimento(Config):
+    DEBUG = True
+    # só para rodar localmente; em produção a chave vem sempre do ambiente
+    SECRET_KEY = os.environ.get("ATLAS_SECRET_KEY", "atlasbank_secret")
+    ROTAS_INTERNAS = _env("ATLAS_ROTAS_INTERNAS", "1") != "0"
+    # arquivos originais: editar o CSS não exige rodar o build de novo
+    ESTATICOS_DIST = False
+
+
+class Producao(Config):
+    PRECARREGAR_TEMPLATES = True
+    TEMPLATES_AUTO_RELOAD = False
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = "Lax"
+    # o trace callback e o progress handler custam em todo comando SQL: em
+    # produção a medição por comando é opt-in (ATLAS_METRICAS_SQL=1)
+    METRICAS_SQL = _env("ATLAS_METRICAS_SQL", "0") != "0"
+
+
+CONFIGS = {
+    "desenvolvimento": Desenvolvimento,
+    "producao": Producao,
+}
+
+
+def carregar(nome=None):
+    """Classe de configuração por nome (padrão: ATLAS_CONFIG ou desenvolvimento)."""
+    nome = nome or os.environ.get("ATLAS_CONFIG", "desenvolvimento")
+    try:
+        return CONFIGS[nome]
+    except KeyError:
+        raise ValueError(f"configuração desconhecida: {nome} (use {', '.join(CONFIGS)})") from None
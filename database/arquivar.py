@@ -0,0 +1,245 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from migracoes import aplicar_migracoes
+from reconciliar_saldos import saldos_divergentes
+
+DB_PATH = "banco.sqlite"
+
+# histórico que fica no banco quente
+RETENCAO_DIAS = 365
+
+ARQUIVADAS = ("transferencias", "lancamentos")
+
+
+def nome_arquivo(banco: str, ano: int) -> str:
+    """banco.sqlite -> banco.arquivo-2024.sqlite (na mesma pasta do banco)."""
+    base = os.path.splitext(os.path.basename(banco))[0]
+    return f"{base}.arquivo-{ano}.sqlite"
+
+
+def criar_arquivo(conn, caminho):
+    """
+    Cria o arquivo do ano, se ainda não existe, com o schema de
+    transferencias e lancamentos do banco quente (índices incluídos: o
+    arquivo é lido pelas mesmas consultas).
+    """
+    objetos = conn.execute(f"""
+        SELECT name, sql
+        FROM main.sqlite_master
+        WHERE sql IS NOT NULL
+          AND tbl_name IN ({", ".join("?" * len(ARQUIVADAS))})
+        ORDER BY type = 'index'
+    """, ARQUIVADAS).fetchall()
+
+    arquivo = sqlite3.connect(caminho, isolation_level=None)
+    try:
+        existentes = {row[0] for row in arquivo.execute("SELECT name FROM sqlite_master")}
+        for nome, sql in objetos:
+            if nome not in existentes:
+                arquivo.execute(sql)
+    finally:
+        arquivo.close()
+
+
+def anos_a_arquivar(conn, corte: str, id_lancamento_max: int):
+    """Anos com transferências (pela data) ou lançamentos (pela fatura) antes do corte."""
+    anos = {
+        int(row[0]) for row in conn.execute("""
+            SELECT DISTINCT substr(dataTransferencia, 1, 4)
+            FROM transferencias
+            WHERE dataTransferencia < ?
+        """, (corte,))
+    }
+    anos.update(row[0] for row in conn.execute("""
+        SELECT DISTINCT f.anoReferencia
+        FROM faturas f
+        WHERE f.statusPagamento <> 'ABERTA'
+          AND EXISTS (
+              SELECT 1
+              FROM lancamentos l
+              WHERE l.idFatura = f.idFatura
+                AND l.dataLancamento < ?
+                AND l.idLancamento < ?
+          )
+    """, (corte, id_lancamento_max)))
+    return sorted(anos)
+
+
+def arquivar_ano(conn, banco: str, ano: int, corte: str, id_lancamento_max: int):
+    """
+    Move para o arquivo do ano, numa transação, as transferências do ano com
+    data antes do corte e os lançamentos antes do corte das faturas já
+    fechadas com referência no ano, e soma o saldo líquido das transferências
+    em saldos_arquivados. Ficam no quente:
+      - transferências com Pix entre shards ainda PENDENTE (o reenvio lê a
+        transferência da origem);
+      - lançamentos de fatura ABERTA (o fechamento recalcula o total dela);
+      - o lançamento de maior id (lancamentos não tem AUTOINCREMENT: o
+        próximo id sai do maior que estiver no quente).
+    Refazer o ano não duplica nada: a cópia é INSERT OR IGNORE e só apaga do
+    quente o que já está no arquivo.
+    Retorna (transferências, lançamentos) arquivados.
+    """
+    arquivo = nome_arquivo(banco, ano)
+    caminho = os.path.join(os.path.dirname(os.path.abspath(banco)), arquivo)
+    criar_arquivo(conn, caminho)
+
+    ate = min(corte, f"{ano + 1}-01-01")
+    filtro_transferencias = """
+        dataTransferencia >= :inicio
+        AND dataTransferencia < :ate
+        AND idTransferencia NOT IN (
+            SELECT idTransferencia FROM main.pix_saida WHERE status = 'PENDENTE'
+        )
+    """
+    filtro_lancamentos = """
+        dataLancamento < :corte
+        AND idLancamento < :id_max
+        AND idFatura IN (
+            SELECT idFatura
+            FROM main.faturas
+            WHERE anoReferencia = :ano
+              AND statusPagamento <> 'ABERTA'
+        )
+    """
+    parametros = {
+        "inicio": f"{ano}-01-01",
+        "ate": ate,
+        "corte": corte,
+        "id_max": id_lancamento_max,
+        "ano": ano,
+    }
+
+    conn.execute("ATTACH DATABASE ? AS arquivo", (caminho,))
+    try:
+        # BEGIN IMMEDIATE no quente antes de tudo: nenhum Pix entra entre a
+        # soma do saldo arquivado e o DELETE
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for tabela, filtro in (("transferencias", filtro_transferencias),
+                                   ("lancamentos", filtro_lancamentos)):
+                conn.execute(
+                    f"INSERT OR IGNORE INTO arquivo.{tabela} SELECT * FROM main.{tabela} WHERE {filtro}",
+                    parametros,
+                )
+
+            conn.execute(f"""
+                INSERT INTO main.saldos_arquivados (idConta, saldoArquivado)
+                SELECT idConta, SUM(valor)
+                FROM (
+                    SELECT idContaDestino AS idConta, valor
+                    FROM main.transferencias
+                    WHERE {filtro_transferencias}
+                    UNION ALL
+                    SELECT idContaOrigem, -valor
+                    FROM main.transferencias
+                    WHERE {filtro_transferencias}
+                )
+                GROUP BY idConta
+                ON CONFLICT (idConta) DO UPDATE
+                SET saldoArquivado = saldoArquivado + excluded.saldoArquivado
+            """, parametros)
+
+            transferencias = conn.execute(
+                f"DELETE FROM main.transferencias WHERE {filtro_transferencias}", parametros
+            ).rowcount
+            lancamentos = conn.execute(
+                f"DELETE FROM main.lancamentos WHERE {filtro_lancamentos}", parametros
+            ).rowcount
+
+            # o corte só avança: é ele que diz aos leitores quais linhas do
+            # arquivo valem
+            conn.execute("""
+                INSERT INTO main.arquivamentos
+                    (ano, arquivo, arquivadoAte, transferencias, lancamentos, atualizadoEm)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ano) DO UPDATE
+                SET arquivadoAte = MAX(arquivadoAte, excluded.arquivadoAte),
+                    transferencias = transferencias + excluded.transferencias,
+                    lancamentos = lancamentos + excluded.lancamentos,
+                    atualizadoEm = excluded.atualizadoEm
+            """, (ano, arquivo, ate, transferencias, lancamentos, datetime.now()))
+            # o SQLite grava o arquivo e depois o quente (com WAL, um COMMIT
+            # em dois bancos não é atômico entre eles): ver arquivo.py
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE arquivo")
+
+    return transferencias, lancamentos
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move transferências e lançamentos antigos do banco quente para arquivos por ano."
+    )
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument(
+        "--dias",
+        type=int,
+        default=RETENCAO_DIAS,
+        help=f"histórico mantido no banco quente, em dias (padrão {RETENCAO_DIAS})",
+    )
+    parser.add_argument(
+        "--ate",
+        type=date.fromisoformat,
+        help="arquiva o que for anterior a esta data (AAAA-MM-DD), em vez de --dias",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="compacta o banco quente no fim (bloqueia as escritas enquanto roda)",
+    )
+    args = parser.parse_args()
+
+    corte = (args.ate or date.today() - timedelta(days=args.dias)).isoformat()
+
+    conn = sqlite3.connect(args.banco, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    if aplicar_migracoes(conn):
+        print("🆕 Schema atualizado")
+
+    inicio = time.perf_counter()
+    divergentes_antes = set(saldos_divergentes(conn.cursor()))
+    id_lancamento_max = conn.execute("SELECT IFNULL(MAX(idLancamento), 0) FROM lancamentos").fetchone()[0]
+
+    anos = anos_a_arquivar(conn, corte, id_lancamento_max)
+    if not anos:
+        print(f"✅ Nada a arquivar antes de {corte}")
+        conn.close()
+        return
+
+    print(f"🗄️  Arquivando {args.banco}: histórico antes de {corte}")
+    total_transferencias = total_lancamentos = 0
+    for ano in anos:
+        transferencias, lancamentos = arquivar_ano(conn, args.banco, ano, corte, id_lancamento_max)
+        total_transferencias += transferencias
+        total_lancamentos += lancamentos
+        print(f"   {ano}: {transferencias} transferência(s), {lancamentos} lançamento(s) "
+              f"→ {nome_arquivo(args.banco, ano)}")
+
+    # conferência: arquivar não pode mudar nenhum saldo do histórico
+    divergentes = set(saldos_divergentes(conn.cursor())) - divergentes_antes
+    if divergentes:
+        conn.close()
+        raise SystemExit(f"❌ {len(divergentes)} conta(s) deixaram de conferir com o histórico: "
+                         f"rode reconciliar_saldos.py")
+
+    if args.vacuum:
+        conn.execute("VACUUM")
+        print("🧹 Banco quente compactado")
+    conn.close()
+
+    print(f"✅ {total_transferencias} transferência(s) e {total_lancamentos} lançamento(s) "
+          f"arquivados em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
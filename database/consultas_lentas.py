@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ARQUIVO = os.path.join(RAIZ, "logs", "sql_lento.log")
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def ler_registros(arquivo):
+    """Registros do log e dos arquivos já girados (arquivo.1, arquivo.2...), do mais antigo ao mais novo."""
+    girados = []
+    n = 1
+    while os.path.exists(f"{arquivo}.{n}"):
+        girados.append(f"{arquivo}.{n}")
+        n += 1
+
+    caminhos = list(reversed(girados))
+    if os.path.exists(arquivo):
+        caminhos.append(arquivo)
+
+    for caminho in caminhos:
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                try:
+                    yield json.loads(linha)
+                except ValueError:
+                    # linha cortada por uma escrita concorrente ou pela rotação
+                    continue
+
+
+def resumir(registros, rota=None):
+    """Agrupa por texto de SQL, com o plano mais recente de cada comando."""
+    grupos = {}
+    for r in registros:
+        if rota and r["rota"] != rota:
+            continue
+        g = grupos.setdefault(r["sql"], {
+            "sql": r["sql"],
+            "operacao": r["operacao"],
+            "duracoes": [],
+            "rotas": {},
+            "parametros": set(),
+            "plano": None,
+            "varreduras": [],
+            "ultimo": None,
+        })
+        g["duracoes"].append(r["duracao_ms"])
+        g["rotas"][r["rota"]] = g["rotas"].get(r["rota"], 0) + 1
+        g["parametros"].add(r["parametros"])
+        if r.get("plano"):
+            g["plano"] = r["plano"]
+            g["varreduras"] = r.get("varreduras", [])
+        g["ultimo"] = r["quando"]
+
+    resumo = []
+    for g in grupos.values():
+        duracoes = g.pop("duracoes")
+        g["ocorrencias"] = len(duracoes)
+        g["total_ms"] = sum(duracoes)
+        g["p95_ms"] = _percentil(duracoes, 0.95)
+        g["max_ms"] = max(duracoes)
+        resumo.append(g)
+    return sorted(resumo, key=lambda g: g["total_ms"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Resume o log de comandos SQL lentos (ATLAS_SQL_LENTO_MS), pior tempo total primeiro."
+    )
+    parser.add_argument("arquivo", nargs="?", default=ARQUIVO)
+    parser.add_argument("--top", type=int, default=10, help="quantos comandos mostrar")
+    parser.add_argument("--rota", help="só comandos desta rota (ex.: /cartoes)")
+    parser.add_argument("--varreduras", action="store_true", help="só comandos com SCAN sem índice")
+    args = parser.parse_args()
+
+    resumo = resumir(ler_registros(args.arquivo), args.rota)
+    if args.varreduras:
+        resumo = [g for g in resumo if g["varreduras"]]
+
+    if not resumo:
+        print("✅ Nenhum comando lento registrado")
+        return
+
+    total = sum(g["ocorrencias"] for g in resumo)
+    print(f"🐢 {total} execução(ões) lenta(s) de {len(resumo)} comando(s) distinto(s)\n")
+
+    for posicao, g in enumerate(resumo[:args.top], start=1):
+        marca = "❌" if g["varreduras"] else "⚠️ "
+        rotas = ", ".join(f"{rota} ×{n}" for rota, n in sorted(g["rotas"].items(), key=lambda x: -x[1]))
+        print(
+            f"{marca} #{posicao} {g['operacao']} · {g['ocorrencias']}× · total {g['total_ms']:,.1f} ms · "
+            f"p95 {g['p95_ms']:,.1f} ms · máx {g['max_ms']:,.1f} ms"
+        )
+        print(f"   rotas: {rotas}")
+        print(f"   parâmetros: {' | '.join(sorted(g['parametros']))}")
+        print(f"   sql: {g['sql'][:300]}")
+        for linha in g["plano"] or []:
+            print(f"   {'❌' if linha in g['varreduras'] else '  '} {linha}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
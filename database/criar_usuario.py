@@ -1,20 +1,58 @@
+import argparse
+import math
+import os
+import random
 import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
 from werkzeug.security import generate_password_hash
-from datetime import datetime
+
+from migracoes import aplicar_migracoes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from compras import add_months, datas_fatura, dividir_parcelas  # noqa: E402
 
 # ===== CONFIGURAÇÃO =====
 NOME = "Luiz Silva Andrade"
 EMAIL = "luiz@gmail.com"
 SENHA = "123"
-SALDO_INICIAL = 4325.62
+SALDO_INICIAL = 432562  # centavos
 TIPO_CONTA = "corrente"
 
 DB_PATH = "banco.sqlite"
 
 # =======================
 
-def main():
-    db = sqlite3.connect(DB_PATH)
+# ===== MASSA SINTÉTICA =====
+PRIMEIROS_NOMES = [
+    "Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Henrique",
+    "Isabela", "João", "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael",
+    "Sofia", "Thiago", "Vanessa", "Wagner",
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa",
+    "Rodrigues", "Almeida", "Nascimento", "Carvalho", "Gomes", "Martins", "Araújo",
+]
+ITENS = [
+    "Fone Bluetooth", "Smartwatch", "Notebook", "Mercado", "Farmácia", "Restaurante",
+    "Combustível", "Streaming", "Passagem aérea", "Livraria", "Academia", "Eletrodoméstico",
+]
+# peso maior para compras à vista, como na vida real
+PARCELAS = [1, 1, 1, 1, 2, 3, 3, 4, 5, 6, 10, 12]
+
+# valores log-normais (em reais; gravados em centavos): mediana de R$ 80
+# por Pix, R$ 150 por compra
+PIX_MU, PIX_SIGMA = math.log(80), 1.1
+COMPRA_MU, COMPRA_SIGMA = math.log(150), 1.0
+
+# ===========================
+
+
+def criar_usuario_padrao(db):
     cursor = db.cursor()
 
     # 1️⃣ Cria usuário
@@ -34,22 +72,339 @@ def main():
 
     # 2️⃣ Cria conta com saldo inicial
     cursor.execute("""
-        INSERT INTO contas (idUsuario, tipo, saldoInicial, dataCriacao)
-        VALUES (?, ?, ?, ?)
+        INSERT INTO contas (idUsuario, tipo, saldoInicial, saldoAtual, dataCriacao)
+        VALUES (?, ?, ?, ?, ?)
     """, (
         id_usuario,
         TIPO_CONTA,
         SALDO_INICIAL,
+        SALDO_INICIAL,
         datetime.now()
     ))
 
     db.commit()
-    db.close()
 
     print("✅ Usuário criado com sucesso!")
     print(f"👤 Nome: {NOME}")
     print(f"📧 Email: {EMAIL}")
-    print(f"💰 Saldo inicial: R$ {SALDO_INICIAL:,.2f}")
+    print(f"💰 Saldo inicial: R$ {SALDO_INICIAL / 100:,.2f}")
+
+
+def _proximo_id(cursor, tabela, coluna):
+    cursor.execute(f"SELECT IFNULL(MAX({coluna}), 0) + 1 FROM {tabela}")
+    return cursor.fetchone()[0]
+
+
+def _data(dt: datetime) -> str:
+    # mesmo texto que o adaptador padrão do sqlite3 grava para datetime
+    return dt.isoformat(" ")
+
+
+def gerar_usuarios(db, rng, args, inicio, hoje):
+    """
+    Usuários, contas, cartões, faturas e lançamentos parcelados, gravados com
+    executemany numa transação a cada ~args.lote linhas. Devolve
+    [(idConta, saldoInicial)] das contas criadas.
+    """
+    cursor = db.cursor()
+    senha_hash = generate_password_hash(args.senha)
+    # cadastros no primeiro décimo do período: o restante é histórico de uso
+    janela_cadastro = (hoje - inicio).total_seconds() * 0.1
+
+    id_usuario = _proximo_id(cursor, "usuarios", "idUsuario")
+    id_conta = _proximo_id(cursor, "contas", "idConta")
+    id_cartao = _proximo_id(cursor, "cartoesCredito", "idCartao")
+    id_fatura = _proximo_id(cursor, "faturas", "idFatura")
+    id_lancamento = _proximo_id(cursor, "lancamentos", "idLancamento")
+
+    contas_criadas = []
+    totais = {"usuarios": 0, "cartoes": 0, "faturas": 0, "lancamentos": 0}
+    usuarios, contas, cartoes, faturas, lancamentos = [], [], [], [], []
+
+    def gravar():
+        cursor.execute("BEGIN")
+        cursor.executemany("""
+            INSERT INTO usuarios (idUsuario, nome, email, senha, data_cadastro)
+            VALUES (?, ?, ?, ?, ?)
+        """, usuarios)
+        cursor.executemany("""
+            INSERT INTO contas (idConta, idUsuario, tipo, saldoInicial, saldoAtual, dataCriacao)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, contas)
+        cursor.executemany("""
+            INSERT INTO cartoesCredito (
+                idCartao, idUsuario, nome, limite, bandeira,
+                numero_cartao, cvv, validadeMes, validadeAno
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, cartoes)
+        cursor.executemany("""
+            INSERT INTO faturas (
+                idFatura, idCartao, mesReferencia, anoReferencia,
+                dataFechamento, dataVencimento, valorTotal, statusPagamento
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, faturas)
+        cursor.executemany("""
+            INSERT INTO lancamentos (
+                idLancamento, idConta, idUsuario, idGrupo, idFatura,
+                valor, tipo, descricao, dataLancamento
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, lancamentos)
+        cursor.execute("COMMIT")
+
+        totais["usuarios"] += len(usuarios)
+        totais["cartoes"] += len(cartoes)
+        totais["faturas"] += len(faturas)
+        totais["lancamentos"] += len(lancamentos)
+        print(
+            f"   👤 {totais['usuarios']:,} usuários · {totais['cartoes']:,} cartões · "
+            f"{totais['faturas']:,} faturas · {totais['lancamentos']:,} lançamentos"
+        )
+        for lista in (usuarios, contas, cartoes, faturas, lancamentos):
+            lista.clear()
+
+    for _ in range(args.usuarios):
+        nome = f"{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+        cadastro = inicio + timedelta(seconds=rng.random() * janela_cadastro)
+        usuarios.append((
+            id_usuario,
+            nome,
+            f"usuario{id_usuario}@atlas.dev",
+            senha_hash,
+            _data(cadastro),
+        ))
+
+        saldo = round(rng.lognormvariate(math.log(2000), 1.2) * 100)
+        contas.append((id_conta, id_usuario, TIPO_CONTA, saldo, saldo, _data(cadastro)))
+        contas_criadas.append((id_conta, saldo))
+
+        if rng.random() < args.cartoes:
+            # faturas do cartão: (ano, mes) -> [idFatura, valorTotal]
+            faturas_cartao = {}
+            gasto = 0
+            uso = (hoje - cadastro).total_seconds()
+
+            for _ in range(int(rng.expovariate(1 / args.compras)) if args.compras else 0):
+                quando = cadastro + timedelta(seconds=rng.random() * uso)
+                valor_total = round(rng.lognormvariate(COMPRA_MU, COMPRA_SIGMA) * 100)
+                parcelas = rng.choice(PARCELAS)
+                item = rng.choice(ITENS)
+                gasto += valor_total
+
+                # mesma regra de compras.lancar_compra_parcelada: depois do
+                # fechamento, começa no mês seguinte
+                primeira = 1 if quando >= datas_fatura(quando.month, quando.year)[0] else 0
+
+                for i, valor_i in enumerate(dividir_parcelas(valor_total, parcelas)):
+                    data_parcela = add_months(quando, primeira + i)
+                    chave = (data_parcela.year, data_parcela.month)
+                    fatura = faturas_cartao.get(chave)
+                    if fatura is None:
+                        fatura = faturas_cartao[chave] = [id_fatura, 0]
+                        id_fatura += 1
+
+                    fatura[1] += valor_i
+                    lancamentos.append((
+                        id_lancamento,
+                        id_conta,
+                        id_usuario,
+                        1,
+                        fatura[0],
+                        valor_i,
+                        "DEBITO",
+                        f"Compra {item} ({i + 1}/{parcelas})" if parcelas > 1 else f"Compra {item}",
+                        _data(quando),
+                    ))
+                    id_lancamento += 1
+
+            for (ano, mes), (idFatura, valor) in faturas_cartao.items():
+                data_fechamento, data_vencimento = datas_fatura(mes, ano)
+                faturas.append((
+                    idFatura,
+                    id_cartao,
+                    mes,
+                    ano,
+                    _data(data_fechamento),
+                    _data(data_vencimento),
+                    valor,
+                    "ABERTA",
+                ))
+
+            bandeira = rng.choice(["VISA", "MASTERCARD"])
+            # o limite restante é o que sobrou depois das compras, como no app
+            limite = max(rng.randrange(2000, 10001, 100), math.ceil(gasto / 10000) * 100 + 1000) * 100
+            cartoes.append((
+                id_cartao,
+                id_usuario,
+                f"Atlas Bank {bandeira}",
+                limite - gasto,
+                bandeira,
+                "".join(str(rng.randint(0, 9)) for _ in range(16)),
+                str(rng.randint(100, 999)),
+                rng.randint(1, 12),
+                hoje.year + rng.randint(2, 10),
+            ))
+            id_cartao += 1
+
+        id_usuario += 1
+        id_conta += 1
+
+        if len(usuarios) + len(lancamentos) >= args.lote:
+            gravar()
+
+    if usuarios:
+        gravar()
+
+    return contas_criadas
+
+
+def gerar_transferencias(db, rng, args, contas, inicio, hoje):
+    """
+    Pix entre as contas geradas, em ordem cronológica. Origem e destino são
+    sorteados por uma lei de potência (Zipf): poucas contas concentram a maior
+    parte do volume, como em produção. Um Pix sem saldo na origem é descartado
+    (como o app faria), então nenhum saldo fica negativo e o saldoAtual final
+    bate com reconciliar_saldos.py.
+    """
+    if len(contas) < 2 or args.transferencias <= 0:
+        return 0
+
+    cursor = db.cursor()
+    ids = [idConta for idConta, _ in contas]
+    saldos = [saldo for _, saldo in contas]
+
+    # posição da conta no ranking de atividade, sorteada
+    ranking = list(range(len(ids)))
+    rng.shuffle(ranking)
+    pesos = [0.0] * len(ids)
+    for posicao, indice in enumerate(ranking, start=1):
+        pesos[indice] = 1 / posicao ** args.alfa
+    acumulados = list(accumulate(pesos))
+    indices = range(len(ids))
+
+    # processo de Poisson depois da janela de cadastros: intervalos
+    # exponenciais já saem em ordem cronológica
+    periodo = (hoje - inicio).total_seconds()
+    passo_medio = periodo * 0.9 / args.transferencias
+    instante = inicio.timestamp() + periodo * 0.1
+    fim = hoje.timestamp()
+
+    id_transferencia = _proximo_id(cursor, "transferencias", "idTransferencia")
+    geradas = descartadas = 0
+
+    while geradas < args.transferencias:
+        tamanho = min(args.lote, args.transferencias - geradas)
+        origens = rng.choices(indices, cum_weights=acumulados, k=tamanho)
+        destinos = rng.choices(indices, cum_weights=acumulados, k=tamanho)
+
+        linhas = []
+        for o, d in zip(origens, destinos):
+            if o == d:
+                d = (d + 1) % len(ids)
+
+            valor = round(rng.lognormvariate(PIX_MU, PIX_SIGMA) * 100)
+            if saldos[o] < valor:
+                descartadas += 1
+                continue
+
+            instante = min(instante + rng.expovariate(1) * passo_medio, fim)
+            saldos[o] -= valor
+            saldos[d] += valor
+            linhas.append((
+                id_transferencia,
+                ids[o],
+                ids[d],
+                valor,
+                _data(datetime.fromtimestamp(instante)),
+            ))
+            id_transferencia += 1
+
+        cursor.execute("BEGIN")
+        cursor.executemany("""
+            INSERT INTO transferencias (
+                idTransferencia, idContaOrigem, idContaDestino, valor,
+                dataTransferencia, idLancamentoOrigem, idLancamentoDestino
+            )
+            VALUES (?, ?, ?, ?, ?, NULL, NULL)
+        """, linhas)
+        cursor.execute("COMMIT")
+
+        geradas += len(linhas)
+        print(f"   💸 {geradas:,} transferências ({descartadas:,} descartadas por saldo)")
+
+        if descartadas > args.transferencias * 10:
+            print("⚠️  Saldo esgotado na maior parte das contas; parando antes do total pedido")
+            break
+
+    cursor.execute("BEGIN")
+    cursor.executemany("""
+        UPDATE contas
+        SET saldoAtual = ?
+        WHERE idConta = ?
+    """, zip(saldos, ids))
+    cursor.execute("COMMIT")
+
+    return geradas
+
+
+def gerar_massa(db, args):
+    rng = random.Random(args.seed)
+    hoje = datetime.now().replace(microsecond=0)
+    inicio = add_months(hoje, -args.meses)
+
+    # carga descartável: sem fsync, e o controle de transação fica com o script
+    db.isolation_level = None
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("PRAGMA cache_size = -262144")
+
+    t0 = time.perf_counter()
+    print(f"🌱 Gerando massa sintética (seed {args.seed}, {args.meses} meses de histórico)")
+
+    contas = gerar_usuarios(db, rng, args, inicio, hoje)
+    geradas = gerar_transferencias(db, rng, args, contas, inicio, hoje)
+
+    # estatísticas do planejador refletindo o novo volume
+    db.execute("ANALYZE")
+
+    print(f"✅ {len(contas):,} usuários e {geradas:,} transferências em {time.perf_counter() - t0:.1f}s")
+    print(f"🔑 Login: usuario<id>@atlas.dev / senha {args.senha!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cria o usuário de demonstração ou, com --usuarios, uma massa sintética em volume de produção."
+    )
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument("--usuarios", type=int, default=0,
+                        help="quantidade de usuários sintéticos (0 = só o usuário de demonstração)")
+    parser.add_argument("--transferencias", type=int, default=0,
+                        help="total de Pix entre as contas geradas")
+    parser.add_argument("--cartoes", type=float, default=0.6,
+                        help="fração dos usuários com cartão de crédito")
+    parser.add_argument("--compras", type=float, default=20,
+                        help="média de compras por cartão")
+    parser.add_argument("--meses", type=int, default=24,
+                        help="meses de histórico")
+    parser.add_argument("--alfa", type=float, default=1.1,
+                        help="expoente da lei de potência de atividade das contas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--senha", default=SENHA,
+                        help="senha de todos os usuários sintéticos")
+    parser.add_argument("--lote", type=int, default=50000,
+                        help="linhas (ou usuários) por transação")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.banco)
+    aplicar_migracoes(db)
+
+    if args.usuarios > 0:
+        gerar_massa(db, args)
+    else:
+        criar_usuario_padrao(db)
+
+    db.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,161 @@
+import argparse
+import os
+import sqlite3
+import time
+
+from migracoes import aplicar_migracoes, sincronizar_diretorio
+
+DB_PATH = "banco.sqlite"
+
+# copiadas inteiras para todo shard: referência e controle
+REPLICADAS = ("grupos", "schema_versao", "fechamentos", "fechamento_lotes")
+
+# linhas de cada shard, na ordem: as de baixo filtram pelo que já foi copiado
+PARTICIONADAS = [
+    ("usuarios", "idUsuario % :n = :s"),
+    ("contas", "idUsuario % :n = :s"),
+    ("cartoesCredito", "idUsuario % :n = :s"),
+    ("faturas", "idCartao IN (SELECT idCartao FROM main.cartoesCredito)"),
+    ("lancamentos", "idFatura IN (SELECT idFatura FROM main.faturas)"),
+    # um Pix entre usuários de shards diferentes vai para os dois: cada
+    # shard enxerga a sua ponta (débito na origem, crédito no destino)
+    ("transferencias", """
+        idContaOrigem IN (SELECT idConta FROM main.contas)
+        OR idContaDestino IN (SELECT idConta FROM main.contas)
+    """),
+    # agendamentos ficam com a conta de origem (o shard do destino é lido
+    # do diretório na hora de executar)
+    ("pix_agendados", "idContaOrigem IN (SELECT idConta FROM main.contas)"),
+]
+
+# fica só no catálogo; pix_saida e pix_entrada são criadas vazias (a origem
+# não pode ter Pix entre shards pela metade)
+FORA = {"diretorio"}
+
+
+def _contar(conn, esquema, tabela):
+    return conn.execute(f"SELECT COUNT(*) FROM {esquema}.{tabela}").fetchone()[0]
+
+
+def criar_shard(origem, destino, indice, total):
+    """
+    Cria `destino` com o schema de `origem` e as linhas dos usuários com
+    idUsuario % total == indice. Os índices são criados depois da carga.
+    Retorna {tabela: linhas copiadas}.
+    """
+    conn = sqlite3.connect(destino, isolation_level=None)
+    conn.execute("ATTACH DATABASE ? AS origem", (origem,))
+
+    objetos = conn.execute("""
+        SELECT type, tbl_name, sql
+        FROM origem.sqlite_master
+        WHERE sql IS NOT NULL
+          AND name NOT LIKE 'sqlite_%'
+          AND type IN ('table', 'index')
+        ORDER BY type = 'index'
+    """).fetchall()
+    for tipo, tabela, sql in objetos:
+        if tipo == "table" and tabela not in FORA:
+            conn.execute(sql)
+
+    copiadas = {}
+    conn.execute("BEGIN")
+    try:
+        for tabela in REPLICADAS:
+            conn.execute(f"INSERT INTO main.{tabela} SELECT * FROM origem.{tabela}")
+            copiadas[tabela] = _contar(conn, "main", tabela)
+        for tabela, filtro in PARTICIONADAS:
+            conn.execute(
+                f"INSERT INTO main.{tabela} SELECT * FROM origem.{tabela} WHERE {filtro}",
+                {"n": total, "s": indice},
+            )
+            copiadas[tabela] = _contar(conn, "main", tabela)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    for tipo, tabela, sql in objetos:
+        if tipo == "index" and tabela not in FORA:
+            conn.execute(sql)
+    conn.execute("ANALYZE")
+    conn.execute("DETACH DATABASE origem")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    return copiadas
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Divide um banco em N shards por idUsuario e cria o catálogo (diretório de usuários)."
+    )
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument("--shards", type=int, required=True, help="quantidade de shards")
+    parser.add_argument("--destino", default="shards", help="pasta dos arquivos gerados")
+    args = parser.parse_args()
+
+    if args.shards < 2:
+        parser.error("--shards precisa ser pelo menos 2")
+
+    os.makedirs(args.destino, exist_ok=True)
+    shards = [os.path.join(args.destino, f"shard{i}.sqlite") for i in range(args.shards)]
+    catalogo = os.path.join(args.destino, "catalogo.sqlite")
+    existentes = [p for p in shards + [catalogo] if os.path.exists(p)]
+    if existentes:
+        raise SystemExit(f"❌ Já existe: {', '.join(existentes)} (escolha outro --destino)")
+
+    origem = sqlite3.connect(args.banco)
+    if aplicar_migracoes(origem):
+        print("🆕 Schema atualizado")
+    pendentes = origem.execute("SELECT COUNT(*) FROM pix_saida WHERE status = 'PENDENTE'").fetchone()[0]
+    if pendentes:
+        raise SystemExit(f"❌ {pendentes} Pix entre shards pendente(s) na origem: suba o app para completá-los antes")
+    if origem.execute("SELECT COUNT(*) FROM arquivamentos").fetchone()[0]:
+        # os arquivos por ano não são divididos: o histórico antigo sumiria dos shards
+        raise SystemExit("❌ Banco com histórico arquivado (arquivar.py): divida em shards antes de arquivar")
+    esperado = {tabela: _contar(origem, "main", tabela) for tabela, _ in PARTICIONADAS}
+    saldo_origem = origem.execute("SELECT IFNULL(SUM(saldoAtual), 0) FROM contas").fetchone()[0]
+    origem.close()
+
+    inicio = time.perf_counter()
+    print(f"✂️  Dividindo {args.banco} em {args.shards} shard(s) por idUsuario % {args.shards}")
+
+    totais = dict.fromkeys(esperado, 0)
+    for indice, path in enumerate(shards):
+        copiadas = criar_shard(args.banco, path, indice, args.shards)
+        for tabela in totais:
+            totais[tabela] += copiadas[tabela]
+        print(f"   {path}: {copiadas['usuarios']} usuário(s), {copiadas['cartoesCredito']} cartão(ões), "
+              f"{copiadas['lancamentos']} lançamento(s), {copiadas['transferencias']} transferência(s)")
+
+    registrados = sincronizar_diretorio(catalogo, shards)
+    print(f"📇 {catalogo}: {registrados} usuário(s) no diretório")
+
+    # conferência: toda linha foi para exatamente um shard (transferências
+    # entre shards, para dois) e o dinheiro total não mudou
+    saldo = 0
+    for path in shards:
+        conn = sqlite3.connect(path)
+        saldo += conn.execute("SELECT IFNULL(SUM(saldoAtual), 0) FROM contas").fetchone()[0]
+        conn.close()
+    divergentes = [
+        tabela for tabela in totais
+        if tabela != "transferencias" and totais[tabela] != esperado[tabela]
+    ]
+    if totais["transferencias"] < esperado["transferencias"]:
+        divergentes.append("transferencias")
+    if registrados != esperado["usuarios"]:
+        divergentes.append("diretorio")
+    if saldo != saldo_origem:
+        divergentes.append("saldoAtual")
+    if divergentes:
+        raise SystemExit(f"❌ Divisão não confere em: {', '.join(divergentes)}")
+
+    print(f"✅ Shards prontos em {time.perf_counter() - inicio:.1f}s "
+          f"({totais['transferencias'] - esperado['transferencias']} transferência(s) entre shards). Para usar:")
+    print(f"   export ATLAS_DB_SHARDS={','.join(os.path.abspath(p) for p in shards)}")
+    print(f"   export ATLAS_DB_CATALOGO={os.path.abspath(catalogo)}")
+
+
+if __name__ == "__main__":
+    main()
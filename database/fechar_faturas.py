@@ -0,0 +1,287 @@
+import argparse
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+from migracoes import aplicar_migracoes
+
+DB_PATH = "banco.sqlite"
+
+# cartões por transação: cada lote é fechado e registrado de uma vez
+TAMANHO_LOTE = 10000
+
+# conexão de cada processo do pool (aberta no initializer)
+_conn = None
+
+
+def _conectar(banco):
+    conn = sqlite3.connect(banco, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def planejar(conn, corte: date, tamanho_lote: int):
+    """
+    Execução do fechamento para a data de corte (criada na primeira vez).
+    Retorna (idFechamento, concluidoEm, lotes já feitos, lotes pendentes como
+    [(idFechamento, início, fim)]). O tamanho do lote e o maior idCartao ficam
+    gravados na execução, então uma retomada divide os cartões do mesmo jeito.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            SELECT idFechamento, tamanhoLote, idCartaoMax, concluidoEm
+            FROM fechamentos
+            WHERE dataCorte = ?
+        """, (corte.isoformat(),))
+        execucao = cursor.fetchone()
+
+        if execucao is None:
+            cursor.execute("SELECT IFNULL(MAX(idCartao), 0) FROM cartoesCredito")
+            id_max = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO fechamentos (dataCorte, tamanhoLote, idCartaoMax, iniciadoEm)
+                VALUES (?, ?, ?, ?)
+            """, (corte.isoformat(), tamanho_lote, id_max, datetime.now()))
+            execucao = (cursor.lastrowid, tamanho_lote, id_max, None)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    idFechamento, tamanho_lote, id_max, concluido = execucao
+    cursor.execute("""
+        SELECT idCartaoInicio
+        FROM fechamento_lotes
+        WHERE idFechamento = ?
+    """, (idFechamento,))
+    feitos = {row[0] for row in cursor.fetchall()}
+
+    pendentes = [
+        (idFechamento, inicio, min(inicio + tamanho_lote - 1, id_max))
+        for inicio in range(1, id_max + 1, tamanho_lote)
+        if inicio not in feitos
+    ]
+    return idFechamento, concluido, len(feitos), pendentes
+
+
+def fechar_lote(conn, idFechamento: int, inicio: int, fim: int, corte: date):
+    """
+    Fecha, numa só transação e só com SQL por conjunto, as faturas dos
+    cartões inicio..fim:
+      1. ABERTA com fechamento até o corte → FECHADA, com valorTotal
+         recalculado a partir dos lançamentos (soma exata em centavos, lida
+         só do índice idx_lancamentos_fatura_valor);
+      2. devolve ao limite de cada cartão o total das faturas fechadas;
+      3. FECHADA com vencimento antes do corte → VENCIDA;
+      4. sobe a versão dos cartões alterados (ETag e cache da tela de cartões);
+      5. registra o lote como concluído.
+    Só muda faturas que ainda estão no status de origem, então refazer um
+    lote não devolve limite duas vezes.
+    """
+    cursor = conn.cursor()
+    corte_iso = corte.isoformat()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS fechamento_atual (
+                idFatura INTEGER PRIMARY KEY,
+                idCartao INTEGER NOT NULL,
+                valorAnterior INTEGER NOT NULL,
+                valorTotal INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("DELETE FROM fechamento_atual")
+        cursor.execute("""
+            INSERT INTO fechamento_atual (idFatura, idCartao, valorAnterior, valorTotal)
+            SELECT
+                f.idFatura,
+                f.idCartao,
+                f.valorTotal,
+                IFNULL((
+                    SELECT SUM(CASE l.tipo WHEN 'CREDITO' THEN -l.valor ELSE l.valor END)
+                    FROM lancamentos l
+                    WHERE l.idFatura = f.idFatura
+                ), 0)
+            FROM faturas f
+            WHERE f.idCartao BETWEEN ? AND ?
+              AND f.statusPagamento = 'ABERTA'
+              AND date(f.dataFechamento) <= ?
+        """, (inicio, fim, corte_iso))
+
+        cursor.execute("""
+            SELECT
+                COUNT(*),
+                IFNULL(SUM(valorTotal), 0),
+                IFNULL(SUM(valorTotal <> valorAnterior), 0)
+            FROM fechamento_atual
+        """)
+        fechadas, valor_fechado, corrigidas = cursor.fetchone()
+
+        cursor.execute("""
+            UPDATE faturas
+            SET statusPagamento = 'FECHADA',
+                valorTotal = (
+                    SELECT a.valorTotal
+                    FROM fechamento_atual a
+                    WHERE a.idFatura = faturas.idFatura
+                )
+            WHERE idFatura IN (SELECT idFatura FROM fechamento_atual)
+        """)
+
+        # UPDATE ... FROM: uma agregação por cartão, em vez de uma subconsulta
+        # correlacionada na tabela temporária (sem índice) por linha
+        cursor.execute("""
+            UPDATE cartoesCredito
+            SET limite = cartoesCredito.limite + a.total,
+                versao = cartoesCredito.versao + 1
+            FROM (
+                SELECT idCartao, SUM(valorTotal) AS total
+                FROM fechamento_atual
+                GROUP BY idCartao
+            ) a
+            WHERE cartoesCredito.idCartao = a.idCartao
+            RETURNING cartoesCredito.idCartao
+        """)
+        atualizados = {row[0] for row in cursor.fetchall()}
+
+        cursor.execute("""
+            UPDATE faturas
+            SET statusPagamento = 'VENCIDA'
+            WHERE idCartao BETWEEN ? AND ?
+              AND statusPagamento = 'FECHADA'
+              AND date(dataVencimento) < ?
+            RETURNING idCartao
+        """, (inicio, fim, corte_iso))
+        vencidas = [row[0] for row in cursor.fetchall()]
+
+        # cartões que só tiveram faturas vencidas (os fechados já subiram acima)
+        cursor.executemany("""
+            UPDATE cartoesCredito
+            SET versao = versao + 1
+            WHERE idCartao = ?
+        """, [(idCartao,) for idCartao in set(vencidas) - atualizados])
+
+        cursor.execute("""
+            INSERT INTO fechamento_lotes (
+                idFechamento,
+                idCartaoInicio,
+                faturasFechadas,
+                faturasVencidas,
+                valoresCorrigidos,
+                valorFechado,
+                concluidoEm
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (idFechamento, inicio, fechadas, len(vencidas), corrigidas,
+              valor_fechado, datetime.now()))
+
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return fechadas, len(vencidas), corrigidas, valor_fechado
+
+
+def _iniciar_processo(banco):
+    global _conn
+    _conn = _conectar(banco)
+
+
+def _processar(lote, corte):
+    idFechamento, inicio, fim = lote
+    return inicio, fim, fechar_lote(_conn, idFechamento, inicio, fim, corte)
+
+
+def concluir(conn, idFechamento):
+    """Marca a execução como concluída e devolve os totais de todos os lotes."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE fechamentos
+        SET concluidoEm = ?
+        WHERE idFechamento = ? AND concluidoEm IS NULL
+    """, (datetime.now(), idFechamento))
+    cursor.execute("""
+        SELECT
+            COUNT(*),
+            IFNULL(SUM(faturasFechadas), 0),
+            IFNULL(SUM(faturasVencidas), 0),
+            IFNULL(SUM(valoresCorrigidos), 0),
+            IFNULL(SUM(valorFechado), 0)
+        FROM fechamento_lotes
+        WHERE idFechamento = ?
+    """, (idFechamento,))
+    return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fecha as faturas vencidas até a data de corte, em lotes de cartões retomáveis."
+    )
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument("--corte", type=date.fromisoformat, default=date.today(),
+                        help="data de corte AAAA-MM-DD (padrão: hoje)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="cartões por transação")
+    parser.add_argument("--processos", type=int, default=1,
+                        help="processos fechando lotes em paralelo")
+    args = parser.parse_args()
+
+    conn = _conectar(args.banco)
+    if aplicar_migracoes(conn):
+        print("🆕 Schema atualizado")
+
+    idFechamento, concluido, feitos, pendentes = planejar(conn, args.corte, args.lote)
+    if concluido:
+        print(f"✅ Fechamento de {args.corte} já concluído em {concluido}")
+        return
+    if feitos:
+        print(f"⏯️  Retomando fechamento de {args.corte}: {feitos} lote(s) já concluído(s)")
+
+    print(f"🗓️  Fechando faturas até {args.corte}: {len(pendentes)} lote(s) de cartões pendente(s)")
+
+    inicio = time.perf_counter()
+    aviso = max(1, len(pendentes) // 20)
+
+    def progresso(n, ini, fim, fechadas, vencidas):
+        if n % aviso == 0 or n == len(pendentes):
+            print(f"   {n}/{len(pendentes)} · cartões {ini}–{fim}: "
+                  f"{fechadas} fechada(s), {vencidas} vencida(s)", flush=True)
+
+    try:
+        if args.processos <= 1:
+            _iniciar_processo(args.banco)
+            resultados = (_processar(lote, args.corte) for lote in pendentes)
+            for n, (ini, fim, (fechadas, vencidas, _, _)) in enumerate(resultados, start=1):
+                progresso(n, ini, fim, fechadas, vencidas)
+        else:
+            # o SQLite tem um escritor por vez: os processos se revezam no
+            # lock (busy timeout), mas os lotes continuam independentes
+            with ProcessPoolExecutor(args.processos, initializer=_iniciar_processo,
+                                     initargs=(args.banco,)) as executor:
+                futuros = [executor.submit(_processar, lote, args.corte) for lote in pendentes]
+                try:
+                    for n, futuro in enumerate(as_completed(futuros), start=1):
+                        ini, fim, (fechadas, vencidas, _, _) = futuro.result()
+                        progresso(n, ini, fim, fechadas, vencidas)
+                except BaseException:
+                    executor.shutdown(cancel_futures=True)
+                    raise
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrompido: os lotes concluídos ficaram gravados; rode de novo para retomar")
+        raise SystemExit(130)
+
+    lotes, fechadas, vencidas, corrigidas, valor = concluir(conn, idFechamento)
+    conn.close()
+
+    print(f"✅ {fechadas} fatura(s) fechada(s) (R$ {valor / 100:,.2f} devolvidos aos limites), "
+          f"{vencidas} vencida(s), em {lotes} lote(s) · {time.perf_counter() - inicio:.1f}s")
+    if corrigidas:
+        print(f"🔧 {corrigidas} fatura(s) com valorTotal diferente da soma dos lançamentos foram corrigidas")
+
+
+if __name__ == "__main__":
+    main()
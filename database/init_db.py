@@ -1,5 +1,7 @@
 import sqlite3
 
+from migracoes import aplicar_migracoes
+
 # Cria / abre o banco
 conn = sqlite3.connect("banco.sqlite")
 
@@ -29,7 +31,8 @@ CREATE TABLE IF NOT EXISTS contas (
     idUsuario INTEGER NOT NULL,
     idGrupo INTEGER,
     tipo TEXT NOT NULL,
-    saldoInicial REAL NOT NULL,
+    saldoInicial INTEGER NOT NULL, -- centavos, como todo valor em dinheiro
+    saldoAtual INTEGER NOT NULL DEFAULT 0,
     dataCriacao DATETIME NOT NULL,
     FOREIGN KEY (idUsuario) REFERENCES usuarios(idUsuario),
     FOREIGN KEY (idGrupo) REFERENCES grupos(idGrupo)
@@ -39,7 +42,7 @@ CREATE TABLE IF NOT EXISTS cartoesCredito (
     idCartao INTEGER PRIMARY KEY AUTOINCREMENT,
     idUsuario INTEGER NOT NULL,
     nome TEXT NOT NULL,
-    limite REAL NOT NULL,
+    limite INTEGER NOT NULL,
     bandeira TEXT NOT NULL,
     numero_cartao TEXT NOT NULL,
     cvv TEXT NOT NULL,
@@ -56,7 +59,7 @@ CREATE TABLE IF NOT EXISTS faturas (
     anoReferencia INTEGER NOT NULL,
     dataFechamento DATE NOT NULL,
     dataVencimento DATE NOT NULL,
-    valorTotal REAL NOT NULL,
+    valorTotal INTEGER NOT NULL,
     statusPagamento TEXT NOT NULL,
     PRIMARY KEY(idFatura),
     FOREIGN KEY (idCartao) REFERENCES cartoesCredito(idCartao)
@@ -68,7 +71,7 @@ CREATE TABLE IF NOT EXISTS lancamentos (
     idUsuario INTEGER NOT NULL,
     idGrupo INTEGER NOT NULL,
     idFatura INTEGER NOT NULL,
-    valor REAL NOT NULL,
+    valor INTEGER NOT NULL,
     tipo TEXT NOT NULL,
     descricao TEXT,
     dataLancamento DATETIME NOT NULL,
@@ -83,7 +86,7 @@ CREATE TABLE IF NOT EXISTS transferencias (
     idTransferencia INTEGER PRIMARY KEY AUTOINCREMENT,
     idContaOrigem INTEGER NOT NULL,
     idContaDestino INTEGER NOT NULL,
-    valor REAL NOT NULL,
+    valor INTEGER NOT NULL,
     dataTransferencia DATETIME NOT NULL,
 
     idLancamentoOrigem INTEGER,
@@ -99,6 +102,10 @@ CREATE TABLE IF NOT EXISTS transferencias (
 cursor.executescript(sql)
 
 conn.commit()
+
+# índices e demais ajustes versionados
+aplicar_migracoes(conn)
+
 conn.close()
 
 print("✅ Banco de dados criado com sucesso!")
\ No newline at end of file
@@ -0,0 +1,479 @@
+import argparse
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+DB_PATH = "banco.sqlite"
+
+
+def _m001_saldo_materializado(cursor):
+    cursor.execute("PRAGMA table_info(contas)")
+    if "saldoAtual" not in [c[1] for c in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE contas ADD COLUMN saldoAtual REAL NOT NULL DEFAULT 0")
+
+    cursor.execute("""
+        UPDATE contas
+        SET saldoAtual = saldoInicial
+            + IFNULL((
+                SELECT SUM(t.valor)
+                FROM transferencias t
+                WHERE t.idContaDestino = contas.idConta
+            ), 0)
+            - IFNULL((
+                SELECT SUM(t.valor)
+                FROM transferencias t
+                WHERE t.idContaOrigem = contas.idConta
+            ), 0)
+    """)
+
+
+def _m002_indices_hot_path(cursor):
+    for sql in (
+        """CREATE INDEX IF NOT EXISTS idx_transferencias_origem_data
+           ON transferencias (idContaOrigem, dataTransferencia)""",
+        """CREATE INDEX IF NOT EXISTS idx_transferencias_destino_data
+           ON transferencias (idContaDestino, dataTransferencia)""",
+        """CREATE INDEX IF NOT EXISTS idx_contas_usuario
+           ON contas (idUsuario)""",
+        """CREATE INDEX IF NOT EXISTS idx_cartoes_usuario
+           ON cartoesCredito (idUsuario)""",
+        """CREATE INDEX IF NOT EXISTS idx_faturas_cartao_referencia
+           ON faturas (idCartao, anoReferencia, mesReferencia)""",
+        """CREATE INDEX IF NOT EXISTS idx_lancamentos_fatura_data
+           ON lancamentos (idFatura, dataLancamento)""",
+        "ANALYZE",
+    ):
+        cursor.execute(sql)
+
+
+def _m003_fatura_unica_por_mes(cursor):
+    # bancos antigos podem ter mais de uma fatura no mesmo mês do cartão:
+    # junta tudo na de menor id antes de criar a restrição
+    cursor.execute("""
+        CREATE TEMP TABLE faturas_duplicadas AS
+        SELECT
+            f.idFatura,
+            (
+                SELECT MIN(f2.idFatura)
+                FROM faturas f2
+                WHERE f2.idCartao = f.idCartao
+                  AND f2.anoReferencia = f.anoReferencia
+                  AND f2.mesReferencia = f.mesReferencia
+            ) AS idFaturaMantida
+        FROM faturas f
+    """)
+    cursor.execute("DELETE FROM faturas_duplicadas WHERE idFatura = idFaturaMantida")
+
+    cursor.execute("""
+        UPDATE lancamentos
+        SET idFatura = (
+            SELECT d.idFaturaMantida
+            FROM faturas_duplicadas d
+            WHERE d.idFatura = lancamentos.idFatura
+        )
+        WHERE idFatura IN (SELECT idFatura FROM faturas_duplicadas)
+    """)
+    cursor.execute("""
+        UPDATE faturas
+        SET valorTotal = valorTotal + (
+            SELECT IFNULL(SUM(f2.valorTotal), 0)
+            FROM faturas_duplicadas d
+            JOIN faturas f2 ON f2.idFatura = d.idFatura
+            WHERE d.idFaturaMantida = faturas.idFatura
+        )
+        WHERE idFatura IN (SELECT idFaturaMantida FROM faturas_duplicadas)
+    """)
+    cursor.execute("DELETE FROM faturas WHERE idFatura IN (SELECT idFatura FROM faturas_duplicadas)")
+    cursor.execute("DROP TABLE faturas_duplicadas")
+
+    # o índice único substitui o índice simples de (idCartao, ano, mês)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_faturas_cartao_referencia
+        ON faturas (idCartao, anoReferencia, mesReferencia)
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_faturas_cartao_referencia")
+
+
+def _m004_versao_cartao(cursor):
+    # incrementada a cada mudança no cartão; base do ETag da API de cartões
+    cursor.execute("PRAGMA table_info(cartoesCredito)")
+    if "versao" not in [c[1] for c in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE cartoesCredito ADD COLUMN versao INTEGER NOT NULL DEFAULT 0")
+
+
+def _m005_fechamento_faturas(cursor):
+    # execuções do fechamento mensal (database/fechar_faturas.py) e os lotes
+    # de cartões já concluídos em cada uma, para retomar após interrupção
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fechamentos (
+            idFechamento INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataCorte DATE NOT NULL UNIQUE,
+            tamanhoLote INTEGER NOT NULL,
+            idCartaoMax INTEGER NOT NULL,
+            iniciadoEm DATETIME NOT NULL,
+            concluidoEm DATETIME
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fechamento_lotes (
+            idFechamento INTEGER NOT NULL,
+            idCartaoInicio INTEGER NOT NULL,
+            faturasFechadas INTEGER NOT NULL,
+            faturasVencidas INTEGER NOT NULL,
+            valoresCorrigidos INTEGER NOT NULL,
+            valorFechado REAL NOT NULL,
+            concluidoEm DATETIME NOT NULL,
+            PRIMARY KEY (idFechamento, idCartaoInicio),
+            FOREIGN KEY (idFechamento) REFERENCES fechamentos(idFechamento)
+        )
+    """)
+
+
+def _m006_pix_entre_shards(cursor):
+    # Pix entre shards em duas fases: a origem grava o débito e a saída
+    # PENDENTE; o destino grava o crédito e a entrada (chave = shard e id de
+    # origem), que torna o reenvio de uma saída pendente idempotente
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pix_saida (
+            idTransferencia INTEGER PRIMARY KEY,
+            shardDestino INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            concluidaEm DATETIME,
+            FOREIGN KEY (idTransferencia) REFERENCES transferencias(idTransferencia)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pix_saida_pendente
+        ON pix_saida (idTransferencia)
+        WHERE status = 'PENDENTE'
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pix_entrada (
+            shardOrigem INTEGER NOT NULL,
+            idTransferenciaOrigem INTEGER NOT NULL,
+            idTransferencia INTEGER NOT NULL,
+            PRIMARY KEY (shardOrigem, idTransferenciaOrigem),
+            FOREIGN KEY (idTransferencia) REFERENCES transferencias(idTransferencia)
+        )
+    """)
+
+
+# colunas de dinheiro, gravadas em centavos (INTEGER) a partir da versão 7
+COLUNAS_CENTAVOS = {
+    "contas": ("saldoInicial", "saldoAtual"),
+    "cartoesCredito": ("limite",),
+    "faturas": ("valorTotal",),
+    "lancamentos": ("valor",),
+    "transferencias": ("valor",),
+    "fechamento_lotes": ("valorFechado",),
+}
+
+# índices trocados por versões de cobertura (com o valor no fim): extrato,
+# somas por conta e por fatura saem só do índice, sem ler a tabela. O id vem
+# explícito antes do valor para o índice continuar na ordem (data, id) das
+# páginas por cursor
+INDICES_COBERTURA = {
+    "idx_transferencias_origem_data": """
+        CREATE INDEX IF NOT EXISTS idx_transferencias_origem_valor
+        ON transferencias (idContaOrigem, dataTransferencia, idTransferencia, valor)
+    """,
+    "idx_transferencias_destino_data": """
+        CREATE INDEX IF NOT EXISTS idx_transferencias_destino_valor
+        ON transferencias (idContaDestino, dataTransferencia, idTransferencia, valor)
+    """,
+    "idx_lancamentos_fatura_data": """
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_fatura_valor
+        ON lancamentos (idFatura, dataLancamento, idLancamento, tipo, valor)
+    """,
+}
+
+
+def _reconstruir_em_centavos(cursor, tabela, colunas):
+    """
+    Refaz a tabela com as colunas de dinheiro em INTEGER (centavos): o SQLite
+    não muda o tipo de uma coluna, e numa coluna REAL um inteiro volta a ser
+    gravado como REAL. Mesmos dados, ids, sequência e índices.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,))
+    row = cursor.fetchone()
+    if row is None:
+        return
+    sql = row[0]
+
+    cursor.execute(f"PRAGMA table_info({tabela})")
+    tipos = {c[1]: c[2].upper() for c in cursor.fetchall()}
+    reais = [c for c in colunas if tipos.get(c) == "REAL"]
+    if not reais:
+        return
+
+    cursor.execute("""
+        SELECT name, sql
+        FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+    """, (tabela,))
+    indices = cursor.fetchall()
+    sequencia = None
+    if "AUTOINCREMENT" in sql.upper():
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabela,))
+        sequencia = cursor.fetchone()
+
+    nova = f"{tabela}_centavos"
+    corpo = sql[sql.index("("):]
+    for coluna in reais:
+        corpo = re.sub(rf"\b({coluna}\s+)REAL\b", r"\1INTEGER", corpo, flags=re.I)
+    cursor.execute(f"CREATE TABLE {nova} {corpo}")
+
+    selecao = ", ".join(
+        f"CAST(ROUND({c} * 100) AS INTEGER)" if c in reais else c
+        for c in tipos
+    )
+    cursor.execute(f"INSERT INTO {nova} ({', '.join(tipos)}) SELECT {selecao} FROM {tabela}")
+    cursor.execute(f"DROP TABLE {tabela}")
+    cursor.execute(f"ALTER TABLE {nova} RENAME TO {tabela}")
+
+    for nome, sql_indice in indices:
+        cursor.execute(INDICES_COBERTURA.get(nome, sql_indice))
+    if sequencia is not None:
+        cursor.execute("""
+            UPDATE sqlite_sequence
+            SET seq = MAX(seq, ?)
+            WHERE name = ?
+        """, (sequencia[0], tabela))
+
+
+def _m007_dinheiro_em_centavos(cursor):
+    # com foreign_keys ligado (init_db.py), o DROP das tabelas referenciadas
+    # só é conferido no COMMIT, quando as novas já têm as mesmas linhas
+    cursor.execute("PRAGMA defer_foreign_keys = ON")
+    for tabela, colunas in COLUNAS_CENTAVOS.items():
+        _reconstruir_em_centavos(cursor, tabela, colunas)
+
+    # bancos já em INTEGER (criados pelo init_db atual) só trocam os índices
+    for antigo, sql in INDICES_COBERTURA.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (antigo,))
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX {antigo}")
+            cursor.execute(sql)
+    cursor.execute("ANALYZE")
+
+
+def _m008_pix_agendados(cursor):
+    # Pix agendados e recorrentes, no shard da conta de origem; o destino
+    # guarda só a conta (o shard dela é lido do diretório na execução, então
+    # a linha continua válida depois de dividir_shards.py). leaseDono/leaseAte:
+    # o worker que está executando o agendamento (ver agendamentos.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pix_agendados (
+            idAgendamento INTEGER PRIMARY KEY AUTOINCREMENT,
+            idContaOrigem INTEGER NOT NULL,
+            idContaDestino INTEGER NOT NULL,
+            valor INTEGER NOT NULL,
+            dataInicio DATETIME NOT NULL,
+            recorrencia TEXT,
+            repeticoes INTEGER,
+            execucoes INTEGER NOT NULL DEFAULT 0,
+            proximaExecucao DATETIME,
+            status TEXT NOT NULL DEFAULT 'ATIVO',
+            leaseDono TEXT,
+            leaseAte DATETIME,
+            idUltimaTransferencia INTEGER,
+            ultimoErro TEXT,
+            criadoEm DATETIME NOT NULL,
+            FOREIGN KEY (idContaOrigem) REFERENCES contas(idConta)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pix_agendados_proximos
+        ON pix_agendados (proximaExecucao)
+        WHERE status = 'ATIVO'
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pix_agendados_origem
+        ON pix_agendados (idContaOrigem, status)
+    """)
+
+
+def _m009_arquivo_historico(cursor):
+    # histórico arquivado (database/arquivar.py): um arquivo por ano, e o
+    # saldo líquido (recebidas - enviadas) das transferências que saíram do
+    # banco quente, por conta, para a conferência dos saldos continuar
+    # fechando só com o que ficou no quente
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS arquivamentos (
+            ano INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            arquivadoAte TEXT NOT NULL,
+            transferencias INTEGER NOT NULL DEFAULT 0,
+            lancamentos INTEGER NOT NULL DEFAULT 0,
+            atualizadoEm DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saldos_arquivados (
+            idConta INTEGER PRIMARY KEY,
+            saldoArquivado INTEGER NOT NULL
+        )
+    """)
+
+
+# (versão, descrição, função) — só acrescente no final, nunca reordene
+MIGRACOES = [
+    (1, "contas.saldoAtual materializado", _m001_saldo_materializado),
+    (2, "índices dos caminhos quentes", _m002_indices_hot_path),
+    (3, "uma fatura por cartão e mês de referência", _m003_fatura_unica_por_mes),
+    (4, "cartoesCredito.versao", _m004_versao_cartao),
+    (5, "checkpoints do fechamento de faturas", _m005_fechamento_faturas),
+    (6, "Pix entre shards", _m006_pix_entre_shards),
+    (7, "dinheiro em centavos (INTEGER) e índices de cobertura", _m007_dinheiro_em_centavos),
+    (8, "Pix agendados e recorrentes", _m008_pix_agendados),
+    (9, "histórico arquivado por ano", _m009_arquivo_historico),
+]
+
+
+def versao_atual(cursor) -> int:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_versao (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicadaEm DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("SELECT IFNULL(MAX(versao), 0) FROM schema_versao")
+    return cursor.fetchone()[0]
+
+
+def aplicar_migracoes(conn):
+    """
+    Aplica, em ordem, as migrações ainda não registradas em schema_versao.
+    Cada migração roda na sua própria transação (BEGIN IMMEDIATE), então
+    vários workers subindo ao mesmo tempo não aplicam a mesma versão duas vezes.
+    Retorna a lista de versões aplicadas nesta chamada.
+    """
+    cursor = conn.cursor()
+    aplicadas = []
+
+    for versao, descricao, migracao in MIGRACOES:
+        if conn.in_transaction:
+            conn.commit()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if versao_atual(cursor) >= versao:
+                conn.rollback()
+                continue
+
+            # migrações não podem usar executescript: ele faria COMMIT
+            # no meio e perderíamos a atomicidade da versão
+            migracao(cursor)
+            cursor.execute("""
+                INSERT INTO schema_versao (versao, descricao, aplicadaEm)
+                VALUES (?, ?, ?)
+            """, (versao, descricao, datetime.now()))
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        aplicadas.append(versao)
+
+    return aplicadas
+
+
+def migrar_banco(path):
+    conn = sqlite3.connect(path)
+    try:
+        # WAL fica gravado no arquivo; precisa estar ligado antes de o pool de
+        # leitura (mode=ro, que não pode mudar o journal) abrir o banco
+        conn.execute("PRAGMA journal_mode = WAL")
+        return aplicar_migracoes(conn)
+    finally:
+        conn.close()
+
+
+def criar_catalogo(cursor):
+    """
+    Diretório de usuários do catálogo de shards: em que shard cada usuário
+    está, e o que precisa ser achado sem saber o shard (e-mail do login e da
+    chave Pix, nome e conta do destinatário). idUsuario e idConta são
+    alocados aqui, então são únicos entre todos os shards.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS diretorio (
+            idUsuario INTEGER PRIMARY KEY,
+            email TEXT NOT NULL UNIQUE,
+            nome TEXT NOT NULL,
+            idConta INTEGER UNIQUE,
+            shard INTEGER NOT NULL
+        )
+    """)
+
+
+def sincronizar_diretorio(catalogo, shards):
+    """
+    Cria o diretório no arquivo `catalogo` e registra os usuários de cada
+    shard (lista de caminhos, na ordem dos índices) que ainda não estão nele:
+    banco antigo, massa de criar_usuario.py ou shards recém-divididos.
+    Retorna quantos usuários entraram.
+    """
+    conn = sqlite3.connect(catalogo)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        criar_catalogo(conn.cursor())
+        conn.commit()
+
+        antes = conn.total_changes
+        for indice, path in enumerate(shards):
+            mesmo_arquivo = os.path.abspath(path) == os.path.abspath(catalogo)
+            esquema = "main" if mesmo_arquivo else "shard"
+            if not mesmo_arquivo:
+                conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO diretorio (idUsuario, email, nome, idConta, shard)
+                    SELECT
+                        u.idUsuario,
+                        u.email,
+                        u.nome,
+                        (SELECT MIN(c.idConta) FROM {esquema}.contas c WHERE c.idUsuario = u.idUsuario),
+                        ?
+                    FROM {esquema}.usuarios u
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM diretorio d WHERE d.idUsuario = u.idUsuario
+                    )
+                """, (indice,))
+                conn.commit()
+            finally:
+                if not mesmo_arquivo:
+                    conn.execute("DETACH DATABASE shard")
+        return conn.total_changes - antes
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Atualiza o schema do banco para a última versão.")
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument("--status", action="store_true", help="só mostra a versão atual")
+    args = parser.parse_args()
+
+    if args.status:
+        conn = sqlite3.connect(args.banco)
+        versao = versao_atual(conn.cursor())
+        conn.commit()
+        conn.close()
+        print(f"📦 Schema na versão {versao} (última: {MIGRACOES[-1][0]})")
+        return
+
+    aplicadas = migrar_banco(args.banco)
+    for versao, descricao, _ in MIGRACOES:
+        if versao in aplicadas:
+            print(f"⬆️  {versao:03d} {descricao}")
+
+    if aplicadas:
+        print(f"✅ Banco atualizado para a versão {aplicadas[-1]}")
+    else:
+        print("✅ Banco já está na última versão")
+
+
+if __name__ == "__main__":
+    main()
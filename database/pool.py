@@ -0,0 +1,177 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera do pool."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões SQLite reaproveitadas entre requisições.
+
+    As conexões são abertas sob demanda (nunca antes do fork dos workers),
+    já configuradas com WAL, busy_timeout e cache de statements, e ficam
+    numa pilha LIFO para que a conexão mais "quente" seja a próxima a sair.
+
+    Com somente_leitura=True as conexões abrem com a URI mode=ro: sob WAL,
+    leitores nunca esperam o escritor, então ficam num pool separado do
+    (pequeno) pool de escrita. mmap_mb e cache_mb ligam o mmap_size e o
+    cache_size de cada conexão.
+    """
+
+    def __init__(self, path, size=8, timeout=10.0, busy_timeout_ms=5000,
+                 cached_statements=256, factory=sqlite3.Connection,
+                 somente_leitura=False, mmap_mb=0, cache_mb=None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.factory = factory
+        self.somente_leitura = somente_leitura
+        self.mmap_mb = mmap_mb
+        self.cache_mb = cache_mb
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._criadas = 0
+        self._em_uso = 0
+
+        # métricas
+        self._aquisicoes = 0
+        self._esperas = 0
+        self._timeouts = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._pico_em_uso = 0
+
+    def _conectar(self):
+        if self.somente_leitura:
+            destino = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+        else:
+            destino = self.path
+        conn = sqlite3.connect(
+            destino,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=self.factory,
+            uri=self.somente_leitura,
+        )
+        # o modo WAL fica gravado no arquivo: quem liga é a conexão de escrita
+        # (e as migrações, antes de qualquer pool abrir)
+        if not self.somente_leitura:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if self.mmap_mb:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_mb) * 1024 * 1024}")
+        if self.cache_mb:
+            # negativo: tamanho em KiB, não em páginas
+            conn.execute(f"PRAGMA cache_size = {-int(self.cache_mb) * 1024}")
+        return conn
+
+    def acquire(self):
+        inicio = time.perf_counter()
+        esperou = False
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                pode_criar = self._criadas < self.size
+                if pode_criar:
+                    self._criadas += 1
+            if pode_criar:
+                try:
+                    conn = self._conectar()
+                except Exception:
+                    with self._lock:
+                        self._criadas -= 1
+                    raise
+            else:
+                esperou = True
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(
+                        f"nenhuma conexão livre em {self.timeout:.1f}s "
+                        f"(pool com {self.size} conexões)"
+                    )
+
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            self._aquisicoes += 1
+            self._em_uso += 1
+            self._pico_em_uso = max(self._pico_em_uso, self._em_uso)
+            if esperou:
+                self._esperas += 1
+                self._espera_total += espera
+                self._espera_max = max(self._espera_max, espera)
+        return conn
+
+    def aquecer(self, quantidade):
+        """
+        Abre até `quantidade` conexões de uma vez (no worker, depois do fork),
+        para a primeira onda de requisições não pagar o connect e os PRAGMAs.
+        """
+        abertas = 0
+        while abertas < quantidade:
+            with self._lock:
+                if self._criadas >= self.size:
+                    break
+                self._criadas += 1
+            try:
+                conn = self._conectar()
+            except Exception:
+                with self._lock:
+                    self._criadas -= 1
+                raise
+            self._idle.put(conn)
+            abertas += 1
+        return abertas
+
+    def release(self, conn):
+        # nunca devolve ao pool uma transação pela metade
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._em_uso -= 1
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._criadas -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "somente_leitura": self.somente_leitura,
+                "tamanho": self.size,
+                "abertas": self._criadas,
+                "em_uso": self._em_uso,
+                "livres": self._idle.qsize(),
+                "pico_em_uso": self._pico_em_uso,
+                "aquisicoes": self._aquisicoes,
+                "esperas": self._esperas,
+                "timeouts": self._timeouts,
+                "espera_total_ms": round(self._espera_total * 1000, 3),
+                "espera_media_ms": round(
+                    self._espera_total * 1000 / self._esperas, 3
+                ) if self._esperas else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 3),
+            }
@@ -0,0 +1,95 @@
+import argparse
+import sqlite3
+
+from migracoes import aplicar_migracoes
+
+DB_PATH = "banco.sqlite"
+
+
+def saldos_divergentes(cursor):
+    """
+    Recalcula o saldo de todas as contas a partir do histórico completo
+    (saldoInicial + saldo das transferências arquivadas + recebidas -
+    enviadas) e devolve as que não batem com contas.saldoAtual, como
+    (idConta, saldoAtual, saldoLedger). Em centavos: a comparação é exata,
+    e as somas por conta saem só dos índices de cobertura de transferencias.
+    """
+    cursor.execute("""
+        SELECT
+            c.idConta,
+            c.saldoAtual,
+            c.saldoInicial
+            + IFNULL(a.saldoArquivado, 0)
+            + IFNULL(e.total, 0)
+            - IFNULL(s.total, 0) AS saldoLedger
+        FROM contas c
+        LEFT JOIN saldos_arquivados a ON a.idConta = c.idConta
+        LEFT JOIN (
+            SELECT idContaDestino AS idConta, SUM(valor) AS total
+            FROM transferencias
+            GROUP BY idContaDestino
+        ) e ON e.idConta = c.idConta
+        LEFT JOIN (
+            SELECT idContaOrigem AS idConta, SUM(valor) AS total
+            FROM transferencias
+            GROUP BY idContaOrigem
+        ) s ON s.idConta = c.idConta
+        ORDER BY c.idConta
+    """)
+    return [
+        (idConta, saldo_atual, saldo_ledger)
+        for idConta, saldo_atual, saldo_ledger in cursor.fetchall()
+        if saldo_atual != saldo_ledger
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Confere contas.saldoAtual contra o histórico de transferências."
+    )
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument(
+        "--corrigir",
+        action="store_true",
+        help="regrava saldoAtual das contas divergentes com o valor do histórico",
+    )
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.banco)
+
+    # bancos antigos ganham a coluna saldoAtual (já preenchida) aqui
+    if aplicar_migracoes(db):
+        print("🆕 Schema atualizado")
+
+    cursor = db.cursor()
+
+    # BEGIN IMMEDIATE: nenhuma transferência entra entre a conferência e a correção
+    cursor.execute("BEGIN IMMEDIATE")
+
+    divergentes = saldos_divergentes(cursor)
+
+    for idConta, saldo_atual, saldo_ledger in divergentes:
+        print(
+            f"⚠️  Conta {idConta}: saldoAtual R$ {saldo_atual / 100:,.2f} "
+            f"≠ histórico R$ {saldo_ledger / 100:,.2f}"
+        )
+
+    if divergentes and args.corrigir:
+        cursor.executemany("""
+            UPDATE contas
+            SET saldoAtual = ?
+            WHERE idConta = ?
+        """, [(saldo_ledger, idConta) for idConta, _, saldo_ledger in divergentes])
+        print(f"🔧 {len(divergentes)} conta(s) corrigida(s)")
+
+    db.commit()
+    db.close()
+
+    if not divergentes:
+        print("✅ Todos os saldos conferem com o histórico")
+    elif not args.corrigir:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import ast
+import os
+import sqlite3
+import string
+
+from migracoes import aplicar_migracoes, criar_catalogo
+
+DB_PATH = "banco.sqlite"
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ARQUIVOS = [os.path.join(RAIZ, "app.py")]
+
+
+# valores de exemplo para os campos das consultas montadas por f-string ou
+# .format(): {esquema} é o banco quente ou um arquivo por ano (arquivo.py),
+# com o mesmo schema, então o plano no "main" vale para os dois
+AMOSTRAS = {"esquema": "main"}
+
+
+def _renderizar_fstring(no):
+    """Texto do f-string com os campos trocados por AMOSTRAS, ou None se houver outro campo."""
+    partes = []
+    for valor in no.values:
+        if isinstance(valor, ast.Constant):
+            partes.append(valor.value)
+        elif (
+            isinstance(valor, ast.FormattedValue)
+            and isinstance(valor.value, ast.Name)
+            and valor.value.id in AMOSTRAS
+        ):
+            partes.append(AMOSTRAS[valor.value.id])
+        else:
+            return None
+    return "".join(partes)
+
+
+def _renderizar_format(no, constantes):
+    """
+    Texto de modelo.format(...) com os campos trocados por AMOSTRAS, ou None.
+    O modelo é um literal ou um nome atribuído a um literal na mesma função
+    (ou numa que a contém).
+    """
+    modelo = no.func.value
+    if isinstance(modelo, ast.Name):
+        modelo = constantes.get(modelo.id)
+    if not (isinstance(modelo, ast.Constant) and isinstance(modelo.value, str)):
+        return None
+    campos = {campo for _, campo, _, _ in string.Formatter().parse(modelo.value) if campo}
+    if not campos <= AMOSTRAS.keys():
+        return None
+    return modelo.value.format(**AMOSTRAS)
+
+
+def consultas_do_arquivo(caminho):
+    """
+    Consultas das chamadas .execute(...) do arquivo: literais, f-strings e
+    modelo.format(...) cujos campos estão em AMOSTRAS (também dentro de
+    consultas montadas com join, como as do histórico arquivado).
+    Retorna (consultas, puladas): consultas como (linha, sql) e as chamadas
+    que não deu para montar como (linha, motivo).
+    """
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read(), filename=caminho)
+
+    # cada chamada fica com os nomes atribuídos a um literal (consulta =
+    # """...""") nas funções que a contêm, valendo o da mais interna; ast.walk
+    # visita as funções de fora antes das de dentro
+    escopo_da_chamada = {}
+    for escopo in ast.walk(arvore):
+        if not isinstance(escopo, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        corpo = escopo.body if isinstance(escopo, ast.Module) else list(ast.walk(escopo))
+        constantes = {
+            alvo.id: no.value
+            for no in corpo
+            if isinstance(no, ast.Assign) and isinstance(no.value, ast.Constant)
+            for alvo in no.targets
+            if isinstance(alvo, ast.Name)
+        }
+        for no in ast.walk(escopo):
+            if (
+                isinstance(no, ast.Call)
+                and isinstance(no.func, ast.Attribute)
+                and no.func.attr in ("execute", "executemany")
+                and no.args
+            ):
+                escopo_da_chamada[no] = {**escopo_da_chamada.get(no, {}), **constantes}
+
+    consultas = []
+    puladas = []
+    for no, constantes in escopo_da_chamada.items():
+        argumento = no.args[0]
+        if isinstance(argumento, ast.Constant) and isinstance(argumento.value, str):
+            consultas.append((no.lineno, argumento.value))
+            continue
+        if isinstance(argumento, ast.JoinedStr):
+            sql = _renderizar_fstring(argumento)
+            if sql is not None:
+                consultas.append((no.lineno, sql))
+            else:
+                puladas.append((no.lineno, "f-string com campos fora de AMOSTRAS"))
+            continue
+
+        modelos = [
+            chamada for chamada in ast.walk(argumento)
+            if isinstance(chamada, ast.Call)
+            and isinstance(chamada.func, ast.Attribute)
+            and chamada.func.attr == "format"
+        ]
+        renderizadas = [_renderizar_format(chamada, constantes) for chamada in modelos]
+        if modelos and None not in renderizadas:
+            for sql in renderizadas:
+                consultas.append((no.lineno, sql))
+        else:
+            puladas.append((no.lineno, "consulta montada em tempo de execução"))
+
+    return sorted(consultas), sorted(puladas)
+
+
+def banco_so_schema(path):
+    """Cópia em memória só com o schema do banco, já migrada para a última versão (e com o catálogo)."""
+    origem = sqlite3.connect(path)
+    mem = sqlite3.connect(":memory:")
+    for (sql,) in origem.execute("""
+        SELECT sql
+        FROM sqlite_master
+        WHERE sql IS NOT NULL
+          AND name NOT LIKE 'sqlite_%'
+        ORDER BY type = 'index'
+    """):
+        mem.execute(sql)
+    # as versões já aplicadas vêm junto: migrar de novo um schema atual não
+    # pode refazer migrações antigas
+    if origem.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_versao'").fetchone():
+        mem.executemany(
+            "INSERT INTO schema_versao VALUES (?, ?, ?)",
+            origem.execute("SELECT versao, descricao, aplicadaEm FROM schema_versao"),
+        )
+    origem.close()
+    aplicar_migracoes(mem)
+    # as consultas ao diretório (catálogo de shards) também estão no app.py
+    criar_catalogo(mem.cursor())
+    return mem
+
+
+def plano(conn, sql):
+    parametros = (None,) * sql.count("?")
+    return [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, parametros)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Confere, via EXPLAIN QUERY PLAN, se toda consulta usa índice."
+    )
+    parser.add_argument("banco", nargs="?", default=DB_PATH)
+    parser.add_argument("--arquivo", action="append", help="arquivo .py a verificar (padrão: app.py)")
+    args = parser.parse_args()
+
+    conn = banco_so_schema(args.banco)
+    falhas = 0
+
+    for caminho in args.arquivo or ARQUIVOS:
+        nome = os.path.relpath(caminho, RAIZ)
+        consultas, puladas = consultas_do_arquivo(caminho)
+        for linha, motivo in puladas:
+            print(f"⏭️  {nome}:{linha} não verificada: {motivo}")
+        for linha, sql in consultas:
+            try:
+                detalhes = plano(conn, sql)
+            except sqlite3.Error as e:
+                print(f"❌ {nome}:{linha} não compila: {e}")
+                falhas += 1
+                continue
+
+            # "SCAN tabela" sem índice = varredura completa; "SCAN (subquery-N)"
+            # só percorre o resultado (já limitado) de uma subconsulta
+            scans = [
+                d for d in detalhes
+                if d.startswith("SCAN ")
+                and "INDEX" not in d
+                and not d.startswith("SCAN (")
+            ]
+            if scans:
+                falhas += 1
+                print(f"❌ {nome}:{linha} " + "; ".join(scans))
+            elif any("TEMP B-TREE" in d for d in detalhes):
+                print(f"⚠️  {nome}:{linha} usa índice, mas ordena em B-tree temporária")
+            else:
+                print(f"✅ {nome}:{linha}")
+
+    if falhas:
+        print(f"\n{falhas} consulta(s) sem índice")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Valores em dinheiro.
+
+Todo valor é gravado em centavos inteiros (colunas INTEGER): somas e
+comparações no SQLite são exatas, sem o erro acumulado de REAL, e a
+formatação é só aritmética inteira. Reais só aparecem na borda: no que o
+usuário digita (para_centavos) e no que é exibido (formatar_brl).
+"""
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+# grupos de milhar "000".."999" e centavos "00".."99" prontos: formatar é
+# só indexar tabelas, sem format() de float nem replace() por valor
+_MILHAR = tuple(f"{i:03d}" for i in range(1000))
+_CENTAVOS = tuple(f"{i:02d}" for i in range(100))
+
+# só dígitos com ponto decimal opcional: sem expoente ("1e20"), "inf" ou "nan"
+_NUMERO = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)")
+
+# maior valor aceito na borda (R$ 10 trilhões): longe do limite do INTEGER
+# do SQLite (2**63 - 1), com folga para as somas de saldos e faturas
+MAX_CENTAVOS = 10 ** 15
+
+
+def formatar_brl(centavos: int) -> str:
+    """123456789 -> "1.234.567,89" (sem o "R$"). Filtro |brl dos templates."""
+    if centavos < 0:
+        return "-" + formatar_brl(-centavos)
+    reais, resto = divmod(centavos, 100)
+    if reais < 1000:
+        return f"{reais},{_CENTAVOS[resto]}"
+
+    grupos = []
+    while reais >= 1000:
+        reais, grupo = divmod(reais, 1000)
+        grupos.append(_MILHAR[grupo])
+    grupos.append(str(reais))
+    grupos.reverse()
+    return ".".join(grupos) + "," + _CENTAVOS[resto]
+
+
+def para_centavos(texto) -> int:
+    """
+    Valor em reais como vem do formulário ("12.5", "12,50", "1.234,56") em
+    centavos, arredondando meio centavo para cima. Levanta ValueError se
+    não for um número decimal simples ou passar de MAX_CENTAVOS.
+    """
+    texto = str(texto).strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    if not _NUMERO.fullmatch(texto):
+        raise ValueError(f"valor inválido: {texto!r}")
+    centavos = int(Decimal(texto).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    if abs(centavos) > MAX_CENTAVOS:
+        raise ValueError(f"valor fora do limite: {texto!r}")
+    return centavos
@@ -0,0 +1,306 @@
+"""
+Pipeline de arquivos estáticos.
+
+Build (antes do deploy):
+
+    python estaticos.py
+
+gera em static/dist/ cópias com o hash do conteúdo no nome (style.3f9a1c2b7e.css),
+o CSS minificado e pré-comprimido (.gz e, com o pacote brotli, .br), e das
+imagens variantes redimensionadas em WebP e no formato original (com Pillow).
+O manifest.json liga cada nome original aos gerados.
+
+No app, os templates usam asset('style.css') e imagem('img/pix.png', 35);
+sem o build (ou em desenvolvimento) as URLs caem nos arquivos originais.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_file, send_from_directory
+from markupsafe import Markup, escape
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image
+except ImportError:  # build sem variantes de imagem
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # build só com .gz
+    brotli = None
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+ORIGEM = os.path.join(RAIZ, "static")
+DESTINO = os.path.join(ORIGEM, "dist")
+MANIFESTO = "manifest.json"
+
+# larguras (px) das variantes; o srcset escolhe a menor que cobre 1x e 2x
+LARGURAS = (24, 48, 96, 192, 384, 768)
+IMAGENS = {".png", ".jpg", ".jpeg"}
+COMPRIMIR = {".css", ".js", ".svg", ".json"}
+# só vale a pena pré-comprimir a partir daqui
+MIN_COMPRIMIR = 512
+
+# nome com hash nunca muda de conteúdo: o navegador pode guardar por um ano
+UM_ANO = 365 * 24 * 3600
+
+
+def _hash(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()[:10]
+
+
+def minificar_css(css: str) -> str:
+    """
+    Remove comentários e espaços que não mudam o significado. Espaço antes
+    de ":" fica (em seletor, "a :hover" é diferente de "a:hover").
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def _gravar(destino, relativo, conteudo: bytes) -> str:
+    """Grava com o hash no nome e devolve o caminho relativo gerado."""
+    base, extensao = os.path.splitext(relativo)
+    gerado = f"{base}.{_hash(conteudo)}{extensao}"
+    caminho = os.path.join(destino, gerado)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+
+    if extensao in COMPRIMIR and len(conteudo) >= MIN_COMPRIMIR:
+        # mtime fixo: o .gz de um mesmo conteúdo sai sempre igual
+        with open(caminho + ".gz", "wb") as f:
+            f.write(gzip.compress(conteudo, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(caminho + ".br", "wb") as f:
+                f.write(brotli.compress(conteudo, quality=11))
+    return gerado.replace(os.sep, "/")
+
+
+def _variantes(destino, relativo, caminho, arquivo):
+    """
+    Variantes redimensionadas da imagem: {formato: {largura: arquivo}}. Na
+    largura original, o fallback é a própria cópia com hash (`arquivo`).
+    """
+    base, extensao = os.path.splitext(relativo)
+    formato_original = "jpeg" if extensao in (".jpg", ".jpeg") else "png"
+
+    with Image.open(caminho) as original:
+        original.load()
+        largura_original = original.width
+        larguras = [l for l in LARGURAS if l < largura_original]
+
+        variantes = {"webp": {}, formato_original: {largura_original: arquivo}}
+        for largura in larguras + [largura_original]:
+            altura = max(1, round(original.height * largura / largura_original))
+            imagem = original if largura == largura_original else original.resize(
+                (largura, altura), Image.LANCZOS
+            )
+            for formato in variantes:
+                if largura in variantes[formato]:
+                    continue
+                convertida = imagem
+                if formato == "jpeg" and convertida.mode not in ("RGB", "L"):
+                    convertida = convertida.convert("RGB")
+                conteudo = _codificar(convertida, formato)
+                nome = f"{base}.{largura}w.{'webp' if formato == 'webp' else extensao[1:]}"
+                variantes[formato][largura] = _gravar(destino, nome, conteudo)
+    return largura_original, variantes
+
+
+def _codificar(imagem, formato) -> bytes:
+    saida = io.BytesIO()
+    if formato == "webp":
+        imagem.save(saida, "WEBP", quality=82, method=4)
+    elif formato == "jpeg":
+        imagem.save(saida, "JPEG", quality=85, optimize=True, progressive=True)
+    else:
+        imagem.save(saida, "PNG", optimize=True)
+    return saida.getvalue()
+
+
+def construir(origem=ORIGEM, destino=DESTINO):
+    """Gera destino/ do zero a partir de origem/ e devolve o manifesto."""
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+
+    manifesto = {}
+    for pasta, subpastas, arquivos in os.walk(origem):
+        if os.path.abspath(pasta) == os.path.abspath(destino):
+            subpastas.clear()
+            continue
+        subpastas[:] = [
+            s for s in subpastas
+            if os.path.abspath(os.path.join(pasta, s)) != os.path.abspath(destino)
+        ]
+
+        for arquivo in sorted(arquivos):
+            caminho = os.path.join(pasta, arquivo)
+            relativo = os.path.relpath(caminho, origem).replace(os.sep, "/")
+            extensao = os.path.splitext(arquivo)[1].lower()
+
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+            if extensao == ".css":
+                conteudo = minificar_css(conteudo.decode("utf-8")).encode("utf-8")
+
+            entrada = {"arquivo": _gravar(destino, relativo, conteudo)}
+            if extensao in IMAGENS and Image is not None:
+                entrada["largura"], entrada["variantes"] = _variantes(
+                    destino, relativo, caminho, entrada["arquivo"]
+                )
+            manifesto[relativo] = entrada
+
+    with open(os.path.join(destino, MANIFESTO), "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    return manifesto
+
+
+class Estaticos:
+    """URLs dos arquivos gerados pelo build e a rota que os serve."""
+
+    def __init__(self, app=None):
+        self.manifesto = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.prefixo = app.static_url_path
+        caminho = os.path.join(DESTINO, MANIFESTO)
+        if app.config["ESTATICOS_DIST"] and os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                self.manifesto = json.load(f)
+
+        app.add_url_rule(f"{self.prefixo}/dist/<path:nome>", "estaticos_dist", servir_dist)
+        app.jinja_env.globals.update(asset=self.url, imagem=self.imagem)
+        app.extensions["estaticos"] = self
+
+    def url(self, nome, largura=None):
+        """
+        URL de static/<nome>: a versão com hash se houver build. Com largura,
+        a menor variante no formato original que cobre essa largura.
+        """
+        entrada = self.manifesto.get(nome)
+        if entrada is None:
+            return f"{self.prefixo}/{nome}"
+        if largura and "variantes" in entrada:
+            formato = next(f for f in entrada["variantes"] if f != "webp")
+            return self._dist(self._variante(entrada["variantes"][formato], largura))
+        return self._dist(entrada["arquivo"])
+
+    def _dist(self, arquivo):
+        return f"{self.prefixo}/dist/{arquivo}"
+
+    @staticmethod
+    def _variante(variantes, largura):
+        larguras = sorted(variantes, key=int)
+        escolhida = next((l for l in larguras if int(l) >= largura), larguras[-1])
+        return variantes[escolhida]
+
+    def _srcset(self, variantes, largura):
+        um, dois = self._variante(variantes, largura), self._variante(variantes, largura * 2)
+        if um == dois:
+            return self._dist(um)
+        return f"{self._dist(um)} 1x, {self._dist(dois)} 2x"
+
+    def imagem(self, nome, largura, **atributos):
+        """
+        <img> exibida com `largura` px: com build, um <picture> com WebP e
+        fallback no formato original, ambos em 1x/2x.
+        """
+        attrs = "".join(
+            f' {chave.rstrip("_").replace("_", "-")}="{escape(valor)}"'
+            for chave, valor in atributos.items()
+        )
+        entrada = self.manifesto.get(nome)
+        if entrada is None or "variantes" not in entrada:
+            return Markup(f'<img src="{escape(self.url(nome))}"{attrs}>')
+
+        variantes = entrada["variantes"]
+        formato = next(f for f in variantes if f != "webp")
+        fallback = self._srcset(variantes[formato], largura)
+        return Markup(
+            "<picture>"
+            f'<source type="image/webp" srcset="{escape(self._srcset(variantes["webp"], largura))}">'
+            f'<img src="{escape(self._dist(self._variante(variantes[formato], largura)))}"'
+            f' srcset="{escape(fallback)}"{attrs}>'
+            "</picture>"
+        )
+
+
+def servir_dist(nome):
+    """
+    Arquivos de static/dist/: cache de um ano (o nome muda quando o conteúdo
+    muda) e a versão .br/.gz já comprimida quando o navegador aceita.
+    """
+    caminho = safe_join(DESTINO, nome)
+    if caminho is None or not os.path.isfile(caminho):
+        raise NotFound()
+
+    resposta = None
+    for codificacao in ("br", "gzip"):
+        comprimido = caminho + (".br" if codificacao == "br" else ".gz")
+        if request.accept_encodings[codificacao] and os.path.isfile(comprimido):
+            resposta = send_file(
+                comprimido,
+                mimetype=mimetypes.guess_type(nome)[0] or "application/octet-stream",
+                max_age=UM_ANO,
+                etag=False,
+            )
+            resposta.headers["Content-Encoding"] = codificacao
+            break
+    if resposta is None:
+        resposta = send_from_directory(DESTINO, nome, max_age=UM_ANO, etag=False)
+
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    resposta.vary.add("Accept-Encoding")
+    return resposta
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gera static/dist/ (nomes com hash, CSS minificado e comprimido, variantes WebP)."
+    )
+    parser.parse_args()
+
+    if Image is None:
+        print("⚠️  Pillow não instalado: imagens copiadas sem variantes (pip install Pillow)")
+    if brotli is None:
+        print("⚠️  brotli não instalado: CSS só com .gz (pip install brotli)")
+
+    manifesto = construir()
+
+    def kb(arquivo):
+        return f"{os.path.getsize(os.path.join(DESTINO, arquivo)) / 1024:.1f} KB"
+
+    for nome, entrada in sorted(manifesto.items()):
+        original = f"{os.path.getsize(os.path.join(ORIGEM, nome)) / 1024:.1f} KB"
+        gerados = [f"{entrada['arquivo'].rsplit('/', 1)[-1]} {kb(entrada['arquivo'])}"]
+        for sufixo in (".gz", ".br"):
+            if os.path.exists(os.path.join(DESTINO, entrada["arquivo"] + sufixo)):
+                gerados.append(f"{sufixo[1:]} {kb(entrada['arquivo'] + sufixo)}")
+        if "variantes" in entrada:
+            webp = entrada["variantes"]["webp"]
+            gerados.append(f"webp {kb(webp[entrada['largura']])}")
+            gerados.append(f"{len(webp)} larguras")
+        print(f"   {nome:22} {original:>10} → {' · '.join(gerados)}")
+
+    print(f"✅ {len(manifesto)} arquivo(s) em {os.path.relpath(DESTINO, RAIZ)}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Eventos em tempo real (Server-Sent Events).
+
+Pub/sub em memória, por conta: pix_send e shopping_comprar publicam o que
+acabaram de gravar, e cada aba aberta em /api/eventos recebe só os eventos
+da própria conta, sem consulta ao banco. Os últimos eventos de cada conta
+ficam guardados por alguns minutos, então quem reconecta (Last-Event-ID) ou
+assina logo depois de carregar a página não perde nada.
+
+Com vários workers (gunicorn), cada evento é repassado aos outros processos
+por sockets Unix de datagrama numa pasta compartilhada (ATLAS_EVENTOS_DIR):
+a aba pode estar ligada a um worker e o Pix ter sido gravado em outro. Sem
+a pasta, os eventos ficam no processo (servidor de desenvolvimento).
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+
+log = logging.getLogger("atlas.eventos")
+
+# maior datagrama aceito entre workers (um evento tem poucas centenas de bytes)
+TAMANHO_DATAGRAMA = 64 * 1024
+# espera do EventSource antes de reconectar
+RETRY_MS = 3000
+
+
+class Assinatura:
+    """Uma conexão SSE: a fila dos eventos da conta ainda não enviados."""
+
+    def __init__(self, idConta, tamanho_fila):
+        self.idConta = idConta
+        self.fila = queue.Queue(tamanho_fila)
+        # a fila encheu (cliente lento): o cliente recarrega em vez de
+        # continuar com eventos faltando
+        self.atrasada = False
+
+    def entregar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            self.atrasada = True
+
+
+class Eventos:
+    """
+    Pub/sub de eventos por conta. Nada abre socket ou thread na construção:
+    o receptor dos outros workers sobe no primeiro uso de cada processo.
+    """
+
+    def __init__(self, max_conexoes, pasta="", retencao_s=120.0, max_retidos=20, tamanho_fila=100):
+        self.max_conexoes = max_conexoes
+        self.pasta = pasta
+        self.retencao_s = retencao_s
+        self.max_retidos = max_retidos
+        self.tamanho_fila = tamanho_fila
+
+        self._lock = threading.Lock()
+        # idConta -> assinaturas abertas neste processo
+        self._assinaturas = {}
+        self._conexoes = 0
+        # idConta -> deque de (instante, evento) recentes, para reenvio; na
+        # ordem do evento mais novo de cada conta, a mais antiga na frente
+        self._retidos = OrderedDict()
+        self._ultimo_id = 0
+
+        self._socket = None
+        self._thread = None
+        self._pid = None
+        self._parar = None
+
+        self.publicados = 0
+        self.recebidos = 0
+        self.recusadas = 0
+
+    def iniciar(self):
+        """No worker, após o fork: começa a receber os eventos dos outros workers."""
+        self._garantir_receptor()
+
+    def marco(self) -> int:
+        """
+        Id a partir do qual uma página recém-renderizada precisa dos
+        eventos: tudo publicado antes já estava gravado quando ela leu o banco.
+        """
+        return max(self._ultimo_id, time.time_ns() // 1000)
+
+    # ===== publicação =====
+
+    def _novo_id(self):
+        # microssegundos desde a época, estritamente crescente no processo:
+        # comparável entre workers para o Last-Event-ID
+        with self._lock:
+            self._ultimo_id = max(self._ultimo_id + 1, time.time_ns() // 1000)
+            return self._ultimo_id
+
+    def publicar(self, idConta, tipo, dados):
+        """Entrega o evento às abas da conta, neste e nos outros workers."""
+        self._garantir_receptor()
+        evento = {"id": self._novo_id(), "conta": idConta, "tipo": tipo, "dados": dados}
+        self._entregar(evento)
+        with self._lock:
+            self.publicados += 1
+        if self._socket is not None:
+            self._espalhar(json.dumps(evento, ensure_ascii=False).encode("utf-8"))
+        return evento
+
+    def _entregar(self, evento):
+        agora = time.monotonic()
+        with self._lock:
+            retidos = self._retidos.get(evento["conta"])
+            if retidos is None:
+                retidos = self._retidos[evento["conta"]] = deque(maxlen=self.max_retidos)
+            else:
+                self._retidos.move_to_end(evento["conta"])
+            retidos.append((agora, evento))
+            self._ultimo_id = max(self._ultimo_id, evento["id"])
+            assinaturas = list(self._assinaturas.get(evento["conta"], ()))
+            self._podar(agora)
+        for assinatura in assinaturas:
+            assinatura.entregar(evento)
+
+    def _podar(self, agora):
+        # sob o lock: descarta contas cujo evento mais novo já expirou, pela
+        # frente (só as expiradas são visitadas, não todas a cada evento)
+        limite = agora - self.retencao_s
+        while self._retidos:
+            idConta, retidos = next(iter(self._retidos.items()))
+            if retidos[-1][0] >= limite:
+                break
+            del self._retidos[idConta]
+
+    # ===== assinatura =====
+
+    def assinar(self, idConta, desde=0):
+        """
+        Abre uma assinatura já com os eventos guardados da conta mais novos
+        que `desde`, ou None se o worker já está no limite de conexões.
+        """
+        self._garantir_receptor()
+        assinatura = Assinatura(idConta, self.tamanho_fila)
+        limite = time.monotonic() - self.retencao_s
+        with self._lock:
+            if self._conexoes >= self.max_conexoes:
+                self.recusadas += 1
+                return None
+            self._conexoes += 1
+            self._assinaturas.setdefault(idConta, set()).add(assinatura)
+            pendentes = [
+                evento for instante, evento in self._retidos.get(idConta, ())
+                if instante >= limite and evento["id"] > desde
+            ]
+        for evento in pendentes:
+            assinatura.entregar(evento)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        """Fecha a assinatura (pode ser chamado mais de uma vez)."""
+        with self._lock:
+            abertas = self._assinaturas.get(assinatura.idConta)
+            if abertas is None or assinatura not in abertas:
+                return
+            abertas.discard(assinatura)
+            if not abertas:
+                del self._assinaturas[assinatura.idConta]
+            self._conexoes -= 1
+
+    def stream(self, assinatura, heartbeat_s, duracao_max_s):
+        """
+        Corpo text/event-stream da assinatura. Comentários a cada
+        `heartbeat_s` mantêm a conexão (e revelam um cliente que saiu);
+        depois de `duracao_max_s` a resposta termina e o EventSource
+        reconecta com o Last-Event-ID, liberando a thread do worker.
+        """
+        fim = time.monotonic() + duracao_max_s
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                restante = fim - time.monotonic()
+                if restante <= 0:
+                    return
+                try:
+                    evento = assinatura.fila.get(timeout=min(heartbeat_s, restante))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield formatar(evento)
+                if assinatura.atrasada:
+                    yield "event: recarregar\ndata: {}\n\n"
+                    return
+        finally:
+            self.cancelar(assinatura)
+
+    # ===== entre workers =====
+
+    def _caminho(self, pid):
+        return os.path.join(self.pasta, f"{pid}.sock")
+
+    def _garantir_receptor(self):
+        # um socket e uma thread por processo (de novo em cada worker após o fork)
+        if not self.pasta or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if self._socket is not None:
+                # cópia herdada do processo pai pelo fork
+                self._socket.close()
+                self._socket = None
+            if not hasattr(socket, "AF_UNIX"):
+                log.warning("sem sockets Unix nesta plataforma: eventos só dentro de cada processo")
+                return
+
+            os.makedirs(self.pasta, exist_ok=True)
+            caminho = self._caminho(self._pid)
+            if os.path.exists(caminho):
+                os.unlink(caminho)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(caminho)
+            self._socket = sock
+            self._parar = threading.Event()
+            self._thread = threading.Thread(
+                target=self._receber, args=(sock, self._parar), name="atlas-eventos", daemon=True
+            )
+            self._thread.start()
+
+    def _espalhar(self, dados):
+        proprio = f"{self._pid}.sock"
+        try:
+            nomes = [n for n in os.listdir(self.pasta) if n.endswith(".sock") and n != proprio]
+        except FileNotFoundError:
+            return
+        for nome in nomes:
+            try:
+                self._socket.sendto(dados, os.path.join(self.pasta, nome))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # worker que já saiu: o socket dele fica para trás
+                try:
+                    os.unlink(os.path.join(self.pasta, nome))
+                except FileNotFoundError:
+                    pass
+            except OSError:
+                log.exception("falha ao repassar evento para %s", nome)
+
+    def _receber(self, sock, parar):
+        while True:
+            try:
+                dados = sock.recv(TAMANHO_DATAGRAMA)
+            except OSError:
+                return
+            if parar.is_set():
+                return
+            try:
+                evento = json.loads(dados)
+            except ValueError:
+                log.warning("datagrama de evento inválido descartado")
+                continue
+            with self._lock:
+                self.recebidos += 1
+            self._entregar(evento)
+
+    def parar(self):
+        if self._socket is not None and self._pid == os.getpid():
+            # close() não acorda um recv bloqueado: um datagrama vazio acorda
+            self._parar.set()
+            self._socket.sendto(b"", self._caminho(self._pid))
+            self._thread.join()
+            self._socket.close()
+            try:
+                os.unlink(self._caminho(self._pid))
+            except FileNotFoundError:
+                pass
+        self._socket = None
+        self._thread = None
+        self._pid = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "conexoes": self._conexoes,
+                "max_conexoes": self.max_conexoes,
+                "contas_assinadas": len(self._assinaturas),
+                "contas_retidas": len(self._retidos),
+                "publicados": self.publicados,
+                "recebidos_de_outros_workers": self.recebidos,
+                "recusadas": self.recusadas,
+                "entre_workers": self._socket is not None,
+            }
+
+
+def formatar(evento) -> str:
+    """Um evento no formato text/event-stream (id, nome e dados em JSON)."""
+    dados = json.dumps(evento["dados"], ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
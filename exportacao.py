@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+# linhas buscadas do cursor por vez: a memória fica constante
+# independente do tamanho do extrato
+TAMANHO_LOTE = 500
+
+FORMATOS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "ofx": "application/x-ofx",
+}
+
+# toda consulta de exportação devolve as linhas começando por
+# (id, data, tipo, descricao, valor, ...)
+COLUNAS_TRANSFERENCIAS = ("id", "data", "tipo", "descricao", "valor", "contraparte")
+COLUNAS_LANCAMENTOS = ("id", "data", "tipo", "descricao", "valor", "mes", "ano")
+
+
+def intervalo_datas(de, ate):
+    """
+    Converte os filtros ?de=AAAA-MM-DD&ate=AAAA-MM-DD em limites [inicio, fim)
+    comparáveis com as datas gravadas no banco. Levanta ValueError se inválidos.
+    """
+    inicio = datetime.strptime(de, "%Y-%m-%d").strftime("%Y-%m-%d") if de else "0000-01-01"
+    if ate:
+        fim = (datetime.strptime(ate, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    else:
+        fim = "9999-12-31"
+    return inicio, fim
+
+
+def iterar_lotes(cursor, tamanho=TAMANHO_LOTE):
+    """Lê o cursor em lotes, já cortando os microssegundos da data (coluna 1)."""
+    while True:
+        linhas = cursor.fetchmany(tamanho)
+        if not linhas:
+            break
+        yield [
+            (linha[0], str(linha[1]).split(".")[0], *linha[2:])
+            for linha in linhas
+        ]
+
+
+def gerar_csv(colunas, lotes):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(colunas)
+    yield buffer.getvalue()
+
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(lote)
+        yield buffer.getvalue()
+
+
+def gerar_ndjson(colunas, lotes):
+    for lote in lotes:
+        yield "".join(
+            json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + "\n"
+            for linha in lote
+        )
+
+
+def _data_ofx(data: str) -> str:
+    return "".join(ch for ch in data if ch.isdigit())
+
+
+def gerar_ofx(lotes, tipo_conta: str, idConta: int, saldo=None):
+    """
+    OFX 2 (XML) mínimo. tipo_conta="conta" gera um extrato bancário,
+    tipo_conta="cartao" um extrato de cartão de crédito.
+    """
+    agora = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    if tipo_conta == "cartao":
+        abre = (
+            "<CREDITCARDMSGSRSV1><CCSTMTTRNRS><TRNUID>0</TRNUID>"
+            "<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>"
+            f"<CCSTMTRS><CURDEF>BRL</CURDEF><CCACCTFROM><ACCTID>{idConta}</ACCTID></CCACCTFROM>"
+        )
+        fecha = "</CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1>"
+    else:
+        abre = (
+            "<BANKMSGSRSV1><STMTTRNRS><TRNUID>0</TRNUID>"
+            "<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>"
+            "<STMTRS><CURDEF>BRL</CURDEF>"
+            f"<BANKACCTFROM><BANKID>ATLAS</BANKID><ACCTID>{idConta}</ACCTID>"
+            "<ACCTTYPE>CHECKING</ACCTTYPE></BANKACCTFROM>"
+        )
+        fecha = "</STMTRS></STMTTRNRS></BANKMSGSRSV1>"
+
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        '<?OFX OFXHEADER="200" VERSION="211" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+        "<OFX><SIGNONMSGSRSV1><SONRS>"
+        "<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>"
+        f"<DTSERVER>{agora}</DTSERVER><LANGUAGE>POR</LANGUAGE>"
+        "</SONRS></SIGNONMSGSRSV1>\n"
+        f"{abre}<BANKTRANLIST>\n"
+    )
+
+    for lote in lotes:
+        partes = []
+        for idTx, data, tipo, descricao, valor, *_ in lote:
+            debito = tipo == "DEBITO"
+            partes.append(
+                "<STMTTRN>"
+                f"<TRNTYPE>{'DEBIT' if debito else 'CREDIT'}</TRNTYPE>"
+                f"<DTPOSTED>{_data_ofx(data)}</DTPOSTED>"
+                f"<TRNAMT>{-valor if debito else valor:.2f}</TRNAMT>"
+                f"<FITID>{idTx}</FITID>"
+                f"<MEMO>{escape(descricao or '')}</MEMO>"
+                "</STMTTRN>\n"
+            )
+        yield "".join(partes)
+
+    rodape = "</BANKTRANLIST>"
+    if saldo is not None:
+        rodape += f"<LEDGERBAL><BALAMT>{saldo:.2f}</BALAMT><DTASOF>{agora}</DTASOF></LEDGERBAL>"
+    yield rodape + fecha + "</OFX>\n"
@@ -0,0 +1,80 @@
+# Configuração do gunicorn para o modo produção (wsgi:app).
+# Cada valor pode ser trocado por variável de ambiente, sem editar o arquivo.
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+# lido antes do preload do app: mede a subida inteira do master
+_inicio = time.perf_counter()
+
+bind = os.environ.get("ATLAS_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("ATLAS_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# threads por worker: as requisições esperam SQLite e hashing fora do GIL
+threads = int(os.environ.get("ATLAS_THREADS", 4))
+timeout = int(os.environ.get("ATLAS_WORKER_TIMEOUT", 30))
+keepalive = 5
+
+# importa o app (migrações + templates) uma vez no master; os workers
+# compartilham essas páginas de memória por copy-on-write
+preload_app = True
+
+# recicla workers aos poucos para conter crescimento de memória
+max_requests = int(os.environ.get("ATLAS_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get("ATLAS_ACCESS_LOG", "-")
+
+# cada worker tem seu pool de hashing (senhas.py): divide os núcleos entre
+# eles em vez de subir cpu_count processos por worker
+os.environ.setdefault(
+    "ATLAS_SENHA_PROCESSOS", str(max(1, multiprocessing.cpu_count() // workers))
+)
+
+# cada aba com /api/eventos aberto prende uma thread: metade delas fica para
+# as requisições normais. Os workers repassam eventos entre si por sockets
+# Unix numa pasta só deste master
+os.environ.setdefault("ATLAS_SSE_MAX_CONEXOES", str(max(1, threads // 2)))
+os.environ.setdefault(
+    "ATLAS_EVENTOS_DIR", os.path.join(tempfile.gettempdir(), f"atlas-eventos-{os.getpid()}")
+)
+
+
+def when_ready(server):
+    from wsgi import app
+
+    etapas = app.extensions["atlas"].inicializacao
+    server.log.info(
+        "🚀 master pronto em %.1f ms (%s)",
+        (time.perf_counter() - _inicio) * 1000,
+        ", ".join(f"{etapa} {segundos * 1000:.1f} ms" for etapa, segundos in etapas.items()),
+    )
+
+
+def post_fork(server, worker):
+    # nada de conexão SQLite ou thread atravessa o fork: cada worker abre os seus
+    from app import inicializar_worker
+    from wsgi import app
+
+    inicializar_worker(app)
+    worker.log.info(
+        "worker %s pronto em %.1f ms",
+        worker.pid, app.extensions["atlas"].inicializacao["worker"] * 1000,
+    )
+
+
+def worker_exit(server, worker):
+    import senhas
+    from wsgi import app
+
+    # o agendador usa os motores: para antes deles
+    app.extensions["atlas"].agendador.parar()
+    app.extensions["atlas"].shards.parar()
+    app.extensions["atlas"].eventos.parar()
+    senhas.parar()
+
+
+def on_exit(server):
+    # sockets de workers que caíram sem passar pelo worker_exit
+    shutil.rmtree(os.environ["ATLAS_EVENTOS_DIR"], ignore_errors=True)
@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from metricas import registro
+
+# o progress handler roda a cada N instruções da VM do SQLite
+PASSOS_POR_CHAMADA = 1000
+
+OPERACOES = {
+    "SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT",
+    "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA", "EXPLAIN",
+}
+
+# operações que têm plano de execução
+COM_PLANO = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+SEM_ROTA = "-"
+
+# log de comandos lentos: desligado até configurar_sql_lento()
+log_sql_lento = logging.getLogger("atlas.sql_lento")
+_limite_lento = None
+# EXPLAIN QUERY PLAN por texto de SQL, capturado uma vez por worker
+_planos = {}
+MAX_PLANOS = 512
+
+COMANDOS_SQL = registro.contador(
+    "atlas_sql_comandos_total",
+    "Comandos executados pelo SQLite (via trace callback), por rota e operação.",
+    ("rota", "operacao"),
+)
+DURACAO_SQL = registro.histograma(
+    "atlas_sql_duracao_segundos",
+    "Tempo de cada comando SQL, do execute até a última linha lida.",
+    ("rota", "operacao"),
+)
+PASSOS_VM_SQL = registro.contador(
+    "atlas_sql_passos_vm_total",
+    "Instruções da VM do SQLite (via progress handler), por rota.",
+    ("rota",),
+)
+COMANDOS_POR_REQUISICAO = registro.histograma(
+    "atlas_sql_comandos_por_requisicao",
+    "Comandos SQL executados em cada requisição.",
+    ("rota",),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+REQUISICOES_HTTP = registro.contador(
+    "atlas_http_requisicoes_total",
+    "Requisições atendidas, por rota, método e status.",
+    ("rota", "metodo", "status"),
+)
+DURACAO_HTTP = registro.histograma(
+    "atlas_http_duracao_segundos",
+    "Tempo de cada requisição até a resposta (sem o corpo em streaming).",
+    ("rota", "metodo"),
+)
+EM_ANDAMENTO_HTTP = registro.medidor(
+    "atlas_http_em_andamento",
+    "Requisições sendo atendidas agora neste worker.",
+)
+
+
+def operacao(sql: str) -> str:
+    palavra = sql.lstrip()[:9].split(None, 1)
+    palavra = palavra[0].upper() if palavra else ""
+    return palavra if palavra in OPERACOES else "OUTRO"
+
+
+def configurar_sql_lento(limite_ms: float, arquivo: str, max_bytes=10 * 1024 * 1024, backups=5):
+    """
+    Liga o log de comandos com duração >= limite_ms (0 desliga). Cada linha
+    do arquivo é um JSON; o arquivo gira ao passar de max_bytes.
+    """
+    global _limite_lento
+
+    for handler in list(log_sql_lento.handlers):
+        log_sql_lento.removeHandler(handler)
+        handler.close()
+
+    if not limite_ms or limite_ms <= 0:
+        _limite_lento = None
+        return
+
+    os.makedirs(os.path.dirname(arquivo) or ".", exist_ok=True)
+    handler = RotatingFileHandler(
+        arquivo, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_sql_lento.addHandler(handler)
+    log_sql_lento.setLevel(logging.INFO)
+    log_sql_lento.propagate = False
+    _limite_lento = limite_ms / 1000
+
+
+def formato_parametros(parametros) -> str:
+    """Só os tipos dos parâmetros (nunca os valores, que podem ser dados pessoais)."""
+    if parametros is None:
+        return "executemany"
+    if isinstance(parametros, dict):
+        return "{" + ", ".join(f"{nome}: {type(valor).__name__}" for nome, valor in parametros.items()) + "}"
+    return "(" + ", ".join(type(valor).__name__ for valor in parametros) + ")"
+
+
+def varreduras(plano):
+    """
+    Linhas do plano que percorrem a tabela inteira: "SCAN tabela" sem índice.
+    "SCAN (subquery-N)" só percorre o resultado de uma subconsulta (mesma
+    regra de database/verificar_indices.py).
+    """
+    return [
+        linha for linha in plano
+        if linha.startswith("SCAN ")
+        and "INDEX" not in linha
+        and not linha.startswith("SCAN (")
+    ]
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """
+    Mede cada comando do execute até o fim da leitura das linhas: o SQLite
+    só avança a consulta conforme o fetch, então medir só o execute esconderia
+    o custo de SELECTs que não ordenam nem agregam.
+    """
+
+    _sql = None
+
+    def _medir(self, funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            self._duracao += time.perf_counter() - inicio
+
+    def _comecar(self, sql, parametros):
+        self._concluir()
+        self._sql = sql
+        self._parametros = parametros
+        self._duracao = 0.0
+        self.connection._pendentes.add(self)
+
+    def _concluir(self):
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        self.connection._pendentes.discard(self)
+        self.connection.observar(sql, self._parametros, self._duracao)
+
+    def execute(self, sql, parametros=()):
+        self._comecar(sql, parametros)
+        try:
+            self._medir(super().execute, sql, parametros)
+        except Exception:
+            self._concluir()
+            raise
+        if self.description is None:
+            self._concluir()
+        return self
+
+    def executemany(self, sql, parametros):
+        self._comecar(sql, None)
+        try:
+            self._medir(super().executemany, sql, parametros)
+        finally:
+            self._concluir()
+        return self
+
+    def fetchone(self):
+        linha = self._medir(super().fetchone) if self._sql is not None else super().fetchone()
+        if linha is None:
+            self._concluir()
+        return linha
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._sql is None:
+            return super().fetchmany(size)
+        linhas = self._medir(super().fetchmany, size)
+        if len(linhas) < size:
+            self._concluir()
+        return linhas
+
+    def fetchall(self):
+        if self._sql is None:
+            return super().fetchall()
+        try:
+            return self._medir(super().fetchall)
+        finally:
+            self._concluir()
+
+    def __next__(self):
+        if self._sql is None:
+            return super().__next__()
+        try:
+            return self._medir(super().__next__)
+        except StopIteration:
+            self._concluir()
+            raise
+
+    def close(self):
+        self._concluir()
+        super().close()
+
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """
+    Conexão que conta (trace callback), mede (cursor instrumentado) e estima
+    o trabalho (progress handler) de cada comando, marcando tudo com a rota
+    da requisição que está usando a conexão.
+    """
+
+    def __init__(self, *args, rota=SEM_ROTA, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rota_padrao = rota
+        self.rota = rota
+        self._pendentes = set()
+        self._comandos = 0
+        self.set_trace_callback(self._trace)
+        self.set_progress_handler(self._progresso, PASSOS_POR_CHAMADA)
+
+    def _trace(self, sql):
+        self._comandos += 1
+        COMANDOS_SQL.inc(self.rota, operacao(sql))
+
+    def _progresso(self):
+        PASSOS_VM_SQL.inc(self.rota, valor=PASSOS_POR_CHAMADA)
+        return 0
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        inicio = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.observar("COMMIT", (), time.perf_counter() - inicio)
+
+    def observar(self, sql, parametros, duracao):
+        tipo = operacao(sql)
+        DURACAO_SQL.observar(duracao, self.rota, tipo)
+        if _limite_lento is not None and duracao >= _limite_lento:
+            self._registrar_lento(sql, tipo, parametros, duracao)
+
+    def _plano(self, sql, parametros):
+        plano = _planos.get(sql)
+        if plano is not None:
+            return plano
+
+        # os mesmos parâmetros do comando; no executemany, NULL em cada "?"
+        if parametros is None:
+            parametros = (None,) * sql.count("?")
+        try:
+            # execute da classe base: não passa pelo cursor instrumentado
+            plano = [
+                linha[3]
+                for linha in sqlite3.Connection.execute(self, "EXPLAIN QUERY PLAN " + sql, parametros)
+            ]
+        except sqlite3.Error as erro:
+            return [f"(plano indisponível: {erro})"]
+
+        if len(_planos) >= MAX_PLANOS:
+            _planos.clear()
+        _planos[sql] = plano
+        return plano
+
+    def _registrar_lento(self, sql, tipo, parametros, duracao):
+        plano = self._plano(sql, parametros) if tipo in COM_PLANO else None
+        log_sql_lento.info(json.dumps({
+            "quando": datetime.now().isoformat(timespec="milliseconds"),
+            "pid": os.getpid(),
+            "rota": self.rota,
+            "operacao": tipo,
+            "duracao_ms": round(duracao * 1000, 3),
+            "sql": " ".join(sql.split()),
+            "parametros": formato_parametros(parametros),
+            "plano": plano,
+            "varreduras": varreduras(plano) if plano else [],
+        }, ensure_ascii=False))
+
+    def iniciar(self, rota):
+        """Começo do uso da conexão por uma requisição."""
+        self.rota = rota
+        self._comandos = 0
+
+    def finalizar(self):
+        """Fim da requisição: fecha as medições abertas e registra os totais."""
+        for cursor in list(self._pendentes):
+            cursor._concluir()
+        if self._comandos:
+            COMANDOS_POR_REQUISICAO.observar(self._comandos, self.rota)
+        self.rota = self.rota_padrao
+        self._comandos = 0
@@ -0,0 +1,170 @@
+import math
+import os
+import threading
+
+# Content-Type do formato texto do Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# em segundos: de 100µs (um SELECT por índice) a 10s
+BUCKETS_PADRAO = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, *extras) -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    pares.extend(extra for extra in extras if extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor) -> str:
+    if valor == math.inf:
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _cabecalho(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (requisições, comandos SQL...)."""
+
+    tipo = "counter"
+
+    def inc(self, *rotulos, valor=1):
+        with self._lock:
+            self._series[rotulos] = self._series.get(rotulos, 0) + valor
+
+    def exportar(self, fixo=""):
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._cabecalho() + [
+            f"{self.nome}{_formatar_rotulos(self.rotulos, rotulos, fixo)} {_formatar_numero(valor)}"
+            for rotulos, valor in series
+        ]
+
+
+class Medidor(_Metrica):
+    """Valor que sobe e desce (requisições em andamento...)."""
+
+    tipo = "gauge"
+
+    def inc(self, *rotulos, valor=1):
+        with self._lock:
+            self._series[rotulos] = self._series.get(rotulos, 0) + valor
+
+    def dec(self, *rotulos, valor=1):
+        self.inc(*rotulos, valor=-valor)
+
+    def definir(self, valor, *rotulos):
+        with self._lock:
+            self._series[rotulos] = valor
+
+    def exportar(self, fixo=""):
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._cabecalho() + [
+            f"{self.nome}{_formatar_rotulos(self.rotulos, rotulos, fixo)} {_formatar_numero(valor)}"
+            for rotulos, valor in series
+        ]
+
+
+class Histograma(_Metrica):
+    """Distribuição em faixas cumulativas (le=...), com soma e contagem."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observar(self, valor, *rotulos):
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                # [contagem por faixa (não cumulativa)..., soma]
+                serie = self._series[rotulos] = [0] * len(self.buckets) + [0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            serie[-1] += valor
+
+    def exportar(self, fixo=""):
+        with self._lock:
+            series = sorted((rotulos, list(serie)) for rotulos, serie in self._series.items())
+
+        linhas = self._cabecalho()
+        for rotulos, serie in series:
+            acumulado = 0
+            for limite, quantidade in zip(self.buckets, serie):
+                acumulado += quantidade
+                le = f'le="{_formatar_numero(limite)}"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, fixo, le)} {acumulado}")
+            sufixo = _formatar_rotulos(self.rotulos, rotulos, fixo)
+            linhas.append(f"{self.nome}_sum{sufixo} {_formatar_numero(serie[-1])}")
+            linhas.append(f"{self.nome}_count{sufixo} {acumulado}")
+        return linhas
+
+
+class Registro:
+    """
+    Conjunto de métricas de um processo, exportado no formato texto do
+    Prometheus. Cada worker do gunicorn tem o seu e uma coleta responde só
+    pelo worker que a atendeu, então toda série sai com o rótulo worker
+    (o pid): sem ele, os contadores de workers diferentes se alternariam na
+    mesma série e pareceriam zerar a cada coleta. O total da instância é a
+    soma entre workers (sum without (worker) (rate(...))); cada worker só
+    aparece nas coletas que caírem nele.
+    """
+
+    def __init__(self):
+        self._metricas = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            if any(m.nome == metrica.nome for m in self._metricas):
+                raise ValueError(f"métrica já registrada: {metrica.nome}")
+            self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._registrar(Medidor(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas)
+        # lido a cada coleta: o registro é criado no master, antes do fork
+        worker = f'worker="{os.getpid()}"'
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.exportar(worker))
+        return "\n".join(linhas) + "\n"
+
+
+registro = Registro()
@@ -0,0 +1,89 @@
+"""
+Pix em lote (folha de pagamento): leitura do arquivo ou do JSON com os
+pares (chave, valor) e validação de cada linha, antes de qualquer acesso
+de escrita. Quem grava é o motor do shard, numa transação só
+(transferencias.registrar_lote).
+"""
+import csv
+import io
+
+from dinheiro import formatar_brl, para_centavos
+
+STATUS_ENVIADO = "ENVIADO"
+STATUS_RECUSADO = "RECUSADO"
+
+
+def ler_json(dados) -> list:
+    """
+    [{"chave": ..., "valor": ...}, ...], solto ou em {"itens": [...]}, em
+    pares (chave, valor). O valor fica como veio: para_centavos decide.
+    Levanta ValueError se o formato não for esse.
+    """
+    if isinstance(dados, dict):
+        dados = dados.get("itens")
+    if not isinstance(dados, list):
+        raise ValueError('envie uma lista de {"chave", "valor"} (ou {"itens": [...]})')
+
+    itens = []
+    for item in dados:
+        if not isinstance(item, dict):
+            raise ValueError('cada item precisa ser um objeto {"chave", "valor"}')
+        itens.append((item.get("chave"), item.get("valor")))
+    return itens
+
+
+def ler_csv(texto: str) -> list:
+    """
+    Arquivo com uma linha "chave;valor" por Pix ("," também separa, se não
+    houver ";"), com cabeçalho opcional. Valores como no formulário:
+    "1.234,56" ou "1234.56".
+    """
+    linhas = texto.splitlines()
+    separador = ";" if linhas and ";" in linhas[0] else ","
+
+    itens = []
+    for i, colunas in enumerate(csv.reader(io.StringIO(texto), delimiter=separador)):
+        if not colunas or not "".join(colunas).strip():
+            continue
+        if i == 0 and colunas[0].strip().lower() == "chave":
+            continue
+        itens.append((colunas[0], colunas[1] if len(colunas) > 1 else None))
+    return itens
+
+
+def normalizar_chave(chave) -> str:
+    """Mesma normalização da tela de Pix."""
+    return str(chave or "").strip().lower()
+
+
+def validar(itens, destinatarios, idUsuario):
+    """
+    Confere cada linha contra os destinatários já resolvidos (chave ->
+    destinatário, ver resolver_chaves_pix no app). Retorna (validos,
+    relatorio): validos são (posição no relatório, destinatário, centavos);
+    o relatório tem uma entrada por linha, já com o motivo das recusadas.
+    """
+    validos = []
+    relatorio = []
+    for linha, (chave, valor) in enumerate(itens, start=1):
+        chave = normalizar_chave(chave)
+        item = {"linha": linha, "chave": chave}
+        relatorio.append(item)
+
+        try:
+            centavos = para_centavos(valor)
+        except ValueError:
+            centavos = 0
+        if centavos <= 0:
+            item.update(status=STATUS_RECUSADO, erro="valor inválido")
+            continue
+        item["valor"] = formatar_brl(centavos)
+
+        destinatario = destinatarios.get(chave)
+        if destinatario is None or destinatario["idConta"] is None:
+            item.update(status=STATUS_RECUSADO, erro="chave Pix não encontrada")
+        elif destinatario["id"] == idUsuario:
+            item.update(status=STATUS_RECUSADO, erro="não é possível enviar Pix para a própria conta")
+        else:
+            validos.append((len(relatorio) - 1, destinatario, centavos))
+    return validos, relatorio
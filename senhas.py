@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# formato do werkzeug: "scrypt:N:r:p" ou "pbkdf2:sha256:iteracoes"
+METODO = os.environ.get("ATLAS_SENHA_METODO", "scrypt:32768:8:1")
+
+# parâmetros que o werkzeug assume quando o método vem sem eles
+_PADROES = {
+    "scrypt": ("32768", "8", "1"),
+    "pbkdf2": ("sha256", str(DEFAULT_PBKDF2_ITERATIONS)),
+}
+
+# 0 processos = calcula na própria thread da requisição
+PROCESSOS = int(os.environ.get("ATLAS_SENHA_PROCESSOS", os.cpu_count() or 1))
+MAX_PENDENTES = int(os.environ.get("ATLAS_SENHA_MAX_PENDENTES", PROCESSOS * 4 or 1))
+TIMEOUT = float(os.environ.get("ATLAS_SENHA_TIMEOUT", 5))
+
+
+class SobrecargaHash(Exception):
+    """Fila de hashing cheia ou hash demorou além do timeout."""
+
+
+def _gerar(senha, metodo):
+    return generate_password_hash(senha, method=metodo)
+
+
+def _verificar(senha_hash, senha):
+    return check_password_hash(senha_hash, senha)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_vagas = threading.BoundedSemaphore(MAX_PENDENTES)
+# hashes submetidos e ainda não concluídos (só para stats())
+_pendentes = 0
+_pendentes_lock = threading.Lock()
+
+
+def _pool():
+    # criado sob demanda, um por worker (nunca herdado através de um fork)
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                # forkserver, não fork: a essa altura o worker já tem threads
+                # (motor de Pix, agendador, eventos) e um fork herdaria locks
+                # presos por elas. O servidor é um interpretador novo, com só
+                # este módulo carregado, e os processos de hash saem dele (como
+                # no spawn, o script principal precisa do if __name__ == "__main__")
+                contexto = multiprocessing.get_context("forkserver")
+                contexto.set_forkserver_preload([__name__])
+                _executor = ProcessPoolExecutor(max_workers=PROCESSOS, mp_context=contexto)
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _liberar(_futuro=None):
+    global _pendentes
+    with _pendentes_lock:
+        _pendentes -= 1
+    _vagas.release()
+
+
+def _executar(funcao, *args):
+    global _pendentes
+    if PROCESSOS <= 0:
+        return funcao(*args)
+
+    if not _vagas.acquire(blocking=False):
+        raise SobrecargaHash("fila de hashing cheia")
+    with _pendentes_lock:
+        _pendentes += 1
+
+    try:
+        futuro = _pool().submit(funcao, *args)
+    except Exception:
+        _liberar()
+        raise
+    futuro.add_done_callback(_liberar)
+
+    try:
+        return futuro.result(timeout=TIMEOUT)
+    except TimeoutError:
+        futuro.cancel()
+        raise SobrecargaHash(f"hash não terminou em {TIMEOUT:.1f}s")
+
+
+def gerar_hash(senha: str) -> str:
+    return _executar(_gerar, senha, METODO)
+
+
+def _parametros(metodo: str) -> tuple:
+    """Método com os padrões do werkzeug preenchidos: pbkdf2 -> ("pbkdf2", "sha256", 600000)."""
+    nome, *argumentos = metodo.split(":")
+    argumentos += _PADROES.get(nome, ())[len(argumentos):]
+    return (nome, *(int(a) if a.isdigit() else a for a in argumentos))
+
+
+def precisa_rehash(senha_hash: str) -> bool:
+    """O hash foi gerado com parâmetros diferentes dos configurados hoje?"""
+    return _parametros(senha_hash.split("$", 1)[0]) != _parametros(METODO)
+
+
+def verificar_senha(senha_hash: str, senha: str) -> bool:
+    return _executar(_verificar, senha_hash, senha)
+
+
+def parar():
+    """Encerra os processos de hash deste worker (são recriados no próximo uso)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown()
+        _executor = None
+
+
+def stats():
+    return {
+        "metodo": METODO,
+        "processos": PROCESSOS,
+        "max_pendentes": MAX_PENDENTES,
+        "pendentes": _pendentes,
+        "timeout_s": TIMEOUT,
+    }
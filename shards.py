@@ -0,0 +1,311 @@
+"""
+Sharding por usuário.
+
+Cada usuário, com a conta, os cartões, as faturas e os lançamentos, mora em
+um de N arquivos SQLite (ATLAS_DB_SHARDS), cada um com o seu lock de
+escrita, os seus pools e o seu motor de Pix. O catálogo (ATLAS_DB_CATALOGO)
+guarda o diretório de usuários: em que shard cada um está, e o que precisa
+ser achado sem saber o shard (e-mail do login e da chave Pix). Com um shard
+só, o catálogo é o próprio banco e tudo funciona como antes.
+
+Um Pix entre shards grava em duas fases (ver transferencias.registrar_saida):
+débito e saída PENDENTE na origem, crédito idempotente no destino e, por
+fim, a saída concluída. Saídas que ficaram pendentes (worker que caiu no
+meio, timeout) são reenviadas na subida de cada worker e periodicamente.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from database.pool import ConnectionPool
+from transferencias import (
+    TransferEngine,
+    concluir_saida,
+    concluir_saidas,
+    registrar_entrada,
+    registrar_entradas,
+    registrar_lote,
+    registrar_saida,
+)
+
+log = logging.getLogger("atlas.shards")
+
+
+class Banco:
+    """Um arquivo SQLite com os seus dois pools: leitura (mode=ro) e escrita."""
+
+    def __init__(self, nome, path, cfg, factory):
+        self.nome = nome
+        self.path = path
+        # leitura: mode=ro, com mmap e cache grandes (o mmap é compartilhado
+        # pelo page cache do SO); escrita: poucas conexões, o SQLite serializa
+        self.pool_leitura = ConnectionPool(
+            path,
+            size=cfg["DB_POOL_SIZE"],
+            timeout=cfg["DB_POOL_TIMEOUT"],
+            busy_timeout_ms=cfg["DB_BUSY_TIMEOUT_MS"],
+            factory=factory,
+            somente_leitura=True,
+            mmap_mb=cfg["DB_MMAP_MB"],
+            cache_mb=cfg["DB_CACHE_MB"],
+        )
+        self.pool_escrita = ConnectionPool(
+            path,
+            size=cfg["DB_POOL_ESCRITA_SIZE"],
+            timeout=cfg["DB_POOL_TIMEOUT"],
+            busy_timeout_ms=cfg["DB_BUSY_TIMEOUT_MS"],
+            factory=factory,
+        )
+
+    def aquecer(self, quantidade):
+        self.pool_leitura.aquecer(quantidade)
+        self.pool_escrita.aquecer(quantidade)
+
+    def stats(self):
+        return {"leitura": self.pool_leitura.stats(), "escrita": self.pool_escrita.stats()}
+
+
+class Shard(Banco):
+    """Um shard: o arquivo, os pools e a thread escritora de Pix dele."""
+
+    def __init__(self, indice, path, cfg, factory, factory_motor):
+        super().__init__(f"shard{indice}", path, cfg, factory)
+        self.indice = indice
+        self.motor = TransferEngine(
+            path,
+            max_lote=cfg["PIX_LOTE_MAX"],
+            espera_lote_ms=cfg["PIX_LOTE_ESPERA_MS"],
+            busy_timeout_ms=cfg["DB_BUSY_TIMEOUT_MS"],
+            factory=factory_motor,
+        )
+
+
+class Shards:
+    """
+    Os shards (na ordem de ATLAS_DB_SHARDS: o índice é o gravado no
+    diretório) e o catálogo. Nada abre conexão ou thread na construção.
+    """
+
+    def __init__(self, cfg, factory, factory_motor):
+        self.lista = [
+            Shard(indice, path, cfg, factory, factory_motor)
+            for indice, path in enumerate(cfg["DB_SHARDS"])
+        ]
+        catalogo = os.path.abspath(cfg["DB_CATALOGO"])
+        # catálogo no mesmo arquivo de um shard: usa os pools dele
+        self.catalogo = next(
+            (s for s in self.lista if os.path.abspath(s.path) == catalogo), None
+        ) or Banco("catalogo", cfg["DB_CATALOGO"], cfg, factory)
+
+        self.reenvio_s = cfg["PIX_REENVIO_S"]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._parar = None
+
+    def __len__(self):
+        return len(self.lista)
+
+    def __getitem__(self, indice) -> Shard:
+        return self.lista[indice]
+
+    def __iter__(self):
+        return iter(self.lista)
+
+    def bancos(self):
+        """Todos os arquivos, sem repetir o catálogo quando ele é um shard."""
+        if self.catalogo in self.lista:
+            return list(self.lista)
+        return self.lista + [self.catalogo]
+
+    def transferir(self, origem: int, idContaOrigem: int, destino: int, idContaDestino: int,
+                   valor: int):
+        """
+        Pix da conta no shard `origem` para a conta no shard `destino`.
+        Retorna (idTransferencia no shard da origem, idTransferencia no
+        shard do destino ou None se o crédito ficou para o reenvio) ou
+        levanta SaldoInsuficiente (nada foi gravado).
+        """
+        if origem == destino:
+            idTransferencia = self[origem].motor.transferir(idContaOrigem, idContaDestino, valor)
+            return idTransferencia, idTransferencia
+
+        self._garantir_reenvio()
+        data = datetime.now()
+        idTransferencia = self[origem].motor.executar(
+            registrar_saida, idContaOrigem, idContaDestino, destino, valor, data
+        )
+
+        # daqui em diante o débito já está gravado: se o crédito falhar, a
+        # saída fica PENDENTE e o reenvio completa o Pix depois
+        try:
+            idDestino = self._completar(origem, idTransferencia, destino,
+                                        idContaOrigem, idContaDestino, valor, data)
+        except Exception:
+            log.exception(
+                "Pix %s (shard %s → shard %s) debitado; o crédito fica para o reenvio",
+                idTransferencia, origem, destino,
+            )
+            idDestino = None
+        return idTransferencia, idDestino
+
+    def transferir_lote(self, origem: int, idContaOrigem: int, itens, timeout=30.0) -> list:
+        """
+        Vários Pix da mesma conta (folha de pagamento), tudo ou nada: `itens`
+        são (shard, idContaDestino, valor). Uma transação no shard da origem
+        grava todos (ver transferencias.registrar_lote); os créditos em
+        outros shards vêm depois, uma transação por shard de destino.
+        Retorna (idTransferencia na origem, no destino ou None) por item,
+        como transferir, ou levanta SaldoInsuficiente (nada foi gravado).
+        """
+        data = datetime.now()
+        ids = self[origem].motor.executar(
+            registrar_lote, idContaOrigem,
+            [(idContaDestino, None if destino == origem else destino, valor)
+             for destino, idContaDestino, valor in itens],
+            data, timeout=timeout,
+        )
+
+        idsDestino = self.completar_saidas(origem, [
+            (destino, idTransferencia, idContaOrigem, idContaDestino, valor, data)
+            for (destino, idContaDestino, valor), idTransferencia in zip(itens, ids)
+        ], timeout=timeout)
+        return list(zip(ids, idsDestino))
+
+    def completar_saidas(self, origem: int, saidas, timeout=30.0) -> list:
+        """
+        Fases 2 e 3 de vários Pix já gravados no shard `origem`, uma
+        transação por shard de destino. `saidas` são (shard, idTransferencia,
+        idContaOrigem, idContaDestino, valor, data); as do próprio shard já
+        estão completas. Retorna o idTransferencia no destino de cada uma,
+        ou None se o crédito ficou para o reenvio.
+        """
+        idsDestino = [idTransferencia for _, idTransferencia, *_ in saidas]
+        por_destino = {}
+        for posicao, (destino, *_) in enumerate(saidas):
+            if destino != origem:
+                por_destino.setdefault(destino, []).append(posicao)
+        if por_destino:
+            self._garantir_reenvio()
+
+        for destino, posicoes in por_destino.items():
+            try:
+                locais = self[destino].motor.executar(
+                    registrar_entradas, origem, [saidas[p][1:] for p in posicoes], timeout=timeout
+                )
+                self[origem].motor.executar(
+                    concluir_saidas, [saidas[p][1] for p in posicoes], timeout=timeout
+                )
+            except Exception:
+                log.exception(
+                    "%s Pix (shard %s → shard %s) debitado(s); o crédito fica para o reenvio",
+                    len(posicoes), origem, destino,
+                )
+                locais = [None] * len(posicoes)
+            for p, idLocal in zip(posicoes, locais):
+                idsDestino[p] = idLocal
+
+        return idsDestino
+
+    def _completar(self, origem, idTransferencia, destino, idContaOrigem, idContaDestino, valor, data):
+        idDestino = self[destino].motor.executar(
+            registrar_entrada, origem, idTransferencia, idContaOrigem, idContaDestino, valor, data
+        )
+        self[origem].motor.executar(concluir_saida, idTransferencia)
+        return idDestino
+
+    def reenviar_pendentes(self, idade_min_s=0.0) -> int:
+        """
+        Completa as saídas PENDENTE de todos os shards com pelo menos
+        `idade_min_s` segundos. Pode repetir um crédito já feito: a fase 2
+        é idempotente. Retorna quantas foram completadas.
+        """
+        limite = datetime.now() - timedelta(seconds=idade_min_s)
+        completadas = 0
+
+        for shard in self.lista:
+            conn = shard.pool_leitura.acquire()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT
+                        p.idTransferencia,
+                        p.shardDestino,
+                        t.idContaOrigem,
+                        t.idContaDestino,
+                        t.valor,
+                        t.dataTransferencia
+                    FROM pix_saida p
+                    JOIN transferencias t ON t.idTransferencia = p.idTransferencia
+                    WHERE p.status = 'PENDENTE'
+                      AND t.dataTransferencia <= ?
+                """, (limite,))
+                pendentes = cursor.fetchall()
+            finally:
+                shard.pool_leitura.release(conn)
+
+            for idTransferencia, destino, idContaOrigem, idContaDestino, valor, data in pendentes:
+                self._completar(shard.indice, idTransferencia, destino,
+                                idContaOrigem, idContaDestino, valor, data)
+                completadas += 1
+
+        return completadas
+
+    def _garantir_reenvio(self):
+        # uma thread por processo (de novo em cada worker após o fork), só
+        # quando há mais de um shard
+        if len(self.lista) < 2 or not self.reenvio_s:
+            return
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._parar = threading.Event()
+            self._thread = threading.Thread(
+                target=self._loop_reenvio, name="atlas-reenvio-pix", daemon=True
+            )
+            self._thread.start()
+
+    def _loop_reenvio(self):
+        while not self._parar.wait(self.reenvio_s):
+            try:
+                # só as mais antigas que o intervalo: as recentes ainda podem
+                # estar no meio do caminho normal
+                completadas = self.reenviar_pendentes(self.reenvio_s)
+            except Exception:
+                log.exception("falha ao reenviar Pix pendentes entre shards")
+                continue
+            if completadas:
+                log.warning("%s Pix pendente(s) entre shards completado(s) pelo reenvio", completadas)
+
+    def iniciar(self, aquecer=0):
+        """
+        No worker, após o fork: abre as conexões, sobe as escritoras de Pix e
+        completa o que um worker anterior tenha deixado pendente.
+        """
+        for banco in self.bancos():
+            banco.aquecer(aquecer)
+        for shard in self.lista:
+            shard.motor.iniciar()
+        if len(self.lista) > 1:
+            completadas = self.reenviar_pendentes()
+            if completadas:
+                log.warning("%s Pix pendente(s) entre shards completado(s) na subida", completadas)
+        self._garantir_reenvio()
+
+    def parar(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._parar.set()
+            self._thread.join()
+        self._thread = None
+        for shard in self.lista:
+            shard.motor.parar()
+
+    def stats_pools(self):
+        return {banco.nome: banco.stats() for banco in self.bancos()}
+
+    def stats_motores(self):
+        return {shard.nome: shard.motor.stats() for shard in self.lista}
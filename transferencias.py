@@ -0,0 +1,360 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+
+
+class SaldoInsuficiente(Exception):
+    """A conta de origem não tem saldo para a transferência."""
+
+
+def _debitar(cursor, idConta: int, valor: int):
+    """
+    Débito condicional: só debita se houver saldo, senão levanta
+    SaldoInsuficiente. É o que impede o saldo de ficar negativo mesmo com
+    vários Pix simultâneos da mesma conta.
+    """
+    cursor.execute("""
+        UPDATE contas
+        SET saldoAtual = saldoAtual - ?
+        WHERE idConta = ?
+          AND saldoAtual >= ?
+    """, (valor, idConta, valor))
+    if cursor.rowcount == 0:
+        raise SaldoInsuficiente(idConta)
+
+
+def _creditar(cursor, idConta: int, valor: int):
+    cursor.execute("""
+        UPDATE contas
+        SET saldoAtual = saldoAtual + ?
+        WHERE idConta = ?
+    """, (valor, idConta))
+
+
+def _inserir(cursor, idContaOrigem: int, idContaDestino: int, valor: int, data) -> int:
+    """Insere a linha em transferencias e devolve o idTransferencia dela."""
+    cursor.execute("""
+        INSERT INTO transferencias (
+            idContaOrigem,
+            idContaDestino,
+            valor,
+            dataTransferencia,
+            idLancamentoOrigem,
+            idLancamentoDestino
+        )
+        VALUES (?, ?, ?, ?, NULL, NULL)
+    """, (idContaOrigem, idContaDestino, valor, data))
+    return cursor.lastrowid
+
+
+def registrar_transferencia(cursor, idContaOrigem: int, idContaDestino: int,
+                            valor: int, data: datetime) -> int:
+    """
+    Debita a origem (só se houver saldo), insere a transferência e credita o
+    destino, tudo na transação já aberta no cursor (sem commit).
+    """
+    _debitar(cursor, idContaOrigem, valor)
+    idTransferencia = _inserir(cursor, idContaOrigem, idContaDestino, valor, data)
+    _creditar(cursor, idContaDestino, valor)
+    return idTransferencia
+
+
+def registrar_saida(cursor, idContaOrigem: int, idContaDestino: int, shardDestino: int,
+                    valor: int, data: datetime) -> int:
+    """
+    Fase 1 de um Pix entre shards, no shard da origem: o mesmo débito
+    condicional e a mesma linha em transferencias de registrar_transferencia,
+    mais a saída PENDENTE em pix_saida. O crédito é a fase 2
+    (registrar_entrada, no shard do destino); enquanto ela não é confirmada
+    (concluir_saida), a saída continua pendente e é reenviada.
+    """
+    _debitar(cursor, idContaOrigem, valor)
+    idTransferencia = _inserir(cursor, idContaOrigem, idContaDestino, valor, data)
+
+    cursor.execute("""
+        INSERT INTO pix_saida (idTransferencia, shardDestino, status)
+        VALUES (?, ?, 'PENDENTE')
+    """, (idTransferencia, shardDestino))
+
+    return idTransferencia
+
+
+def registrar_lote(cursor, idContaOrigem: int, itens, data: datetime) -> list:
+    """
+    Pix em lote da mesma origem, tudo ou nada, na transação já aberta no
+    cursor (sem commit): um só débito condicional do total, as
+    transferências e os créditos (num executemany). `itens` são
+    (idContaDestino, shardDestino, valor); com shardDestino (destino em
+    outro shard) não há crédito aqui, e sim a saída PENDENTE de
+    registrar_saida. Retorna os idTransferencia na ordem dos itens ou
+    levanta SaldoInsuficiente.
+    """
+    _debitar(cursor, idContaOrigem, sum(valor for _, _, valor in itens))
+
+    # uma linha por vez: cada id vem do próprio INSERT (o executemany não
+    # devolve os ids, e nada garante que sejam consecutivos)
+    ids = [
+        _inserir(cursor, idContaOrigem, idContaDestino, valor, data)
+        for idContaDestino, _, valor in itens
+    ]
+
+    cursor.executemany("""
+        UPDATE contas
+        SET saldoAtual = saldoAtual + ?
+        WHERE idConta = ?
+    """, [(valor, idContaDestino) for idContaDestino, shard, valor in itens if shard is None])
+
+    cursor.executemany("""
+        INSERT INTO pix_saida (idTransferencia, shardDestino, status)
+        VALUES (?, ?, 'PENDENTE')
+    """, [
+        (idTransferencia, shard)
+        for idTransferencia, (_, shard, _) in zip(ids, itens) if shard is not None
+    ])
+
+    return ids
+
+
+def registrar_entrada(cursor, shardOrigem: int, idTransferenciaOrigem: int, idContaOrigem: int,
+                      idContaDestino: int, valor: int, data) -> int:
+    """
+    Fase 2, no shard do destino: insere a transferência e credita o destino.
+    Idempotente: se essa saída já entrou (reenvio), só devolve o id local.
+    """
+    cursor.execute("""
+        SELECT idTransferencia
+        FROM pix_entrada
+        WHERE shardOrigem = ? AND idTransferenciaOrigem = ?
+    """, (shardOrigem, idTransferenciaOrigem))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+
+    idTransferencia = _inserir(cursor, idContaOrigem, idContaDestino, valor, data)
+    _creditar(cursor, idContaDestino, valor)
+
+    cursor.execute("""
+        INSERT INTO pix_entrada (shardOrigem, idTransferenciaOrigem, idTransferencia)
+        VALUES (?, ?, ?)
+    """, (shardOrigem, idTransferenciaOrigem, idTransferencia))
+
+    return idTransferencia
+
+
+def registrar_entradas(cursor, shardOrigem: int, entradas) -> list:
+    """
+    Fase 2 de várias saídas do mesmo shard de origem (Pix em lote), numa
+    transação: `entradas` são os argumentos de registrar_entrada depois do
+    shardOrigem. Retorna os ids locais na mesma ordem.
+    """
+    return [registrar_entrada(cursor, shardOrigem, *entrada) for entrada in entradas]
+
+
+def concluir_saida(cursor, idTransferencia: int) -> int:
+    """Fase 3, de volta na origem: o crédito foi gravado, a saída não é mais reenviada."""
+    cursor.execute("""
+        UPDATE pix_saida
+        SET status = 'CONCLUIDA',
+            concluidaEm = ?
+        WHERE idTransferencia = ?
+          AND status = 'PENDENTE'
+    """, (datetime.now(), idTransferencia))
+    return idTransferencia
+
+
+def concluir_saidas(cursor, ids) -> list:
+    """Fase 3 de várias saídas (Pix em lote), num só executemany."""
+    cursor.executemany("""
+        UPDATE pix_saida
+        SET status = 'CONCLUIDA',
+            concluidaEm = ?
+        WHERE idTransferencia = ?
+          AND status = 'PENDENTE'
+    """, [(datetime.now(), idTransferencia) for idTransferencia in ids])
+    return list(ids)
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class TransferEngine:
+    """
+    Caminho de escrita dos Pix: uma única thread escritora por processo, com
+    conexão própria, consome a fila de pedidos e grava todos os que estiverem
+    esperando numa só transação BEGIN IMMEDIATE (group commit) — um fsync
+    para o lote inteiro em vez de um por Pix. Cada pedido roda num SAVEPOINT,
+    então um Pix recusado não derruba os outros do mesmo lote.
+
+    Um pedido é uma função (cursor, *args) que grava sem commit:
+    registrar_transferencia e, entre shards, as fases de registrar_saida.
+    """
+
+    def __init__(self, path, max_lote=128, espera_lote_ms=0, busy_timeout_ms=5000,
+                 factory=sqlite3.Connection):
+        self.path = path
+        self.max_lote = max_lote
+        self.espera_lote = espera_lote_ms / 1000
+        self.busy_timeout_ms = busy_timeout_ms
+        self.factory = factory
+
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # métricas
+        self._latencias = deque(maxlen=10000)
+        self._concluidas = 0
+        self._recusadas = 0
+        self._erros = 0
+        self._lotes = 0
+        self._maior_lote = 0
+
+    def _conectar(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            factory=self.factory,
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        # o fsync de cada commit é amortizado pelo lote
+        conn.execute("PRAGMA synchronous = FULL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
+
+    def _garantir_escritora(self):
+        # a thread sobe sob demanda, e de novo em cada processo filho após um fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._fila = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._loop, name="atlas-transferencias", daemon=True
+            )
+            self._thread.start()
+
+    def iniciar(self):
+        """Sobe a thread escritora já (ex.: no worker, logo após o fork)."""
+        self._garantir_escritora()
+
+    def transferir(self, idContaOrigem: int, idContaDestino: int, valor: int,
+                   data=None, timeout=10.0) -> int:
+        """
+        Enfileira o Pix e espera o commit do lote. Retorna o idTransferencia
+        ou levanta SaldoInsuficiente. Um TimeoutError aqui não desfaz o pedido:
+        ele ainda pode ser gravado pelo lote em andamento.
+        """
+        return self.executar(
+            registrar_transferencia, idContaOrigem, idContaDestino, valor,
+            data or datetime.now(), timeout=timeout,
+        )
+
+    def executar(self, funcao, *args, timeout=10.0):
+        """Grava funcao(cursor, *args) no próximo lote e devolve o retorno dela."""
+        self._garantir_escritora()
+        futuro = Future()
+        self._fila.put((funcao, args, time.perf_counter(), futuro))
+        return futuro.result(timeout=timeout)
+
+    def parar(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._fila.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def _loop(self):
+        conn = self._conectar()
+        fila = self._fila
+        rodando = True
+
+        while rodando:
+            pedido = fila.get()
+            if pedido is None:
+                break
+
+            lote = [pedido]
+            prazo = time.perf_counter() + self.espera_lote
+            while len(lote) < self.max_lote:
+                restante = prazo - time.perf_counter()
+                try:
+                    pedido = fila.get(timeout=restante) if restante > 0 else fila.get_nowait()
+                except queue.Empty:
+                    break
+                if pedido is None:
+                    rodando = False
+                    break
+                lote.append(pedido)
+
+            self._gravar_lote(conn, lote)
+
+        conn.close()
+
+    def _gravar_lote(self, conn, lote):
+        cursor = conn.cursor()
+        resultados = []
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for funcao, args, _, _ in lote:
+                cursor.execute("SAVEPOINT pix")
+                try:
+                    resultados.append((funcao(cursor, *args), None))
+                except Exception as erro:
+                    cursor.execute("ROLLBACK TO pix")
+                    resultados.append((None, erro))
+                cursor.execute("RELEASE pix")
+            cursor.execute("COMMIT")
+        except Exception as erro:
+            if conn.in_transaction:
+                conn.rollback()
+            resultados = [(None, erro)] * len(lote)
+
+        fim = time.perf_counter()
+        with self._lock:
+            self._lotes += 1
+            self._maior_lote = max(self._maior_lote, len(lote))
+            for pedido, (_, erro) in zip(lote, resultados):
+                self._latencias.append(fim - pedido[2])
+                if erro is None:
+                    self._concluidas += 1
+                elif isinstance(erro, SaldoInsuficiente):
+                    self._recusadas += 1
+                else:
+                    self._erros += 1
+
+        for pedido, (resultado, erro) in zip(lote, resultados):
+            if erro is None:
+                pedido[3].set_result(resultado)
+            else:
+                pedido[3].set_exception(erro)
+
+    def stats(self):
+        with self._lock:
+            latencias = list(self._latencias)
+            total = self._concluidas + self._recusadas + self._erros
+            return {
+                "concluidas": self._concluidas,
+                "recusadas_saldo": self._recusadas,
+                "erros": self._erros,
+                "lotes": self._lotes,
+                "media_por_lote": round(total / self._lotes, 2) if self._lotes else 0.0,
+                "maior_lote": self._maior_lote,
+                "na_fila": self._fila.qsize(),
+                "latencia_p50_ms": round(_percentil(latencias, 0.50) * 1000, 3),
+                "latencia_p95_ms": round(_percentil(latencias, 0.95) * 1000, 3),
+                "latencia_p99_ms": round(_percentil(latencias, 0.99) * 1000, 3),
+                "latencia_max_ms": round(max(latencias, default=0.0) * 1000, 3),
+            }
@@ -0,0 +1,11 @@
+"""
+Ponto de entrada de produção para servidores WSGI pre-fork:
+
+    ATLAS_SECRET_KEY=... gunicorn -c gunicorn.conf.py wsgi:app
+
+O app é montado uma vez, no import (no master, com preload_app), e os
+workers herdam tudo pelo fork: código, schema migrado e templates compilados.
+"""
+from app import create_app
+
+app = create_app("producao")